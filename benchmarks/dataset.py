@@ -0,0 +1,143 @@
+"""
+Generate a reproducible synthetic dataset of authors, categories, tags and posts.
+
+The same seed and sizes always produce the same rows. Popularity follows a
+Zipf distribution, as on a real blog: a few authors write most posts and a
+few tags are attached to most of them. The number of tags per post has a
+long tail. Files are written as NDJSON in the format of
+`scripts.bulk_import`, and can be loaded into an empty database straight
+away with `--load`.
+
+Usage:
+    python -m benchmarks.dataset --posts 100000 --out /tmp/blog-dataset --load
+"""
+
+import argparse
+import asyncio
+import random
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import orjson
+
+from scripts.bulk_import import asyncpg_dsn, bulk_import
+from src.config import settings
+
+
+WORDS = (
+    "api async cache cursor database deploy endpoint event fastapi index "
+    "latency migration orm pagination pool postgres python query queue redis "
+    "replica request response schema server session shard sql stream table "
+    "throughput token transaction trigger update vacuum worker"
+).split()
+
+
+@dataclass
+class DatasetSize:
+    authors: int = 100
+    categories: int = 20
+    tags: int = 500
+    posts: int = 10_000
+    mean_tags: float = 3.0
+    max_tags: int = 20
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> List[float]:
+    """The cumulative weights of ranks `1..n` under a Zipf law."""
+    return list(accumulate(1 / rank**exponent for rank in range(1, n + 1)))
+
+
+class DatasetGenerator:
+    """Builds the rows of every table from a seeded random generator."""
+
+    def __init__(self, size: DatasetSize, seed: int = 42):
+        self.size = size
+        self.rng = random.Random(seed)
+        self._author_weights = zipf_weights(size.authors)
+        self._tag_weights = zipf_weights(size.tags)
+
+    def text(self, low: int, high: int) -> str:
+        return " ".join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def _pick(self, cum_weights: List[float]) -> int:
+        """A 1-based rank drawn from cumulative weights."""
+        return bisect_left(cum_weights, self.rng.random() * cum_weights[-1]) + 1
+
+    def tag_count(self) -> int:
+        count = int(self.rng.expovariate(1 / self.size.mean_tags))
+        return min(count, self.size.max_tags, self.size.tags)
+
+    def authors(self) -> Iterator[Dict[str, Any]]:
+        for id in range(1, self.size.authors + 1):
+            yield {"id": id, "name": f"Author {id}", "email": f"author{id}@example.com"}
+
+    def categories(self) -> Iterator[Dict[str, Any]]:
+        for id in range(1, self.size.categories + 1):
+            yield {"id": id, "name": f"Category {id}"}
+
+    def tags(self) -> Iterator[Dict[str, Any]]:
+        for id in range(1, self.size.tags + 1):
+            yield {"id": id, "name": f"tag-{id}"}
+
+    def post_tags(self) -> List[int]:
+        tags, count = set(), self.tag_count()
+        while len(tags) < count:
+            tags.add(self._pick(self._tag_weights))
+        return sorted(tags)
+
+    def posts(self) -> Iterator[Dict[str, Any]]:
+        for id in range(1, self.size.posts + 1):
+            yield {
+                "id": id,
+                "title": self.text(3, 8).capitalize(),
+                "content": self.text(50, 400),
+                "author_id": self._pick(self._author_weights),
+                # Some posts are left uncategorised.
+                "category_id": (
+                    self.rng.randint(1, self.size.categories)
+                    if self.size.categories and self.rng.random() < 0.9
+                    else None
+                ),
+                "tags": self.post_tags(),
+            }
+
+    def write(self, directory: Path) -> Dict[str, Path]:
+        """Write one NDJSON file per table, returning them by table name."""
+        directory.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for name in ("authors", "categories", "tags", "posts"):
+            path = directory / f"{name}.ndjson"
+            with path.open("wb") as file:
+                for record in getattr(self, name)():
+                    file.write(orjson.dumps(record) + b"\n")
+            files[name] = path
+        return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    defaults = DatasetSize()
+    for name, value in vars(defaults).items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=type(value), default=value
+        )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--load", action="store_true", help="bulk-load the files")
+    parser.add_argument("--db-url", default=str(settings.db_url))
+    args = parser.parse_args()
+
+    size = DatasetSize(**{name: getattr(args, name) for name in vars(defaults)})
+    files = DatasetGenerator(size, args.seed).write(args.out)
+    for name, path in files.items():
+        print(f"{name:<12} {path}")
+    if args.load:
+        for item in asyncio.run(bulk_import(files, asyncpg_dsn(args.db_url))):
+            print(item)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Drive a mixed read/write load against the API and report latency percentiles.
+
+Virtual users send requests concurrently, each picking its next scenario at
+random by weight: listing, getting, creating (with tags), updating and
+deleting posts. The app runs in-process by default, with its lifespan, or
+is reached at `--url`. Load a dataset first with `benchmarks.dataset`.
+
+Requests are spread over `--clients` forwarded addresses, as many real
+clients would be, so per-client rate limits do not cap the throughput.
+
+The report is JSON. It holds the throughput and p50/p95/p99 latency of each
+scenario and of the whole run, and the commit it ran on. `--compare` prints
+the change from a previous report.
+
+Usage:
+    python -m benchmarks.load --duration 30 --concurrency 50 --output run.json
+    python -m benchmarks.load --url http://localhost:8000 --compare run.json
+"""
+
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+import orjson
+
+
+SCENARIO_WEIGHTS = {"list": 40, "get": 40, "create": 10, "update": 7, "delete": 3}
+SAMPLE_SIZE = 200
+
+
+@dataclass
+class Fixtures:
+    """IDs of existing rows the scenarios pick from."""
+
+    posts: List[int]
+    tags: List[int]
+    authors: List[int]
+    categories: List[int]
+    # Only posts created by the run are deleted, so the dataset stays intact.
+    created: Deque[int] = field(default_factory=deque)
+
+
+async def discover(client: httpx.AsyncClient) -> Fixtures:
+    async def ids(path: str) -> List[int]:
+        response = await client.get(path, params={"limit": SAMPLE_SIZE})
+        response.raise_for_status()
+        return [item["id"] for item in response.json()]
+
+    fixtures = Fixtures(
+        posts=await ids("/api/v1/posts/"),
+        tags=await ids("/api/v1/tags/"),
+        authors=await ids("/api/v1/authors/"),
+        categories=await ids("/api/v1/categories/"),
+    )
+    if not fixtures.posts:
+        raise SystemExit("No posts found: load a dataset with benchmarks.dataset first")
+    return fixtures
+
+
+def post_payload(rng: random.Random, fixtures: Fixtures) -> Dict[str, Any]:
+    return {
+        "title": f"Benchmark post {rng.getrandbits(32)}",
+        "content": "Lorem ipsum dolor sit amet. " * rng.randint(5, 50),
+        "author_id": rng.choice(fixtures.authors) if fixtures.authors else None,
+        "category_id": rng.choice(fixtures.categories) if fixtures.categories else None,
+        "tags": rng.sample(fixtures.tags, min(len(fixtures.tags), rng.randint(0, 8))),
+    }
+
+
+Headers = Dict[str, str]
+Scenario = Callable[
+    [httpx.AsyncClient, random.Random, Fixtures, Headers],
+    Awaitable[Optional[httpx.Response]],
+]
+
+
+async def list_posts(client, rng, fixtures, headers):
+    params = {"limit": rng.choice((10, 50))}
+    return await client.get("/api/v1/posts/", params=params, headers=headers)
+
+
+async def get_post(client, rng, fixtures, headers):
+    post_id = rng.choice(fixtures.posts)
+    return await client.get(f"/api/v1/posts/{post_id}", headers=headers)
+
+
+async def create_post(client, rng, fixtures, headers):
+    payload = post_payload(rng, fixtures)
+    response = await client.post("/api/v1/posts/", json=payload, headers=headers)
+    if response.status_code == 200:
+        fixtures.created.append(response.json()["id"])
+    return response
+
+
+async def update_post(client, rng, fixtures, headers):
+    post_id, payload = rng.choice(fixtures.posts), post_payload(rng, fixtures)
+    return await client.put(f"/api/v1/posts/{post_id}", json=payload, headers=headers)
+
+
+async def delete_post(client, rng, fixtures, headers):
+    if not fixtures.created:
+        return None  # Nothing created yet; not counted.
+    post_id = fixtures.created.popleft()
+    return await client.delete(f"/api/v1/posts/{post_id}", headers=headers)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "list": list_posts,
+    "get": get_post,
+    "create": create_post,
+    "update": update_post,
+    "delete": delete_post,
+}
+
+
+def client_address(number: int) -> str:
+    return f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}"
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """The nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, round(q / 100 * len(samples)) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    weights: Dict[str, int],
+    concurrency: int,
+    duration: float,
+    clients: int,
+    seed: int,
+) -> Dict[str, Any]:
+    """
+    Run the scenarios for `duration` seconds with `concurrency` virtual users.
+
+    Args:
+        client (httpx.AsyncClient): The client to send requests with.
+        weights (Dict[str, int]): The relative frequency of each scenario.
+        concurrency (int): The number of requests in flight at any time.
+        duration (float): The length of the run in seconds.
+        clients (int): The number of distinct client addresses to send from.
+        seed (int): The seed of the random choices of the virtual users.
+
+    Returns:
+        Dict[str, Any]: The summary of every scenario and of the whole run.
+    """
+    fixtures = await discover(client)
+    names = [name for name in weights if weights[name] > 0]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    deadline = time.perf_counter() + duration
+
+    async def user(number: int) -> None:
+        rng = random.Random(seed * 1_000_003 + number)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            headers = {"X-Forwarded-For": client_address(rng.randrange(clients))}
+            started = time.perf_counter()
+            try:
+                response = await SCENARIOS[name](client, rng, fixtures, headers)
+            except httpx.HTTPError:
+                errors[name] += 1
+            else:
+                if response is None:
+                    continue
+                if response.status_code >= 400:
+                    errors[name] += 1
+            latencies[name].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "scenarios": {
+            name: summarize(latencies[name], errors[name], elapsed) for name in names
+        },
+        "total": summarize(
+            [value for name in names for value in latencies[name]],
+            sum(errors.values()),
+            elapsed,
+        ),
+    }
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@asynccontextmanager
+async def open_client(url: Optional[str]) -> AsyncIterator[httpx.AsyncClient]:
+    """A client of the server at `url`, or of the app run in this process."""
+    if url is not None:
+        async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+            yield client
+        return
+    from src.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=30
+        ) as client:
+            yield client
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> str:
+    """A table of the relative change of each metric from a baseline report."""
+    lines = [
+        f"{'scenario':<10} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>9}"
+    ]
+    sections = {**report["scenarios"], "total": report["total"]}
+    base_sections = {**baseline["scenarios"], "total": baseline["total"]}
+    for name, section in sections.items():
+        base = base_sections.get(name)
+        if base is None:
+            continue
+        for metric in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+            old, new = base[metric], section[metric]
+            change = f"{(new - old) / old:+.1%}" if old else "n/a"
+            lines.append(
+                f"{name:<10} {metric:<12} {old:>12.2f} {new:>12.2f} {change:>9}"
+            )
+    return "\n".join(lines)
+
+
+def parse_weights(value: str) -> Dict[str, int]:
+    """Parse `list=40,get=40,...`, the scenarios left out having no weight."""
+    weights = {name: 0 for name in SCENARIOS}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"invalid scenario weight {item!r}")
+        weights[name] = int(weight)
+    return weights
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    async with open_client(args.url) as client:
+        results = await run_load(
+            client,
+            args.scenarios,
+            args.concurrency,
+            args.duration,
+            args.clients,
+            args.seed,
+        )
+    return {
+        "commit": current_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "in-process",
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "clients": args.clients,
+            "seed": args.seed,
+            "scenarios": args.scenarios,
+        },
+        **results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--url", help="the server to load, instead of the app in-process"
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--scenarios",
+        type=parse_weights,
+        default=SCENARIO_WEIGHTS,
+        help="weights as list=40,get=40,create=10,update=7,delete=3",
+    )
+    parser.add_argument("--output", type=Path, help="write the report to this file")
+    parser.add_argument(
+        "--compare", type=Path, help="a previous report to compare with"
+    )
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    encoded = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.output is not None:
+        args.output.write_bytes(encoded + b"\n")
+    else:
+        sys.stdout.write(encoded.decode() + "\n")
+    if args.compare is not None:
+        print(compare(report, orjson.loads(args.compare.read_bytes())), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Time the post, author, category and tag services, and post serialisation.
+
+Each benchmark calls one service function in a fresh session, after an
+untimed setup, and reports:
+- the median and p95 wall time;
+- the SQL statements it ran;
+- the peak memory traced by tracemalloc;
+- the memory blocks still allocated when it returned.
+`get_posts` runs at every table size given with `--sizes`. The other
+benchmarks run at the largest size.
+
+The tables of the database at `--db-url` are dropped and recreated, so point
+it at a scratch database. Redis should be reachable, as the services
+invalidate their caches there.
+
+`--save-baseline` writes the results to a file. `--baseline` compares a run
+with that file and exits non-zero if a benchmark got slower or used more
+memory than `--threshold` allows, or ran more queries.
+
+Usage:
+    python -m benchmarks.micro --db-url postgresql+asyncpg://... --save-baseline
+    python -m benchmarks.micro --db-url postgresql+asyncpg://... --baseline
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from statistics import median
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.dataset import DatasetGenerator, DatasetSize
+from benchmarks.load import current_commit, percentile
+from scripts.bulk_import import asyncpg_dsn, bulk_import
+from src.authors import service as authors
+from src.authors.schemas import AuthorCreate
+from src.categories import service as categories
+from src.categories.schemas import CategoryCreate
+from src.database import Base
+from src.metrics import RequestStats, instrument_engine, request_stats
+from src.pagination import Pagination
+from src.posts import service as posts
+from src.posts.schemas import PostBase, PostCreate
+from src.tags import service as tags
+from src.tags.schemas import TagCreate
+
+
+BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_SIZES = (1_000, 10_000)
+PAGE_SIZE = 50
+
+
+@dataclass
+class Benchmark:
+    name: str
+    run: Callable[[AsyncSession, Any], Awaitable[Any]]
+    setup: Optional[Callable[[AsyncSession], Awaitable[Any]]] = None
+
+
+@dataclass
+class Result:
+    median_ms: float
+    p95_ms: float
+    queries: int
+    peak_kib: float
+    blocks: int
+
+
+async def _timed(
+    benchmark: Benchmark, session_maker: sessionmaker, trace: bool = False
+) -> tuple:
+    async with session_maker() as session:
+        arg = await benchmark.setup(session) if benchmark.setup else None
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        if trace:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        await benchmark.run(session, arg)
+        elapsed = time.perf_counter() - started
+        peak = blocks = 0
+        if trace:
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            diff = after.compare_to(before, "filename")
+            blocks = sum(max(0, stat.count_diff) for stat in diff)
+        request_stats.reset(token)
+    return elapsed, stats.queries, peak, blocks
+
+
+async def measure(
+    benchmark: Benchmark, session_maker: sessionmaker, iterations: int, warmup: int
+) -> Result:
+    """
+    Run a benchmark, then once more under tracemalloc for its memory use.
+
+    Args:
+        benchmark (Benchmark): The benchmark to run.
+        session_maker (sessionmaker): Opens the session of each iteration.
+        iterations (int): The number of timed iterations.
+        warmup (int): The number of untimed iterations run first.
+
+    Returns:
+        Result: The timings, query count and memory use of the benchmark.
+    """
+    timings, queries = [], []
+    for iteration in range(warmup + iterations):
+        elapsed, count, _, _ = await _timed(benchmark, session_maker)
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(count)
+    # Tracing slows everything down, so it is kept out of the timings.
+    _, _, peak, blocks = await _timed(benchmark, session_maker, trace=True)
+    timings.sort()
+    return Result(
+        median_ms=round(median(timings), 3),
+        p95_ms=round(percentile(timings, 95), 3),
+        queries=max(queries),
+        peak_kib=round(peak / 1024, 1),
+        blocks=blocks,
+    )
+
+
+def read_benchmarks(size: int) -> List[Benchmark]:
+    async def get_posts(session, _):
+        page = await posts.get_posts(session, Pagination(limit=PAGE_SIZE))
+        return [post.tags for post in page.items]
+
+    async def get_post_rows(session, _):
+        page = await posts.get_post_rows(session, Pagination(limit=PAGE_SIZE))
+        return posts.encode_posts(page.items)
+
+    return [
+        Benchmark(f"get_posts[size={size}]", get_posts),
+        Benchmark(f"get_post_rows[size={size}]", get_post_rows),
+    ]
+
+
+def write_benchmarks(dataset: DatasetSize, seed: int) -> List[Benchmark]:
+    rng = random.Random(seed)
+
+    def post_data(tag_count: int = 3) -> PostCreate:
+        return PostCreate(
+            title="Benchmark post",
+            content="Lorem ipsum dolor sit amet. " * 20,
+            author_id=rng.randint(1, dataset.authors),
+            category_id=rng.randint(1, dataset.categories),
+            tags=rng.sample(range(1, dataset.tags + 1), tag_count),
+        )
+
+    def create_post(tag_count: int) -> Benchmark:
+        async def run(session, data):
+            return await posts.create_post(data, session)
+
+        async def setup(session):
+            return post_data(tag_count)
+
+        return Benchmark(f"create_post[tags={tag_count}]", run, setup)
+
+    # Updates and deletes take an ID: the setups only pick or create the row.
+    async def existing_post(session):
+        return rng.randint(1, dataset.posts)
+
+    async def new_post(session):
+        return (await posts.create_post(post_data(), session)).id
+
+    async def new_author(session):
+        author = await authors.create_author(
+            AuthorCreate(name="Benchmark", email="benchmark@example.com"), session
+        )
+        return author.id
+
+    async def new_category(session):
+        category = await categories.create_category(
+            CategoryCreate(name="Benchmark"), session
+        )
+        return category.id
+
+    async def new_tag(session):
+        return (await tags.create_tag(TagCreate(name="benchmark"), session)).id
+
+    async def existing_author(session):
+        return rng.randint(1, dataset.authors)
+
+    async def existing_category(session):
+        return rng.randint(1, dataset.categories)
+
+    async def existing_tag(session):
+        return rng.randint(1, dataset.tags)
+
+    return [
+        *(create_post(count) for count in (0, 10, 50)),
+        Benchmark(
+            "update_author",
+            lambda session, author: authors.update_author(
+                author,
+                AuthorCreate(name="Updated", email="updated@example.com"),
+                session,
+            ),
+            existing_author,
+        ),
+        Benchmark(
+            "update_category",
+            lambda session, category: categories.update_category(
+                category, CategoryCreate(name="Updated"), session
+            ),
+            existing_category,
+        ),
+        Benchmark(
+            "update_tag",
+            lambda session, tag: tags.update_tag(
+                tag, TagCreate(name="updated"), session
+            ),
+            existing_tag,
+        ),
+        Benchmark(
+            "update_post",
+            lambda session, post: posts.update_post(post, post_data(), session),
+            existing_post,
+        ),
+        Benchmark(
+            "delete_author", lambda s, a: authors.delete_author(a, s), new_author
+        ),
+        Benchmark(
+            "delete_category",
+            lambda s, c: categories.delete_category(c, s),
+            new_category,
+        ),
+        Benchmark("delete_tag", lambda s, t: tags.delete_tag(t, s), new_tag),
+        Benchmark("delete_post", lambda s, p: posts.delete_post(p, s), new_post),
+    ]
+
+
+def serialization_benchmark() -> Benchmark:
+    """Validate a page of loaded posts with `PostBase` and encode it with orjson."""
+    adapter = TypeAdapter(List[PostBase])
+
+    async def setup(session):
+        page = await posts.get_posts(session, Pagination(limit=PAGE_SIZE))
+        return page.items
+
+    async def run(session, items):
+        models = adapter.validate_python(items, from_attributes=True)
+        return orjson.dumps(adapter.dump_python(models))
+
+    return Benchmark(f"serialize_posts[page={PAGE_SIZE}]", run, setup)
+
+
+async def load_dataset(engine, db_url: str, size: DatasetSize, seed: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    with tempfile.TemporaryDirectory() as directory:
+        files = DatasetGenerator(size, seed).write(Path(directory))
+        await bulk_import(files, asyncpg_dsn(db_url))
+
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    engine = create_async_engine(args.db_url)
+    instrument_engine(engine)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    results: Dict[str, Result] = {}
+
+    async def run(benchmark: Benchmark) -> None:
+        if args.filter and args.filter not in benchmark.name:
+            return
+        results[benchmark.name] = await measure(
+            benchmark, session_maker, args.iterations, args.warmup
+        )
+        print(f"{benchmark.name:<28} {results[benchmark.name]}", file=sys.stderr)
+
+    try:
+        for size in sorted(args.sizes):
+            dataset = DatasetSize(posts=size)
+            await load_dataset(engine, args.db_url, dataset, args.seed)
+            for benchmark in read_benchmarks(size):
+                await run(benchmark)
+        await run(serialization_benchmark())
+        for benchmark in write_benchmarks(dataset, args.seed):
+            await run(benchmark)
+    finally:
+        await engine.dispose()
+    return {
+        "commit": current_commit(),
+        "config": {
+            "sizes": sorted(args.sizes),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "benchmarks": {name: asdict(result) for name, result in results.items()},
+    }
+
+
+def regressions(
+    report: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Compare a run with a baseline.
+
+    Args:
+        report (Dict[str, Any]): The results of the run.
+        baseline (Dict[str, Any]): The results of the baseline run.
+        threshold (float): The relative increase of the median time and peak
+            memory tolerated, e.g. 0.25 for 25%.
+
+    Returns:
+        List[str]: A description of every regression. Any additional query is one.
+    """
+    found = []
+    for name, result in report["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        if result["queries"] > base["queries"]:
+            found.append(f"{name}: {base['queries']} -> {result['queries']} queries")
+        for metric in ("median_ms", "peak_kib"):
+            if base[metric] and result[metric] > base[metric] * (1 + threshold):
+                change = result[metric] / base[metric] - 1
+                found.append(
+                    f"{name}: {metric} {base[metric]} -> {result[metric]} ({change:+.0%})"
+                )
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--db-url", required=True, help="a scratch database")
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="comma-separated numbers of posts",
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", type=Path, help="write the results to this file")
+    parser.add_argument(
+        "--save-baseline", nargs="?", type=Path, const=BASELINE, metavar="PATH"
+    )
+    parser.add_argument(
+        "--baseline", nargs="?", type=Path, const=BASELINE, metavar="PATH"
+    )
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmarks(args))
+    encoded = orjson.dumps(report, option=orjson.OPT_INDENT_2) + b"\n"
+    if args.output is not None:
+        args.output.write_bytes(encoded)
+    else:
+        sys.stdout.write(encoded.decode())
+    if args.save_baseline is not None:
+        args.save_baseline.write_bytes(encoded)
+    if args.baseline is not None:
+        baseline = orjson.loads(args.baseline.read_bytes())
+        found = regressions(report, baseline, args.threshold)
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,33 @@
+import os
+import shutil
 from multiprocessing import cpu_count
 
 
+# Workers write their metrics to memory-mapped files there, merged by /metrics.
+# prometheus_client picks its value class when first imported, so this must be
+# set before anything imports it, or the forked workers keep their samples in
+# memory.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/blog_metrics")
+
 bind = f"0.0.0.0:8000"
-workers = (cpu_count() * 2) + 1
+workers = int(os.environ.get("WEB_CONCURRENCY", (cpu_count() * 2) + 1))
+# Lets each worker take its share of DB_CONNECTION_BUDGET.
+os.environ["WEB_CONCURRENCY"] = str(workers)
 worker_class = "uvicorn.workers.UvicornWorker"
 capture_output = True
 loglevel = "debug"
 proxy_headers = True
 forwarded_allow_ips = "*"
+
+
+def on_starting(server):
+    """Drop the samples of a previous run."""
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    """Stop summing the live gauges of a dead worker."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,61 @@
+"""post search vector
+
+Revision ID: b4b45ed2a8c6
+Revises: 61a7f91ffd0f
+Create Date: 2026-10-18 19:12:31.740050
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b4b45ed2a8c6"
+down_revision: Union[str, None] = "61a7f91ffd0f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The column is stored, so adding it rewrites the table under an exclusive
+    # lock; run it in a maintenance window on large tables.
+    op.add_column(
+        "posts",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('english', title), 'A') || "
+                "setweight(to_tsvector('english', content), 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    # Build the index without locking the table against writes.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_posts_search_vector",
+            "posts",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_posts_search_vector",
+            table_name="posts",
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("posts", "search_vector")
@@ -0,0 +1,50 @@
+"""post filter indexes
+
+Revision ID: ab8dee9923f7
+Revises: b4b45ed2a8c6
+Create Date: 2026-10-18 19:14:04.076770
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "ab8dee9923f7"
+down_revision: Union[str, None] = "b4b45ed2a8c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_posts_title_id", "posts", ["title", "id"]),
+    ("ix_posts_author_id_id", "posts", ["author_id", "id"]),
+    ("ix_posts_author_id_title_id", "posts", ["author_id", "title", "id"]),
+    ("ix_posts_category_id_id", "posts", ["category_id", "id"]),
+    ("ix_posts_category_id_title_id", "posts", ["category_id", "title", "id"]),
+    ("ix_post_tags_tag_id_post_id", "post_tags", ["tag_id", "post_id"]),
+]
+
+
+def upgrade() -> None:
+    # Build the indexes without locking the tables against writes.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
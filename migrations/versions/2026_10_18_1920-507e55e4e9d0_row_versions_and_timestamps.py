@@ -0,0 +1,54 @@
+"""row versions and timestamps
+
+Revision ID: 507e55e4e9d0
+Revises: ab8dee9923f7
+Create Date: 2026-10-18 19:20:41.312508
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "507e55e4e9d0"
+down_revision: Union[str, None] = "ab8dee9923f7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ["authors", "categories", "tags", "posts"]
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                "updated_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.text("now()"),
+                nullable=False,
+            ),
+        )
+    op.add_column(
+        "posts",
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "posts",
+        sa.Column("version", sa.Integer(), server_default=sa.text("1"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("posts", "version")
+    op.drop_column("posts", "created_at")
+    for table in reversed(TABLES):
+        op.drop_column(table, "updated_at")
@@ -0,0 +1,109 @@
+"""post counts
+
+Revision ID: 4523a2434338
+Revises: 507e55e4e9d0
+Create Date: 2026-10-18 19:58:44.548124
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4523a2434338"
+down_revision: Union[str, None] = "507e55e4e9d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COUNT_POSTS_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_posts() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changes text := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT %1$I AS id, 1 AS delta FROM new_rows', TG_ARGV[1])
+        WHEN 'DELETE' THEN format('SELECT %1$I AS id, -1 AS delta FROM old_rows', TG_ARGV[1])
+        ELSE format(
+            'SELECT %1$I AS id, 1 AS delta FROM new_rows '
+            'UNION ALL SELECT %1$I, -1 FROM old_rows',
+            TG_ARGV[1]
+        )
+    END;
+    ids integer[];
+    deltas integer[];
+BEGIN
+    EXECUTE format(
+        'SELECT array_agg(id ORDER BY id), array_agg(delta ORDER BY id) FROM ('
+        '  SELECT id, CAST(sum(delta) AS integer) AS delta FROM (%s) AS changes'
+        '  WHERE id IS NOT NULL GROUP BY id'
+        ') AS deltas WHERE delta <> 0',
+        changes
+    ) INTO ids, deltas;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format(
+        'SELECT 1 FROM %I WHERE id = ANY($1) ORDER BY id FOR UPDATE', TG_ARGV[0]
+    ) USING ids;
+    EXECUTE format(
+        'UPDATE %1$I SET post_count = %1$I.post_count + deltas.delta '
+        'FROM unnest($1, $2) AS deltas (id, delta) WHERE %1$I.id = deltas.id',
+        TG_ARGV[0]
+    ) USING ids, deltas;
+    RETURN NULL;
+END
+$$
+"""
+TRIGGERS = [
+    ("post_tags_count_insert", "post_tags", "INSERT", "tags", "tag_id"),
+    ("post_tags_count_update", "post_tags", "UPDATE", "tags", "tag_id"),
+    ("post_tags_count_delete", "post_tags", "DELETE", "tags", "tag_id"),
+    ("posts_count_insert", "posts", "INSERT", "categories", "category_id"),
+    ("posts_count_update", "posts", "UPDATE", "categories", "category_id"),
+    ("posts_count_delete", "posts", "DELETE", "categories", "category_id"),
+]
+TRANSITION_TABLES = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+}
+
+
+def upgrade() -> None:
+    for table in ("tags", "categories"):
+        op.add_column(
+            table,
+            sa.Column(
+                "post_count", sa.Integer(), server_default=sa.text("0"), nullable=False
+            ),
+        )
+    op.create_index("ix_tags_post_count_id", "tags", ["post_count", "id"])
+    op.execute(COUNT_POSTS_FUNCTION)
+    for name, table, operation, counted, column in TRIGGERS:
+        op.execute(
+            f"CREATE TRIGGER {name} AFTER {operation} ON {table} "
+            f"REFERENCING {TRANSITION_TABLES[operation]} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION count_posts('{counted}', '{column}')"
+        )
+    # Creating the triggers locked posts and post_tags against writes until the
+    # migration commits, so the counts miss none.
+    op.execute(
+        "UPDATE tags SET post_count = counts.post_count FROM ("
+        "SELECT tag_id, count(*) AS post_count FROM post_tags GROUP BY tag_id"
+        ") AS counts WHERE tags.id = counts.tag_id"
+    )
+    op.execute(
+        "UPDATE categories SET post_count = counts.post_count FROM ("
+        "SELECT category_id, count(*) AS post_count FROM posts GROUP BY category_id"
+        ") AS counts WHERE categories.id = counts.category_id"
+    )
+
+
+def downgrade() -> None:
+    for name, table, *_ in reversed(TRIGGERS):
+        op.execute(f"DROP TRIGGER {name} ON {table}")
+    op.execute("DROP FUNCTION count_posts()")
+    op.drop_index("ix_tags_post_count_id", table_name="tags")
+    op.drop_column("categories", "post_count")
+    op.drop_column("tags", "post_count")
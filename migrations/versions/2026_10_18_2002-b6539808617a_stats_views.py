@@ -0,0 +1,74 @@
+"""stats views
+
+Revision ID: b6539808617a
+Revises: 4523a2434338
+Create Date: 2026-10-18 20:02:48.050125
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6539808617a"
+down_revision: Union[str, None] = "4523a2434338"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Name, ID column and query of each view.
+VIEWS = [
+    (
+        "author_daily_posts",
+        "author_id",
+        "SELECT authors.id AS author_id, authors.name, "
+        "CAST(posts.created_at AT TIME ZONE 'UTC' AS date) AS day, "
+        "CAST(count(*) AS integer) AS post_count "
+        "FROM posts JOIN authors ON authors.id = posts.author_id "
+        "GROUP BY authors.id, day",
+    ),
+    (
+        "category_daily_posts",
+        "category_id",
+        "SELECT categories.id AS category_id, categories.name, "
+        "CAST(posts.created_at AT TIME ZONE 'UTC' AS date) AS day, "
+        "CAST(count(*) AS integer) AS post_count "
+        "FROM posts JOIN categories ON categories.id = posts.category_id "
+        "GROUP BY categories.id, day",
+    ),
+    (
+        "tag_daily_posts",
+        "tag_id",
+        "SELECT tags.id AS tag_id, tags.name, "
+        "CAST(posts.created_at AT TIME ZONE 'UTC' AS date) AS day, "
+        "CAST(count(*) AS integer) AS post_count "
+        "FROM post_tags JOIN posts ON posts.id = post_tags.post_id "
+        "JOIN tags ON tags.id = post_tags.tag_id "
+        "GROUP BY tags.id, day",
+    ),
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stats_refreshes",
+        sa.Column("view", sa.String(), nullable=False),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("view"),
+    )
+    for name, key, query in VIEWS:
+        op.execute(f"CREATE MATERIALIZED VIEW {name} AS {query}")
+        op.execute(f"CREATE UNIQUE INDEX ix_{name}_{key}_day ON {name} ({key}, day)")
+        op.execute(
+            f"INSERT INTO stats_refreshes (view, refreshed_at) VALUES ('{name}', now())"
+        )
+
+
+def downgrade() -> None:
+    for name, _, _ in reversed(VIEWS):
+        op.execute(f"DROP MATERIALIZED VIEW {name}")
+    op.drop_table("stats_refreshes")
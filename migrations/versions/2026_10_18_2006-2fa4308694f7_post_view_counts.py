@@ -0,0 +1,31 @@
+"""post view counts
+
+Revision ID: 2fa4308694f7
+Revises: b6539808617a
+Create Date: 2026-10-18 20:06:03.435388
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2fa4308694f7"
+down_revision: Union[str, None] = "b6539808617a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "posts",
+        sa.Column(
+            "view_count", sa.Integer(), server_default=sa.text("0"), nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("posts", "view_count")
@@ -0,0 +1,68 @@
+"""post count lock mode
+
+Revision ID: c16af8a26a3b
+Revises: cfe6e140d6a0
+Create Date: 2026-10-18 20:29:16.478768
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c16af8a26a3b"
+down_revision: Union[str, None] = "cfe6e140d6a0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COUNT_POSTS_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_posts() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changes text := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT %1$I AS id, 1 AS delta FROM new_rows', TG_ARGV[1])
+        WHEN 'DELETE' THEN format('SELECT %1$I AS id, -1 AS delta FROM old_rows', TG_ARGV[1])
+        ELSE format(
+            'SELECT %1$I AS id, 1 AS delta FROM new_rows '
+            'UNION ALL SELECT %1$I, -1 FROM old_rows',
+            TG_ARGV[1]
+        )
+    END;
+    ids integer[];
+    deltas integer[];
+BEGIN
+    EXECUTE format(
+        'SELECT array_agg(id ORDER BY id), array_agg(delta ORDER BY id) FROM ('
+        '  SELECT id, CAST(sum(delta) AS integer) AS delta FROM (%s) AS changes'
+        '  WHERE id IS NOT NULL GROUP BY id'
+        ') AS deltas WHERE delta <> 0',
+        changes
+    ) INTO ids, deltas;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format(
+        'SELECT 1 FROM %I WHERE id = ANY($1) ORDER BY id FOR NO KEY UPDATE',
+        TG_ARGV[0]
+    ) USING ids;
+    EXECUTE format(
+        'UPDATE %1$I SET post_count = %1$I.post_count + deltas.delta '
+        'FROM unnest($1, $2) AS deltas (id, delta) WHERE %1$I.id = deltas.id',
+        TG_ARGV[0]
+    ) USING ids, deltas;
+    RETURN NULL;
+END
+$$
+"""
+# The lock the function took before this revision, which blocked the foreign
+# key checks of concurrent post writes.
+PREVIOUS_LOCK = "FOR UPDATE"
+
+
+def upgrade() -> None:
+    op.execute(COUNT_POSTS_FUNCTION)
+
+
+def downgrade() -> None:
+    op.execute(COUNT_POSTS_FUNCTION.replace("FOR NO KEY UPDATE", PREVIOUS_LOCK))
@@ -0,0 +1,35 @@
+"""outbox transaction ids
+
+Revision ID: c2d39e540a5c
+Revises: c16af8a26a3b
+Create Date: 2026-10-18 20:42:11.417006
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c2d39e540a5c"
+down_revision: Union[str, None] = "c16af8a26a3b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "outbox",
+        sa.Column(
+            "txid",
+            sa.BigInteger(),
+            server_default=sa.text("pg_current_xact_id()::text::bigint"),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("outbox", "txid")
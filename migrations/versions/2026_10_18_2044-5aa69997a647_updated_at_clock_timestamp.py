@@ -0,0 +1,36 @@
+"""updated at clock timestamp
+
+Revision ID: 5aa69997a647
+Revises: c2d39e540a5c
+Create Date: 2026-10-18 20:44:20.358130
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5aa69997a647"
+down_revision: Union[str, None] = "c2d39e540a5c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ["authors", "categories", "tags", "posts"]
+
+
+def upgrade() -> None:
+    # Stamp rows when they are written rather than when their transaction
+    # started, which a write seen earlier may have committed after.
+    for table in TABLES:
+        op.alter_column(
+            table, "updated_at", server_default=sa.text("clock_timestamp()")
+        )
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.alter_column(table, "updated_at", server_default=sa.text("now()"))
@@ -0,0 +1,236 @@
+"""
+Bulk-load authors, categories, tags, posts and post tags with COPY.
+
+Every file is streamed in chunks into its table with asyncpg's
+`copy_records_to_table`, tables are loaded parents first so foreign keys
+always resolve, and the ID sequences are moved past the loaded rows at the
+end. The whole load runs in one transaction, after which the cached list
+responses of the loaded tables are invalidated.
+
+Files are CSV with a header row, or NDJSON (`.ndjson`/`.jsonl`), whose
+fields are columns of the table. Rows of the posts file may carry a `tags`
+list of tag IDs, as written by `GET /api/v1/posts/export.ndjson`, as long as
+they carry their `id` too. In CSV, `tags` is a quoted, comma-separated list
+such as `"1,2"`.
+
+Usage:
+    python -m scripts.bulk_import --authors authors.csv --posts posts.ndjson
+"""
+
+import argparse
+import asyncio
+import csv
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import asyncpg
+import orjson
+from sqlalchemy import Column, Table
+
+from src.authors.models import Author
+from src.categories.models import Category
+from src.config import settings
+from src.posts.models import Post
+from src.response_cache import invalidate_responses
+from src.tags.models import PostTag, Tag
+
+
+CHUNK_SIZE = 10_000
+
+# In foreign key order: a table is only loaded after the tables it references.
+TABLES: Dict[str, Table] = {
+    "authors": Author.__table__,
+    "categories": Category.__table__,
+    "tags": Tag.__table__,
+    "posts": Post.__table__,
+    "post_tags": PostTag.__table__,
+}
+
+
+@dataclass
+class LoadStats:
+    table: str
+    rows: int
+    seconds: float
+
+    def __str__(self) -> str:
+        rate = self.rows / self.seconds if self.seconds else float("inf")
+        return f"{self.table:<12} {self.rows:>12,} rows {self.seconds:>9.2f}s {rate:>12,.0f} rows/s"
+
+
+def asyncpg_dsn(url: str) -> str:
+    """Turn a SQLAlchemy URL into a DSN asyncpg understands."""
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def read_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a CSV or NDJSON file."""
+    if path.suffix in (".ndjson", ".jsonl"):
+        with path.open("rb") as file:
+            for line in file:
+                if line.strip():
+                    yield orjson.loads(line)
+    else:
+        # The csv module handles line endings itself, those in quoted values included.
+        with path.open("r", newline="") as file:
+            yield from csv.DictReader(file)
+
+
+def tag_ids(tags: Any) -> List[int]:
+    """The tag IDs of a post: a JSON list, or a comma-separated CSV value."""
+    if isinstance(tags, str):
+        tags = [tag_id for tag_id in tags.split(",") if tag_id.strip()]
+    if not isinstance(tags, list):
+        raise TypeError(f"tags must be a list of IDs, not {tags!r}")
+    return [int(tag_id) for tag_id in tags]
+
+
+def converter(column: Column) -> Callable[[Any], Any]:
+    """Build a function turning a CSV string or JSON value into the column type."""
+    python_type = column.type.python_type
+
+    def convert(value: Any) -> Any:
+        if value is None or (value == "" and python_type is not str):
+            return None
+        if isinstance(value, python_type):
+            return value
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        return python_type(value)
+
+    return convert
+
+
+def chunked(
+    records: Iterator[Dict[str, Any]], table: Table, size: int
+) -> Iterator[Tuple[List[str], List[tuple], List[tuple]]]:
+    """
+    Group records into chunks of typed rows.
+
+    The columns are those of the first record. Rows of the posts table also
+    yield the `(post_id, tag_id)` links of their `tags` field.
+    """
+    loadable = {
+        column.name: column for column in table.columns if column.computed is None
+    }
+    columns: Optional[List[str]] = None
+    rows, links = [], []
+    for number, record in enumerate(records, start=1):
+        tags = record.pop("tags", None) if table.name == "posts" else None
+        if columns is None:
+            columns = list(record)
+            if unknown := set(columns) - set(loadable):
+                raise SystemExit(f"{table.name}: unknown columns {sorted(unknown)}")
+            convert = [converter(loadable[name]) for name in columns]
+        try:
+            row = tuple(fn(record[name]) for fn, name in zip(convert, columns))
+            tags = tag_ids(tags) if tags else []
+        except (KeyError, TypeError, ValueError) as exc:
+            raise SystemExit(f"{table.name}: invalid record {number}: {exc!r}")
+        rows.append(row)
+        if tags:
+            if "id" not in columns:
+                raise SystemExit("posts: records with tags must carry their id")
+            post_id = row[columns.index("id")]
+            links += [(post_id, tag_id) for tag_id in tags]
+        if len(rows) >= size:
+            yield columns, rows, links
+            rows, links = [], []
+    if rows:
+        yield columns, rows, links
+
+
+async def copy_file(
+    conn: asyncpg.Connection, table: Table, path: Path, chunk_size: int
+) -> List[LoadStats]:
+    """COPY one file into its table, chunk by chunk."""
+    started, loaded, linked = time.perf_counter(), 0, 0
+    for columns, rows, links in chunked(read_records(path), table, chunk_size):
+        await conn.copy_records_to_table(table.name, records=rows, columns=columns)
+        if links:
+            await conn.copy_records_to_table(
+                "post_tags", records=links, columns=["post_id", "tag_id"]
+            )
+        loaded, linked = loaded + len(rows), linked + len(links)
+        elapsed = time.perf_counter() - started
+        print(
+            f"  {table.name}: {loaded:,} rows ({loaded / elapsed:,.0f} rows/s)",
+            end="\r",
+        )
+    print()
+    stats = [LoadStats(table.name, loaded, time.perf_counter() - started)]
+    if linked:
+        stats.append(LoadStats("post_tags", linked, stats[0].seconds))
+    return stats
+
+
+async def reset_sequence(conn: asyncpg.Connection, table: str) -> None:
+    """Move the ID sequence of a table past its highest loaded ID."""
+    await conn.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f"COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+    )
+
+
+async def bulk_import(
+    files: Dict[str, Path], dsn: str, chunk_size: int = CHUNK_SIZE
+) -> List[LoadStats]:
+    """
+    Load the given files into their tables in one transaction.
+
+    Args:
+        files (Dict[str, Path]): The file to load, by table name.
+        dsn (str): The database to load into.
+        chunk_size (int, optional): The number of rows sent per COPY.
+
+    Returns:
+        List[LoadStats]: The rows loaded and time spent per table.
+    """
+    stats: List[LoadStats] = []
+    # Behind PgBouncer, prepared statements may not outlive a transaction.
+    conn = await asyncpg.connect(
+        dsn, statement_cache_size=0 if settings.db_pgbouncer else 100
+    )
+    try:
+        async with conn.transaction():
+            for name, table in TABLES.items():
+                if name in files:
+                    stats += await copy_file(conn, table, files[name], chunk_size)
+            for name in {item.table for item in stats}:
+                await reset_sequence(conn, name)
+    finally:
+        await conn.close()
+    # Links are served as part of the posts.
+    loaded = {item.table.replace("post_tags", "posts") for item in stats}
+    await invalidate_responses(*sorted(loaded))
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    for name in TABLES:
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            type=Path,
+            help=f"CSV or NDJSON file of {name}",
+        )
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--db-url", default=str(settings.db_url))
+    args = parser.parse_args()
+
+    files = {name: getattr(args, name) for name in TABLES if getattr(args, name)}
+    if not files:
+        parser.error("nothing to import")
+    started = time.perf_counter()
+    stats = asyncio.run(bulk_import(files, asyncpg_dsn(args.db_url), args.chunk_size))
+    for item in stats:
+        print(item)
+    total = sum(item.rows for item in stats)
+    print(str(LoadStats("total", total, time.perf_counter() - started)))
+
+
+if __name__ == "__main__":
+    main()
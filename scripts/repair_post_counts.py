@@ -0,0 +1,103 @@
+"""
+Recompute the post counts of tags and categories, in batches.
+
+The triggers of `src.posts.models` keep `post_count` exact, so this is only
+needed after writes that bypassed them, such as a TRUNCATE, a restore with
+triggers disabled, or a load of counts from a file. Each batch locks a range
+of rows in ID order, as the triggers do, recounts it and writes the counts
+that differ, in its own transaction: the API keeps serving, and writes to
+the rows of a batch wait for that batch only.
+
+Usage:
+    python -m scripts.repair_post_counts --batch-size 1000
+"""
+
+import argparse
+import asyncio
+from typing import Dict
+
+import asyncpg
+
+from scripts.bulk_import import asyncpg_dsn
+from src.config import settings
+
+
+BATCH_SIZE = 1_000
+
+# The referencing table and column of each counted table.
+COUNTED: Dict[str, tuple] = {
+    "tags": ("post_tags", "tag_id"),
+    "categories": ("posts", "category_id"),
+}
+
+
+async def repair_batch(
+    conn: asyncpg.Connection, table: str, after: int, batch_size: int
+) -> tuple:
+    """Repair the counts of the next `batch_size` rows with an ID above `after`."""
+    source, column = COUNTED[table]
+    async with conn.transaction():
+        ids = await conn.fetchval(
+            f"SELECT array_agg(id) FROM ("
+            f"  SELECT id FROM {table} WHERE id > $1 ORDER BY id LIMIT $2 FOR UPDATE"
+            f") AS batch",
+            after,
+            batch_size,
+        )
+        if ids is None:
+            return None, 0
+        # Counted after the locks are held, so that no write is missed.
+        status = await conn.execute(
+            f"UPDATE {table} SET post_count = counts.post_count FROM ("
+            f"  SELECT {table}.id, count({source}.{column}) AS post_count"
+            f"  FROM {table} LEFT JOIN {source} ON {source}.{column} = {table}.id"
+            f"  WHERE {table}.id = ANY($1) GROUP BY {table}.id"
+            f") AS counts "
+            f"WHERE {table}.id = counts.id AND {table}.post_count <> counts.post_count",
+            ids,
+        )
+    return ids[-1], int(status.split()[-1])
+
+
+async def repair_post_counts(dsn: str, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """
+    Recompute the post counts of every tag and category.
+
+    Args:
+        dsn (str): The database to repair.
+        batch_size (int, optional): The number of rows recounted per transaction.
+
+    Returns:
+        Dict[str, int]: The number of rows whose count was wrong, by table.
+    """
+    repaired = {table: 0 for table in COUNTED}
+    # Behind PgBouncer, prepared statements may not outlive a transaction.
+    conn = await asyncpg.connect(
+        dsn, statement_cache_size=0 if settings.db_pgbouncer else 100
+    )
+    try:
+        for table in COUNTED:
+            after = 0
+            while after is not None:
+                after, count = await repair_batch(conn, table, after, batch_size)
+                repaired[table] += count
+    finally:
+        await conn.close()
+    return repaired
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--db-url", default=str(settings.db_url))
+    args = parser.parse_args()
+
+    repaired = asyncio.run(
+        repair_post_counts(asyncpg_dsn(args.db_url), args.batch_size)
+    )
+    for table, count in repaired.items():
+        print(f"{table:<12} {count:>12,} counts repaired")
+
+
+if __name__ == "__main__":
+    main()
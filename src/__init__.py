@@ -1,6 +1,8 @@
 from src.authors.router import router as authors
 from src.categories.router import router as categories
-from src.posts.router import router as posts
+from src.changes.router import router as changes
+from src.posts.router import live_router as posts_live, router as posts
+from src.stats.router import router as stats
 from src.tags.router import router as tags
 
 api_routers = [
@@ -8,6 +10,12 @@ api_routers = [
     tags,
     categories,
     posts,
+    stats,
+    changes,
+]
+# WebSocket routes, outside the API prefix.
+ws_routers = [
+    posts_live,
 ]
 
 from .main import app
@@ -1,9 +1,9 @@
 from sqlalchemy.orm import relationship, Mapped
 
-from src.database import Base
+from src.database import Base, Timestamped
 
 
-class Author(Base):
+class Author(Timestamped, Base):
     __tablename__ = "authors"
 
     name: Mapped[str]
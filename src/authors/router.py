@@ -1,19 +1,31 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped
 
+from src.cache import CachedEntity
+from src.conditional import (
+    entity_validators,
+    if_match_header,
+    is_conditional,
+    is_not_modified,
+    not_modified,
+    page_validators,
+    set_validators,
+)
 from src.database import get_async_session
+from src.pagination import Pagination, pagination_params, set_next_cursor
+from src.replicas import get_read_session
 from src.utils import rate_limit
 from .service import (
     delete_author,
-    get_author,
+    get_author_cached,
+    get_authors_validators,
     create_author,
     update_author,
     get_authors,
 )
-from .schemas import AuthorBase, AuthorCreate
+from .schemas import AuthorBase, AuthorCreate, AuthorUpdate
 
 
 router = APIRouter(
@@ -24,34 +36,56 @@ router = APIRouter(
 
 
 @router.get("/", dependencies=[Depends(rate_limit())], response_model=List[AuthorBase])
-async def get_all_authors(session: AsyncSession = Depends(get_async_session)):
+async def get_all_authors(
+    request: Request,
+    response: Response,
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
-    Get all authors.
+    Get a page of authors, ordered by ID.
 
     Parameters:
+        request (Request): The incoming request, checked for `If-None-Match`.
+        response (Response): The outgoing response, used to expose the next cursor and ETag.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        List[AuthorBase]: A list of `AuthorBase` objects representing all authors in the database.
+        List[AuthorBase]: A list of `AuthorBase` objects. The cursor of the next page, if any,
+            is returned in the `X-Next-Cursor` header. 304 if the client's copy of the
+            page is current.
     """
-    return await get_authors(session)
+    if is_conditional(request):
+        validators = await get_authors_validators(session, pagination)
+        if is_not_modified(request, validators):
+            return not_modified(validators)
+    page = await get_authors(session, pagination)
+    set_next_cursor(response, page)
+    set_validators(response, page_validators(page, "updated_at"))
+    return page.items
 
 
 @router.get(
     "/{author_id}", dependencies=[Depends(rate_limit())], response_model=AuthorBase
 )
-async def get_author_by_id(author: Mapped = Depends(get_author)):
+async def get_author_by_id(
+    request: Request, author: CachedEntity = Depends(get_author_cached)
+):
     """
     Get an author by their ID.
 
     Parameters:
         author_id (int): The ID of the author to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        AuthorBase: The `AuthorBase` object with the given ID, or a 404 error if not found.
+        AuthorBase: The `AuthorBase` object with the given ID, or a 404 error if not found,
+            or 304 if the client's copy is current.
     """
-    return author
+    return author.to_response(request)
 
 
 @router.post("/", dependencies=[Depends(rate_limit())], response_model=AuthorBase)
@@ -75,37 +109,73 @@ async def create_new_author(
     "/{author_id}", dependencies=[Depends(rate_limit())], response_model=AuthorBase
 )
 async def update_author_by_id(
+    author_id: int,
     author_data: AuthorCreate,
-    author: Mapped = Depends(get_author),
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Update an author.
+    Replace an author.
 
     Parameters:
+        author_id (int): The ID of the author to update.
         author_data (AuthorCreate): The updated author data.
-        author (Author, optional): The `Author` object to be updated.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        AuthorBase: The updated `AuthorBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
+    """
+    updated = await update_author(author_id, author_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
+
+
+@router.patch(
+    "/{author_id}", dependencies=[Depends(rate_limit())], response_model=AuthorBase
+)
+async def patch_author_by_id(
+    author_id: int,
+    author_data: AuthorUpdate,
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Update the given fields of an author.
+
+    Parameters:
+        author_id (int): The ID of the author to update.
+        author_data (AuthorUpdate): The fields to update. Fields left out are kept.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        AuthorBase: The updated `AuthorBase` object.
+        AuthorBase: The updated `AuthorBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
     """
-    return await update_author(author, author_data, session)
+    updated = await update_author(author_id, author_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
 
 
 @router.delete("/{author_id}", dependencies=[Depends(rate_limit())])
 async def delete_author_by_id(
-    author: Mapped = Depends(get_author),
+    author_id: int,
     session: AsyncSession = Depends(get_async_session),
 ):
     """
     Delete an author.
 
     Parameters:
-        author (Author, optional): The `Author` object to be deleted.
+        author_id (int): The ID of the author to delete.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the author was deleted.
+        str: A message indicating that the author was deleted, or a 404 error if not found.
     """
-    return await delete_author(author, session)
+    return await delete_author(author_id, session)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -8,3 +10,8 @@ class AuthorCreate(BaseModel):
 
 class AuthorBase(AuthorCreate):
     id: int
+
+
+class AuthorUpdate(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
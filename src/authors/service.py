@@ -1,29 +1,62 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import Depends, HTTPException
-from sqlalchemy import delete, select, update
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 
 from src.authors.models import Author
-from src.authors.schemas import AuthorCreate
+from src.authors.schemas import AuthorBase, AuthorCreate, AuthorUpdate
+from src.cache import CachedEntity, author_cache, post_cache, serialize
+from src.changes.service import record_changes
+from src.conditional import (
+    Validators,
+    entity_validators,
+    fetch_page_validators,
+    is_conditional,
+    is_not_modified,
+    missing_or_modified,
+    parse_timestamps,
+    timestamp_etag,
+)
 from src.database import get_async_session
+from src.pagination import Page, Pagination, paginate, pagination_params
+from src.posts.models import Post
+from src.replicas import get_read_session, wrote_recently
+from src.response_cache import invalidate_responses
 
 
 async def get_authors(
-    session: AsyncSession = Depends(get_async_session),
-) -> List[Author]:
-    """Get all authors.
+    session: AsyncSession = Depends(get_read_session),
+    pagination: Pagination = Depends(pagination_params),
+) -> Page[Author]:
+    """Get a page of authors, ordered by ID.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+
+    Returns:
+        Page[Author]: The `Author` objects of the page and the cursor of the next one.
+    """
+    return await paginate(session, select(Author), pagination, [Author.id])
+
+
+async def get_authors_validators(
+    session: AsyncSession, pagination: Pagination
+) -> Validators:
+    """Get the validators of a page of authors from their IDs and timestamps only.
 
     Parameters:
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
 
     Returns:
-        List[Author]: A list of `Author` objects representing all authors in the database.
+        Validators: The ETag of the page.
     """
-    result = await session.execute(select(Author))
-    authors: List[Author] = result.scalars().all()
-    return authors
+    query = select(Author.id, Author.updated_at)
+    return await fetch_page_validators(session, query, pagination, [Author.id])
 
 
 async def get_author(
@@ -47,8 +80,61 @@ async def get_author(
     return response
 
 
+async def get_author_validators(author_id: int, session: AsyncSession) -> Validators:
+    """Get the validators of an author without loading it.
+
+    Parameters:
+        author_id (int): The ID of the author.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Validators: The ETag and Last-Modified of the author, or a 404 error if not found.
+    """
+    query = select(Author.updated_at).where(Author.id == author_id)
+    updated_at = await session.scalar(query)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="Author not found")
+    return Validators(etag=timestamp_etag(updated_at), last_modified=updated_at)
+
+
+async def get_author_cached(
+    author_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+) -> CachedEntity:
+    """Get an author by their ID through the read-through cache.
+
+    Conditional requests that miss the cache are answered from the timestamp of
+    the author alone when the client's copy is current.
+
+    Parameters:
+        author_id (int): The ID of the author to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        CachedEntity: The author serialised as `AuthorBase`, or a 404 error if not found.
+    """
+
+    async def load() -> CachedEntity:
+        author = await get_author(author_id, session)
+        return CachedEntity(serialize(AuthorBase, author), entity_validators(author))
+
+    async def revalidate() -> Optional[Validators]:
+        validators = await get_author_validators(author_id, session)
+        return validators if is_not_modified(request, validators) else None
+
+    return await author_cache.get(
+        author_id,
+        load,
+        revalidate if is_conditional(request) else None,
+        bypass=wrote_recently(request),
+    )
+
+
 async def create_author(author_data: AuthorCreate, session: AsyncSession) -> Author:
-    """Create a new author.
+    """Create a new author and its outbox row with a single statement.
 
     Parameters:
         author_data (AuthorCreate): The author data to be created.
@@ -58,11 +144,16 @@ async def create_author(author_data: AuthorCreate, session: AsyncSession) -> Aut
         Author: The newly created `Author` object.
     """
     try:
-        db_author = Author(**author_data.model_dump())
-        session.add(db_author)
+        inserted = (
+            insert(Author).values(**author_data.model_dump()).returning(Author)
+        ).cte("inserted")
+        query = select(aliased(Author, inserted)).add_cte(
+            record_changes(("author", "create", inserted.c.id)).cte("outbox")
+        )
+        response: Author = await session.scalar(query)
         await session.commit()
-        await session.refresh(db_author)
-        return db_author
+        await invalidate_responses("authors")
+        return response
     except IntegrityError as exc:
         raise HTTPException(
             status_code=400, detail=f"Author creation failed: {str(exc)}"
@@ -70,49 +161,93 @@ async def create_author(author_data: AuthorCreate, session: AsyncSession) -> Aut
 
 
 async def update_author(
-    author: Author, author_data: AuthorCreate, session: AsyncSession
+    author_id: int,
+    author_data: AuthorCreate | AuthorUpdate,
+    session: AsyncSession,
+    if_match: Optional[List[str]] = None,
 ) -> Author:
-    """Update an author.
+    """Update an author and add its outbox row with a single statement.
 
     Parameters:
-        author (Author): The `Author` object to be updated.
-        author_data (AuthorCreate): The updated author data.
+        author_id (int): The ID of the author to update.
+        author_data (AuthorCreate | AuthorUpdate): The new author data. Only the
+            fields set in an `AuthorUpdate` are changed.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        if_match (List[str], optional): Only update the author if its ETag is one of
+            these. The check is part of the UPDATE, so no concurrent write can slip
+            in between.
 
     Returns:
-        Author: The updated `Author` object.
+        Author: The updated `Author` object, a 404 error if not found, or a 412 error
+            if its ETag did not match.
     """
+    values = author_data.model_dump(exclude_unset=isinstance(author_data, AuthorUpdate))
     try:
-        query = (
-            update(Author)
-            .where(Author.id == author.id)
-            .values(**author_data.model_dump())
-            .returning(Author)
-        )
-        result = await session.execute(query)
+        query = update(Author).where(Author.id == author_id)
+        if if_match is not None:
+            query = query.where(Author.updated_at.in_(parse_timestamps(if_match)))
+        # An empty patch still checks the author and its ETag, but changes nothing.
+        query = query.values(**values or {"updated_at": Author.updated_at})
+        updated = query.returning(Author).cte("updated")
+        query = select(aliased(Author, updated))
+        if values:
+            query = query.add_cte(
+                record_changes(("author", "update", updated.c.id)).cte("outbox")
+            )
+        response: Author = await session.scalar(query)
+        if response is None:
+            raise await missing_or_modified(
+                session, Author, author_id, if_match, "Author not found"
+            )
         await session.commit()
-        response: Author = result.scalars().first()
+        await author_cache.invalidate(author_id)
+        await invalidate_responses("authors")
         return response
     except IntegrityError as exc:
         raise HTTPException(status_code=400, detail=f"Author update failed: {str(exc)}")
 
 
-async def delete_author(author: Author, session: AsyncSession) -> str:
-    """Delete an author.
+async def delete_author(author_id: int, session: AsyncSession) -> str:
+    """Delete an author and add its outbox rows with a single statement.
 
     Parameters:
-        author (Author): The `Author` object to be deleted.
+        author_id (int): The ID of the author to delete.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the author was deleted.
+        str: A message indicating that the author was deleted, or a 404 error if
+            not found.
     """
+    # Detach the posts explicitly rather than through ON DELETE SET NULL, to
+    # bump their versions and learn which cached posts reference the author.
+    detached = (
+        update(Post)
+        .where(Post.author_id == author_id)
+        .values(author_id=None, version=Post.version + 1)
+        .returning(Post.id)
+        .cte("detached")
+    )
+    deleted = (
+        delete(Author).where(Author.id == author_id).returning(Author.id).cte("deleted")
+    )
+    outbox = record_changes(
+        ("author", "delete", deleted.c.id), ("post", "update", detached.c.id)
+    ).cte("outbox")
+    query = (
+        select(select(func.array_agg(detached.c.id)).scalar_subquery())
+        .select_from(deleted)
+        .add_cte(detached, outbox)
+    )
     try:
-        query = delete(Author).where(Author.id == author.id)
-        await session.execute(query)
+        row = (await session.execute(query)).first()
         await session.commit()
-        return f"Author with id {author.id} was deleted"
     except Exception as exc:
         raise HTTPException(
             status_code=400, detail=f"Author deletion failed: {str(exc)}"
         )
+    if row is None:
+        raise HTTPException(status_code=404, detail="Author not found")
+    await author_cache.invalidate(author_id)
+    await post_cache.invalidate(*row[0] or ())
+    await invalidate_responses("authors", "posts")
+    return f"Author with id {author_id} was deleted"
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from src.conditional import Validators, is_not_modified
+from src.config import settings
+from src.metrics import CACHE_FAILURES, CACHE_LOOKUPS, BufferedCounter, publisher
+from src.redis import cache_redis
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_ERRORS = (RedisError, OSError, asyncio.TimeoutError)
+
+# Store the loaded value only while this loader still holds the fill lock.
+# `invalidate` deletes the lock, so a value read before a concurrent write
+# committed can never be stored after that write invalidated the key.
+STORE_IF_LOCKED = """
+if redis.call('get', KEYS[2]) == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    redis.call('del', KEYS[2])
+    return 1
+end
+return 0
+"""
+
+# Delayed invalidations, referenced until they run.
+_delayed: Set[asyncio.Task] = set()
+
+
+def repeat_after_replica_lag(invalidate: Callable[[], Awaitable[None]]) -> None:
+    """
+    Run an invalidation again once the replicas have replayed the write.
+
+    A read served by a replica that is behind can refill the cache with the old
+    row after the first invalidation. Replicas lagging more than
+    `db_replica_max_lag` stop taking reads within a check interval, which
+    bounds how long such an entry survives.
+    """
+    if not settings.db_replica_urls:
+        return
+
+    async def repeat() -> None:
+        await asyncio.sleep(
+            settings.db_replica_max_lag + settings.db_replica_check_interval
+        )
+        await invalidate()
+
+    task = asyncio.create_task(repeat())
+    _delayed.add(task)
+    task.add_done_callback(_delayed.discard)
+
+
+@dataclass
+class CachedEntity:
+    body: Optional[bytes]
+    validators: Validators
+    hit: bool = False
+
+    def pack(self) -> bytes:
+        """Prefix the body with a line holding its validators."""
+        last_modified = self.validators.last_modified
+        header = [self.validators.etag, last_modified and last_modified.isoformat()]
+        return orjson.dumps(header) + b"\n" + self.body
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "CachedEntity":
+        header, body = data.split(b"\n", 1)
+        etag, last_modified = orjson.loads(header)
+        if last_modified is not None:
+            last_modified = datetime.fromisoformat(last_modified)
+        return cls(body, Validators(etag, last_modified), hit=True)
+
+    def to_response(self, request: Request) -> Response:
+        """Answer 304 if the client's copy is current, else the serialised entity."""
+        headers = {"X-Cache": "HIT" if self.hit else "MISS"}
+        headers.update(self.validators.headers())
+        if self.body is None or is_not_modified(request, self.validators):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=self.body, media_type="application/json", headers=headers
+        )
+
+
+def serialize(schema: type[BaseModel], obj) -> bytes:
+    """Serialise an ORM object exactly like the `response_model` of a route would."""
+    return orjson.dumps(schema.model_validate(obj, from_attributes=True).model_dump())
+
+
+class EntityCache:
+    """
+    A read-through cache of serialised entities, keyed by ID.
+
+    Misses are filled by a single loader per key: concurrent misses in the same
+    worker await the same load, and across workers only the holder of a short
+    Redis lock queries the database while the others poll for the value.
+    Any Redis failure falls back to the loader, so the cache never makes a
+    request fail. Hits, misses and failures are counted on `/metrics`.
+    """
+
+    def __init__(self, namespace: str, ttl: int = settings.cache_ttl):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = publisher.counter(CACHE_LOOKUPS, namespace, "hit")
+        self.misses = publisher.counter(CACHE_LOOKUPS, namespace, "miss")
+        self.errors: Dict[str, BufferedCounter] = {}
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    def key(self, entity_id: int) -> str:
+        return f"cache:{self.namespace}:{entity_id}"
+
+    def lock_key(self, entity_id: int) -> str:
+        return f"{self.key(entity_id)}:lock"
+
+    async def get(
+        self,
+        entity_id: int,
+        loader: Callable[[], Awaitable[CachedEntity]],
+        revalidate: Optional[Callable[[], Awaitable[Optional[Validators]]]] = None,
+        bypass: bool = False,
+    ) -> CachedEntity:
+        """
+        Get a serialised entity from the cache, loading it on a miss.
+
+        Args:
+            entity_id (int): The ID of the entity.
+            loader (Callable[[], Awaitable[CachedEntity]]): Loads and serialises the
+                entity from the database. Exceptions it raises (e.g. a 404) are
+                propagated and nothing is cached.
+            revalidate (Callable[[], Awaitable[Validators]], optional): Checks the
+                client's validators against the database with a query cheaper than
+                the loader. On a miss, if it returns validators the client's copy
+                is current, and an entity without a body is returned unloaded.
+            bypass (bool, optional): Load the entity without reading or filling the
+                cache, e.g. for a client that must see its own recent writes.
+
+        Returns:
+            CachedEntity: The serialised entity and whether it came from the cache.
+        """
+        if bypass:
+            return await loader()
+        try:
+            data = await cache_redis.get(self.key(entity_id))
+        except CACHE_ERRORS as exc:
+            self._on_error("get", exc)
+            if revalidate is not None and (validators := await revalidate()):
+                return CachedEntity(None, validators)
+            return await loader()
+        if data is not None:
+            try:
+                entity = CachedEntity.unpack(data)
+            except ValueError as exc:
+                self._on_error("unpack", exc)
+            else:
+                self.hits.inc()
+                return entity
+
+        self.misses.inc()
+        if revalidate is not None and (validators := await revalidate()):
+            return CachedEntity(None, validators)
+        inflight = self._inflight.get(entity_id)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[entity_id] = future
+        try:
+            entity = await self._fill(entity_id, loader)
+            future.set_result(entity)
+            return entity
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark as retrieved when nobody else awaits it.
+            raise
+        finally:
+            del self._inflight[entity_id]
+
+    async def _fill(
+        self, entity_id: int, loader: Callable[[], Awaitable[CachedEntity]]
+    ) -> CachedEntity:
+        token = uuid.uuid4().hex
+        lock_ms = settings.cache_lock_timeout_ms
+        try:
+            locked = await cache_redis.set(
+                self.lock_key(entity_id), token, nx=True, px=lock_ms
+            )
+            if not locked:
+                entity = await self._wait_for_fill(entity_id, lock_ms)
+                if entity is not None:
+                    return entity
+        except CACHE_ERRORS as exc:
+            self._on_error("lock", exc)
+            return await loader()
+
+        entity = await loader()
+        if locked:
+            # Jitter the TTL so entries filled together do not expire together.
+            ttl = self.ttl + random.randint(0, max(1, self.ttl // 10))
+            try:
+                await cache_redis.eval(
+                    STORE_IF_LOCKED,
+                    2,
+                    self.key(entity_id),
+                    self.lock_key(entity_id),
+                    token,
+                    entity.pack(),
+                    ttl,
+                )
+            except CACHE_ERRORS as exc:
+                self._on_error("set", exc)
+        return entity
+
+    async def _wait_for_fill(self, entity_id: int, lock_ms: int) -> CachedEntity | None:
+        """Poll for the value another worker is loading, for at most `lock_ms`."""
+        delay, waited = 0.005, 0.0
+        while waited * 1000 < lock_ms:
+            await asyncio.sleep(delay)
+            waited += delay
+            data = await cache_redis.get(self.key(entity_id))
+            if data is not None:
+                entity = CachedEntity.unpack(data)
+                entity.hit = False
+                return entity
+            delay = min(delay * 2, 0.05)
+        return None
+
+    async def invalidate(self, *entity_ids: int) -> None:
+        """
+        Drop cached entities after a write.
+
+        Call it after the transaction has committed, so a concurrent miss cannot
+        reload the old row. The fill locks are dropped as well, which stops
+        in-flight loaders from storing what they read before the write.
+        """
+        if not entity_ids:
+            return
+        keys = [self.key(entity_id) for entity_id in entity_ids]
+        keys += [self.lock_key(entity_id) for entity_id in entity_ids]
+        await self._delete(keys)
+        repeat_after_replica_lag(lambda: self._delete(keys))
+
+    async def _delete(self, keys: List[str]) -> None:
+        try:
+            await cache_redis.delete(*keys)
+        except CACHE_ERRORS as exc:
+            self._on_error("invalidate", exc)
+
+    def _on_error(self, operation: str, exc: Exception) -> None:
+        errors = self.errors.get(operation)
+        if errors is None:
+            errors = self.errors[operation] = publisher.counter(
+                CACHE_FAILURES, self.namespace, operation
+            )
+        errors.inc()
+        logger.warning("Cache %s failed for %r: %s", operation, self.namespace, exc)
+
+
+author_cache = EntityCache("authors")
+category_cache = EntityCache("categories")
+tag_cache = EntityCache("tags")
+post_cache = EntityCache("posts")
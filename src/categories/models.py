@@ -1,10 +1,13 @@
-from sqlalchemy.orm import relationship, Mapped
+from sqlalchemy import text
+from sqlalchemy.orm import relationship, Mapped, mapped_column
 
-from src.database import Base
+from src.database import Base, Timestamped
 
 
-class Category(Base):
+class Category(Timestamped, Base):
     __tablename__ = "categories"
 
     name: Mapped[str]
+    # The number of posts in the category, kept by the triggers of `src.posts.models`.
+    post_count: Mapped[int] = mapped_column(server_default=text("0"))
     posts: Mapped[list["Post"]] = relationship(back_populates="category")
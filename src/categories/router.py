@@ -1,18 +1,30 @@
-from typing import List
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped
 
+from src.cache import CachedEntity
+from src.conditional import (
+    entity_validators,
+    if_match_header,
+    is_conditional,
+    is_not_modified,
+    not_modified,
+    page_validators,
+    set_validators,
+)
 from src.database import get_async_session
+from src.pagination import Pagination, pagination_params, set_next_cursor
+from src.replicas import get_read_session
 from src.utils import rate_limit
 from .service import (
-    get_category,
+    get_category_cached,
+    get_categories_validators,
     get_categories,
     create_category,
     update_category,
     delete_category,
 )
-from .schemas import CategoryBase, CategoryCreate
+from .schemas import CategoryBase, CategoryCreate, CategoryUpdate
 
 
 router = APIRouter(
@@ -25,34 +37,56 @@ router = APIRouter(
 @router.get(
     "/", dependencies=[Depends(rate_limit())], response_model=List[CategoryBase]
 )
-async def get_all_categories(session: AsyncSession = Depends(get_async_session)):
+async def get_all_categories(
+    request: Request,
+    response: Response,
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
-    Get all categories.
+    Get a page of categories, ordered by ID.
 
     Parameters:
+        request (Request): The incoming request, checked for `If-None-Match`.
+        response (Response): The outgoing response, used to expose the next cursor and ETag.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        List[CategoryBase]: A list of `CategoryBase` objects representing all categories in the database.
+        List[CategoryBase]: A list of `CategoryBase` objects. The cursor of the next page, if any,
+            is returned in the `X-Next-Cursor` header. 304 if the client's copy of the
+            page is current.
     """
-    return await get_categories(session)
+    if is_conditional(request):
+        validators = await get_categories_validators(session, pagination)
+        if is_not_modified(request, validators):
+            return not_modified(validators)
+    page = await get_categories(session, pagination)
+    set_next_cursor(response, page)
+    set_validators(response, page_validators(page, "updated_at"))
+    return page.items
 
 
 @router.get(
     "/{category_id}", dependencies=[Depends(rate_limit())], response_model=CategoryBase
 )
-async def get_category_by_id(category: Mapped = Depends(get_category)):
+async def get_category_by_id(
+    request: Request, category: CachedEntity = Depends(get_category_cached)
+):
     """
     Get an category by their ID.
 
     Parameters:
         category_id (int): The ID of the category to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        CategoryBase: The `CategoryBase` object with the given ID, or a 404 error if not found.
+        CategoryBase: The `CategoryBase` object with the given ID, or a 404 error if not found,
+            or 304 if the client's copy is current.
     """
-    return category
+    return category.to_response(request)
 
 
 @router.post("/", dependencies=[Depends(rate_limit())], response_model=CategoryBase)
@@ -76,37 +110,73 @@ async def create_new_category(
     "/{category_id}", dependencies=[Depends(rate_limit())], response_model=CategoryBase
 )
 async def update_category_by_id(
+    category_id: int,
     category_data: CategoryCreate,
-    category: Mapped = Depends(get_category),
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Update an category.
+    Replace an category.
 
     Parameters:
+        category_id (int): The ID of the category to update.
         category_data (CategoryCreate): The updated category data.
-        category (Category, optional): The `Category` object to be updated.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        CategoryBase: The updated `CategoryBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
+    """
+    updated = await update_category(category_id, category_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
+
+
+@router.patch(
+    "/{category_id}", dependencies=[Depends(rate_limit())], response_model=CategoryBase
+)
+async def patch_category_by_id(
+    category_id: int,
+    category_data: CategoryUpdate,
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Update the given fields of an category.
+
+    Parameters:
+        category_id (int): The ID of the category to update.
+        category_data (CategoryUpdate): The fields to update. Fields left out are kept.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        CategoryBase: The updated `CategoryBase` object.
+        CategoryBase: The updated `CategoryBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
     """
-    return await update_category(category, category_data, session)
+    updated = await update_category(category_id, category_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
 
 
 @router.delete("/{category_id}", dependencies=[Depends(rate_limit())])
 async def delete_category_by_id(
-    category: Mapped = Depends(get_category),
+    category_id: int,
     session: AsyncSession = Depends(get_async_session),
 ):
     """
     Delete an category.
 
     Parameters:
-        category (Category, optional): The `Category` object to be deleted.
+        category_id (int): The ID of the category to delete.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the category was deleted.
+        str: A message indicating that the category was deleted, or a 404 error if not found.
     """
-    return await delete_category(category, session)
+    return await delete_category(category_id, session)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -7,3 +9,7 @@ class CategoryCreate(BaseModel):
 
 class CategoryBase(CategoryCreate):
     id: int
+
+
+class CategoryUpdate(BaseModel):
+    name: Optional[str] = None
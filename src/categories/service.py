@@ -1,29 +1,62 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import Depends, HTTPException
-from sqlalchemy import delete, select, update
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 
 from .models import Category
-from .schemas import CategoryCreate
+from .schemas import CategoryBase, CategoryCreate, CategoryUpdate
+from src.cache import CachedEntity, category_cache, post_cache, serialize
+from src.changes.service import record_changes
+from src.conditional import (
+    Validators,
+    entity_validators,
+    fetch_page_validators,
+    is_conditional,
+    is_not_modified,
+    missing_or_modified,
+    parse_timestamps,
+    timestamp_etag,
+)
 from src.database import get_async_session
+from src.pagination import Page, Pagination, paginate, pagination_params
+from src.posts.models import Post, after_posts
+from src.replicas import get_read_session, wrote_recently
+from src.response_cache import invalidate_responses
 
 
 async def get_categories(
-    session: AsyncSession = Depends(get_async_session),
-) -> List[Category]:
-    """Get all categories.
+    session: AsyncSession = Depends(get_read_session),
+    pagination: Pagination = Depends(pagination_params),
+) -> Page[Category]:
+    """Get a page of categories, ordered by ID.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+
+    Returns:
+        Page[Category]: The `Category` objects of the page and the cursor of the next one.
+    """
+    return await paginate(session, select(Category), pagination, [Category.id])
+
+
+async def get_categories_validators(
+    session: AsyncSession, pagination: Pagination
+) -> Validators:
+    """Get the validators of a page of categories from their IDs and timestamps only.
 
     Parameters:
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
 
     Returns:
-        List[Category]: A list of `Category` objects representing all categories in the database.
+        Validators: The ETag of the page.
     """
-    result = await session.execute(select(Category))
-    categories: List[Category] = result.scalars().all()
-    return categories
+    query = select(Category.id, Category.updated_at)
+    return await fetch_page_validators(session, query, pagination, [Category.id])
 
 
 async def get_category(
@@ -47,10 +80,67 @@ async def get_category(
     return response
 
 
+async def get_category_validators(
+    category_id: int, session: AsyncSession
+) -> Validators:
+    """Get the validators of a category without loading it.
+
+    Parameters:
+        category_id (int): The ID of the category.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Validators: The ETag and Last-Modified of the category, or a 404 error if not found.
+    """
+    query = select(Category.updated_at).where(Category.id == category_id)
+    updated_at = await session.scalar(query)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return Validators(etag=timestamp_etag(updated_at), last_modified=updated_at)
+
+
+async def get_category_cached(
+    category_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+) -> CachedEntity:
+    """Get an category by their ID through the read-through cache.
+
+    Conditional requests that miss the cache are answered from the timestamp of
+    the category alone when the client's copy is current.
+
+    Parameters:
+        category_id (int): The ID of the category to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        CachedEntity: The category serialised as `CategoryBase`, or a 404 error if not found.
+    """
+
+    async def load() -> CachedEntity:
+        category = await get_category(category_id, session)
+        return CachedEntity(
+            serialize(CategoryBase, category), entity_validators(category)
+        )
+
+    async def revalidate() -> Optional[Validators]:
+        validators = await get_category_validators(category_id, session)
+        return validators if is_not_modified(request, validators) else None
+
+    return await category_cache.get(
+        category_id,
+        load,
+        revalidate if is_conditional(request) else None,
+        bypass=wrote_recently(request),
+    )
+
+
 async def create_category(
     category_data: CategoryCreate, session: AsyncSession
 ) -> Category:
-    """Create a new category.
+    """Create a new category and its outbox row with a single statement.
 
     Parameters:
         category_data (CategoryCreate): The category data to be created.
@@ -60,11 +150,16 @@ async def create_category(
         Category: The newly created `Category` object.
     """
     try:
-        db_category = Category(**category_data.model_dump())
-        session.add(db_category)
+        inserted = (
+            insert(Category).values(**category_data.model_dump()).returning(Category)
+        ).cte("inserted")
+        query = select(aliased(Category, inserted)).add_cte(
+            record_changes(("category", "create", inserted.c.id)).cte("outbox")
+        )
+        response: Category = await session.scalar(query)
         await session.commit()
-        await session.refresh(db_category)
-        return db_category
+        await invalidate_responses("categories")
+        return response
     except IntegrityError as exc:
         raise HTTPException(
             status_code=400, detail=f"Category creation failed: {str(exc)}"
@@ -72,28 +167,49 @@ async def create_category(
 
 
 async def update_category(
-    category: Category, category_data: CategoryCreate, session: AsyncSession
+    category_id: int,
+    category_data: CategoryCreate | CategoryUpdate,
+    session: AsyncSession,
+    if_match: Optional[List[str]] = None,
 ) -> Category:
-    """Update an category.
+    """Update a category and add its outbox row with a single statement.
 
     Parameters:
-        category (Category): The `Category` object to be updated.
-        category_data (CategoryCreate): The updated category data.
+        category_id (int): The ID of the category to update.
+        category_data (CategoryCreate | CategoryUpdate): The new category data. Only the
+            fields set in a `CategoryUpdate` are changed.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        if_match (List[str], optional): Only update the category if its ETag is one of
+            these. The check is part of the UPDATE, so no concurrent write can slip
+            in between.
 
     Returns:
-        Category: The updated `Category` object.
+        Category: The updated `Category` object, a 404 error if not found, or a 412 error
+            if its ETag did not match.
     """
+    values = category_data.model_dump(
+        exclude_unset=isinstance(category_data, CategoryUpdate)
+    )
     try:
-        query = (
-            update(Category)
-            .where(Category.id == category.id)
-            .values(**category_data.model_dump())
-            .returning(Category)
-        )
-        result = await session.execute(query)
+        query = update(Category).where(Category.id == category_id)
+        if if_match is not None:
+            query = query.where(Category.updated_at.in_(parse_timestamps(if_match)))
+        # An empty patch still checks the category and its ETag, but changes nothing.
+        query = query.values(**values or {"updated_at": Category.updated_at})
+        updated = query.returning(Category).cte("updated")
+        query = select(aliased(Category, updated))
+        if values:
+            query = query.add_cte(
+                record_changes(("category", "update", updated.c.id)).cte("outbox")
+            )
+        response: Category = await session.scalar(query)
+        if response is None:
+            raise await missing_or_modified(
+                session, Category, category_id, if_match, "Category not found"
+            )
         await session.commit()
-        response: Category = result.scalars().first()
+        await category_cache.invalidate(category_id)
+        await invalidate_responses("categories")
         return response
     except IntegrityError as exc:
         raise HTTPException(
@@ -101,22 +217,50 @@ async def update_category(
         )
 
 
-async def delete_category(category: Category, session: AsyncSession) -> str:
-    """Delete an category.
+async def delete_category(category_id: int, session: AsyncSession) -> str:
+    """Delete a category and add its outbox rows with a single statement.
 
     Parameters:
-        category (Category): The `Category` object to be deleted.
+        category_id (int): The ID of the category to delete.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the category was deleted.
+        str: A message indicating that the category was deleted, or a 404 error if
+            not found.
     """
+    # Detach the posts explicitly rather than through ON DELETE SET NULL, to
+    # bump their versions and learn which cached posts reference the category.
+    detached = (
+        update(Post)
+        .where(Post.category_id == category_id)
+        .values(category_id=None, version=Post.version + 1)
+        .returning(Post.id)
+        .cte("detached")
+    )
+    deleted = (
+        delete(Category)
+        .where(Category.id == category_id, after_posts(detached))
+        .returning(Category.id)
+        .cte("deleted")
+    )
+    outbox = record_changes(
+        ("category", "delete", deleted.c.id), ("post", "update", detached.c.id)
+    ).cte("outbox")
+    query = (
+        select(select(func.array_agg(detached.c.id)).scalar_subquery())
+        .select_from(deleted)
+        .add_cte(detached, outbox)
+    )
     try:
-        query = delete(Category).where(Category.id == category.id)
-        await session.execute(query)
+        row = (await session.execute(query)).first()
         await session.commit()
-        return f"Category with id {category.id} was deleted"
     except Exception as exc:
         raise HTTPException(
             status_code=400, detail=f"Category deletion failed: {str(exc)}"
         )
+    if row is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    await category_cache.invalidate(category_id)
+    await post_cache.invalidate(*row[0] or ())
+    await invalidate_responses("categories", "posts")
+    return f"Category with id {category_id} was deleted"
@@ -0,0 +1,5 @@
+from .models import OutboxEntry
+
+__all__ = [
+    "OutboxEntry",
+]
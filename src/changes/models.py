@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+
+
+class OutboxEntry(Base):
+    """A write not yet published to the change stream, deleted once it is."""
+
+    __tablename__ = "outbox"
+
+    entity: Mapped[str]
+    entity_id: Mapped[int]
+    operation: Mapped[str]
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    # The transaction that wrote the change, so that the relay can wait for
+    # the transactions older than it to end.
+    txid: Mapped[int] = mapped_column(
+        BigInteger, server_default=text("pg_current_xact_id()::text::bigint")
+    )
@@ -0,0 +1,37 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from src.pagination import MAX_PAGE_SIZE
+from src.utils import rate_limit
+from .schemas import ChangePage
+from .service import get_changes
+
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["Changes"],
+)
+
+
+@router.get("/", dependencies=[Depends(rate_limit())], response_model=ChangePage)
+async def get_changes_since(
+    since: Optional[str] = Query(
+        None, description="The offset of the last change read, e.g. `next`."
+    ),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Get the writes to posts, tags, authors and categories after an offset.
+
+    Parameters:
+        since (str, optional): The offset of the last change read. The oldest change
+            kept is read first without it.
+        limit (int, optional): The maximum number of changes to return.
+
+    Returns:
+        ChangePage: The changes in the order they were published, and the offset
+            to pass as `since` next. 410 if changes after `since` are no longer
+            kept, in which case consumers rescan and read on from the start.
+    """
+    return await get_changes(since, limit)
@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+
+class Change(BaseModel):
+    # The ID of the entry in the stream, to pass as `since` to read on after it.
+    offset: str
+    # The ID of the outbox row. A change published twice carries the same one.
+    outbox_id: int
+    entity: Literal["author", "category", "tag", "post"]
+    entity_id: int
+    operation: Literal["create", "update", "delete"]
+    occurred_at: datetime
+
+
+class ChangePage(BaseModel):
+    changes: List[Change]
+    # The offset to read the next page from, or `since` if there was nothing new.
+    next: Optional[str] = None
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import re
+import uuid
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from redis.exceptions import ResponseError
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Insert,
+    String,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    union_all,
+)
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+
+from src.cache import CACHE_ERRORS
+from src.config import settings
+from src.database import async_session_maker
+from src.redis import redis
+from .models import OutboxEntry
+from .schemas import Change, ChangePage
+
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "changes"
+LOCK_KEY = "changes:relay:lock"
+LOCK_TIMEOUT_MS = 60_000
+UNLOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+EXTEND = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+STREAM_ID = re.compile(r"^\d+(-\d+)?$")
+
+# The entity, operation and written IDs of a change.
+ChangeSpec = Tuple[str, str, ColumnElement[int]]
+
+
+def record_changes(*changes: ChangeSpec) -> Insert:
+    """
+    Build the INSERT of the outbox rows of a write.
+
+    Attached to the statement of the write as a CTE, or run in its transaction,
+    it commits or rolls back with the write itself.
+
+    Args:
+        *changes (ChangeSpec): The entity, the operation and a column of the IDs
+            written, such as the `id` of the CTE of the write.
+
+    Returns:
+        Insert: The statement adding one outbox row per written ID.
+    """
+    rows = [
+        select(literal(entity), entity_ids, literal(operation))
+        for entity, operation, entity_ids in changes
+    ]
+    return insert(OutboxEntry).from_select(
+        ["entity", "entity_id", "operation"],
+        rows[0] if len(rows) == 1 else union_all(*rows),
+    )
+
+
+def _parse_offset(offset: str) -> Tuple[int, int]:
+    milliseconds, _, sequence = offset.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+async def get_changes(since: Optional[str], limit: int) -> ChangePage:
+    """
+    Read the changes published after a stream offset.
+
+    Args:
+        since (str, optional): The offset of the last change read, or None to
+            read from the oldest change kept.
+        limit (int): The maximum number of changes to return.
+
+    Returns:
+        ChangePage: The changes, oldest first, and the offset to read on from. A 400
+            error if `since` is not a stream ID, a 410 error if changes after it
+            were trimmed from the stream, or a 503 error if Redis is unavailable.
+    """
+    if since is not None and not STREAM_ID.match(since):
+        raise HTTPException(status_code=400, detail="Invalid offset")
+    try:
+        oldest = await redis.xrange(STREAM_KEY, count=1)
+        entries = await redis.xrange(
+            STREAM_KEY, min="-" if since is None else f"({since}", count=limit
+        )
+    except CACHE_ERRORS:
+        raise HTTPException(status_code=503, detail="Changes are unavailable")
+    # The change at `since` itself is gone, so others after it may be too.
+    if since is not None and oldest:
+        if _parse_offset(since) < _parse_offset(oldest[0][0]):
+            raise HTTPException(
+                status_code=410,
+                detail="Changes after this offset were trimmed, read from the start",
+            )
+    changes = [
+        Change(offset=offset, outbox_id=fields.pop("id"), **fields)
+        for offset, fields in entries
+    ]
+    return ChangePage(changes=changes, next=changes[-1].offset if changes else since)
+
+
+class OutboxRelay:
+    """
+    Publish the outbox to the change stream every `interval` seconds.
+
+    The worker holding a Redis lock reads the outbox in ID order, `batch_size`
+    rows at a time, appends them to the stream in one pipeline, then deletes
+    them. IDs are taken when rows are inserted, not when they commit, so a row
+    is only read once every transaction older than its own has ended: a slow
+    transaction holding a lower ID is never overtaken by the rows after it,
+    at the cost of waiting for the longest running transaction. The lock is
+    extended before each batch, and the relay stops if it was lost. The
+    stream is trimmed to about `maxlen` entries. Rows are deleted
+    only once published, so a relay that fails in between publishes them
+    again: delivery is at least once, and consumers tell duplicates apart by
+    their `id`. Consumers may read through `GET /changes` or, for delivery
+    tracked per consumer, through the consumer groups created at start.
+    """
+
+    def __init__(
+        self,
+        session_maker: sessionmaker = async_session_maker,
+        interval: float = settings.outbox_relay_interval,
+        batch_size: int = settings.outbox_batch_size,
+        maxlen: int = settings.changes_stream_maxlen,
+        groups: List[str] = settings.changes_consumer_groups,
+    ):
+        self.session_maker = session_maker
+        self.interval = interval
+        self.batch_size = batch_size
+        self.maxlen = maxlen
+        self.groups = groups
+        self._task: Optional[asyncio.Task] = None
+
+    async def create_groups(self) -> None:
+        """Create the consumer groups that do not exist yet, from the oldest change kept."""
+        for group in self.groups:
+            try:
+                await redis.xgroup_create(STREAM_KEY, group, id="0", mkstream=True)
+            except ResponseError as exc:
+                if "BUSYGROUP" not in str(exc):
+                    raise
+
+    async def relay(self) -> int:
+        """Publish the outbox if no other worker is, returning how many rows were."""
+        token = uuid.uuid4().hex
+        if not await redis.set(LOCK_KEY, token, nx=True, px=LOCK_TIMEOUT_MS):
+            return 0
+        published = 0
+        # The oldest transaction still running when the batch is read.
+        oldest_running = func.pg_snapshot_xmin(func.pg_current_snapshot())
+        try:
+            async with self.session_maker() as session:
+                while True:
+                    if not await redis.eval(
+                        EXTEND, 1, LOCK_KEY, token, LOCK_TIMEOUT_MS
+                    ):
+                        logger.warning("Outbox relay lock lost, stopping")
+                        return published
+                    query = (
+                        select(OutboxEntry)
+                        .where(
+                            OutboxEntry.txid
+                            < oldest_running.cast(String).cast(BigInteger)
+                        )
+                        .order_by(OutboxEntry.id)
+                        .limit(self.batch_size)
+                    )
+                    entries = (await session.scalars(query)).all()
+                    if not entries:
+                        return published
+                    async with redis.pipeline(transaction=False) as pipe:
+                        for entry in entries:
+                            pipe.xadd(
+                                STREAM_KEY,
+                                {
+                                    "id": entry.id,
+                                    "entity": entry.entity,
+                                    "entity_id": entry.entity_id,
+                                    "operation": entry.operation,
+                                    "occurred_at": entry.created_at.isoformat(),
+                                },
+                                maxlen=self.maxlen,
+                                approximate=True,
+                            )
+                        await pipe.execute()
+                    ids = [entry.id for entry in entries]
+                    await session.execute(
+                        delete(OutboxEntry).where(OutboxEntry.id.in_(ids))
+                    )
+                    await session.commit()
+                    published += len(entries)
+                    if len(entries) < self.batch_size:
+                        return published
+        finally:
+            await redis.eval(UNLOCK, 1, LOCK_KEY, token)
+
+    async def _run(self) -> None:
+        try:
+            await self.create_groups()
+        except CACHE_ERRORS as exc:
+            logger.warning("Change stream consumer groups not created: %s", exc)
+        while True:
+            try:
+                await self.relay()
+            except CACHE_ERRORS + (SQLAlchemyError,) as exc:
+                logger.warning("Outbox not relayed: %s", exc)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+relay = OutboxRelay()
@@ -0,0 +1,208 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional, Sequence
+
+import orjson
+from fastapi import Header, HTTPException, Request, Response
+from sqlalchemy import Select, exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from src.pagination import Page, Pagination, paginate
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass
+class Validators:
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(
+                self.last_modified.astimezone(timezone.utc), usegmt=True
+            )
+        return headers
+
+
+def version_etag(version: int) -> str:
+    """The strong ETag of a row with a version counter."""
+    return f'"{version}"'
+
+
+def timestamp_etag(updated_at: datetime) -> str:
+    """The strong ETag of a row stamped with `updated_at`, to the microsecond."""
+    return f'"{(updated_at - EPOCH) // MICROSECOND}"'
+
+
+def parse_versions(etags: Sequence[str]) -> List[int]:
+    """The versions of the ETags made by `version_etag`, skipping any other."""
+    return [int(etag.strip('"')) for etag in etags if etag.strip('"').isdigit()]
+
+
+def parse_timestamps(etags: Sequence[str]) -> List[datetime]:
+    """The timestamps of the ETags made by `timestamp_etag`, skipping any other."""
+    return [EPOCH + int(etag) * MICROSECOND for etag in parse_versions(etags)]
+
+
+def page_etag(stamps: Sequence[Any], next_cursor: Optional[str] = None) -> str:
+    """The strong ETag of a page, derived from the `(id, stamp)` of its rows."""
+    digest = blake2b(orjson.dumps([stamps, next_cursor]), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def entity_validators(entity) -> Validators:
+    """The validators of a row, from its `version` if it has one."""
+    version = getattr(entity, "version", None)
+    etag = (
+        version_etag(version)
+        if version is not None
+        else timestamp_etag(entity.updated_at)
+    )
+    return Validators(etag=etag, last_modified=entity.updated_at)
+
+
+def _split(header: str) -> List[str]:
+    return [etag.strip() for etag in header.split(",") if etag.strip()]
+
+
+def is_conditional(request: Request) -> bool:
+    """Whether the request carries a validator a 304 could answer."""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, validators: Validators) -> bool:
+    """
+    Evaluate `If-None-Match`, or `If-Modified-Since` without it, as in RFC 9110.
+
+    `If-None-Match` uses the weak comparison, so a `W/` prefix added by a proxy
+    that compressed the response still matches.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = _split(if_none_match)
+        return "*" in etags or any(
+            etag.removeprefix("W/") == validators.etag for etag in etags
+        )
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or validators.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a resolution of one second.
+    return validators.last_modified.replace(microsecond=0) <= since
+
+
+def not_modified(validators: Validators) -> Response:
+    return Response(status_code=304, headers=validators.headers())
+
+
+def set_validators(response: Response, validators: Validators) -> None:
+    response.headers.update(validators.headers())
+
+
+def page_validators(page: Page, stamp: str) -> Validators:
+    """
+    Compute the validators of a loaded page.
+
+    Args:
+        page (Page): The page of ORM objects.
+        stamp (str): The attribute of the objects that changes with every write,
+            `version` or `updated_at`.
+
+    Returns:
+        Validators: The validators the page is served with.
+    """
+    stamps = [(item.id, getattr(item, stamp)) for item in page.items]
+    return Validators(etag=page_etag(stamps, page.next_cursor))
+
+
+async def fetch_page_validators(
+    session: AsyncSession,
+    query: Select,
+    pagination: Pagination,
+    keys: Sequence[ColumnElement],
+    descending: bool = False,
+) -> Validators:
+    """
+    Compute the validators of a page without loading its rows.
+
+    Args:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        query (Select): The list query, selecting only the ID and stamp of each row.
+        pagination (Pagination): The pagination parameters.
+        keys (Sequence[ColumnElement]): The sort keys, ending with a unique column.
+        descending (bool, optional): Whether to walk the keyset backwards.
+
+    Returns:
+        Validators: The same validators `page_validators` gives the loaded page.
+    """
+    page = await paginate(session, query, pagination, keys, descending)
+    return Validators(etag=page_etag(page.items, page.next_cursor))
+
+
+def if_match_header(
+    if_match: Optional[str] = Header(
+        None, description="Only apply the write if the resource has this ETag."
+    ),
+) -> Optional[List[str]]:
+    """
+    Collect the ETags of an `If-Match` header.
+
+    Returns:
+        List[str], optional: The strong ETags to compare with, or `None` when the
+            header is absent or `*`, in which case any current version matches.
+    """
+    if if_match is None:
+        return None
+    etags = _split(if_match)
+    if "*" in etags:
+        return None
+    return [etag for etag in etags if not etag.startswith("W/")]
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(
+        status_code=412, detail="The resource was modified since it was read"
+    )
+
+
+async def missing_or_modified(
+    session: AsyncSession,
+    model: type,
+    entity_id: int,
+    if_match: Optional[List[str]],
+    detail: str,
+) -> HTTPException:
+    """
+    Explain why a write that returns its row returned none.
+
+    Without `If-Match` the row does not exist. With it, one more query tells a
+    missing row from one modified since the client read it; only failed writes
+    pay for it.
+
+    Args:
+        session (AsyncSession): The session of the write.
+        model (type): The mapped class of the row.
+        entity_id (int): The ID of the row.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
+        detail (str): The detail of the 404 error.
+
+    Returns:
+        HTTPException: A 404 error, or a 412 error if the row exists.
+    """
+    if if_match is not None and await session.scalar(
+        select(exists().where(model.id == entity_id))
+    ):
+        return precondition_failed()
+    return HTTPException(status_code=404, detail=detail)
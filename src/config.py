@@ -1,3 +1,5 @@
+from typing import List, Literal, Optional
+
 from pydantic import PostgresDsn, RedisDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -19,6 +21,68 @@ class Settings(BaseSettings):
     db_url: PostgresDsn
     redis_url: RedisDsn
 
+    # Connections per worker. With `db_connection_budget` set, unset sizes are
+    # derived from the worker's share of the budget and set ones are capped by it.
+    db_pool_size: Optional[int] = None
+    db_max_overflow: Optional[int] = None
+    db_pool_recycle: int = 1800
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    # The connections all workers of a host may open together.
+    db_connection_budget: Optional[int] = None
+    # Set by `gunicorn.conf.py` to its number of workers.
+    web_concurrency: int = 1
+    # Connect through PgBouncer in transaction pooling mode, where consecutive
+    # statements of a connection may run on different server connections.
+    db_pgbouncer: bool = False
+    # Read replicas, as a JSON list. GET endpoints read from one of them unless
+    # it lags more than `db_replica_max_lag` seconds, checked every
+    # `db_replica_check_interval`, or the client wrote in the last
+    # `db_read_your_writes_seconds`.
+    db_replica_urls: List[PostgresDsn] = []
+    db_replica_strategy: Literal["round_robin", "least_outstanding"] = "round_robin"
+    db_replica_max_lag: float = 1.0
+    db_replica_check_interval: float = 1.0
+    db_read_your_writes_seconds: float = 5.0
+
+    # The stats views are refreshed every `stats_refresh_interval` seconds by
+    # the worker holding a Redis lock, which expires after
+    # `stats_refresh_lock_timeout` seconds if that worker dies.
+    stats_refresh_interval: float = 300.0
+    stats_refresh_lock_timeout: float = 600.0
+
+    # Views of posts are buffered by each worker and sent to Redis every
+    # `view_send_interval` seconds, then written to the database every
+    # `view_flush_interval` seconds. The `most_viewed_size` most viewed posts
+    # are ranked in Redis.
+    view_send_interval: float = 0.5
+    view_flush_interval: float = 5.0
+    most_viewed_size: int = 1000
+
+    # Writes are published from the outbox to a Redis Stream every
+    # `outbox_relay_interval` seconds, `outbox_batch_size` rows at a time. The
+    # stream keeps about `changes_stream_maxlen` entries, and the consumer
+    # groups of `changes_consumer_groups`, a JSON list, are created at start.
+    outbox_relay_interval: float = 0.5
+    outbox_batch_size: int = 500
+    changes_stream_maxlen: int = 100_000
+    changes_consumer_groups: List[str] = []
+
+    # Each socket of the live post feed may fall `live_feed_queue_size`
+    # messages behind before it is dropped.
+    live_feed_queue_size: int = 100
+
+    cache_ttl: int = 300
+    cache_lock_timeout_ms: int = 500
+    cache_socket_timeout: float = 0.1
+    response_cache_enabled: bool = True
+    response_cache_local_bytes: int = 32 * 1024 * 1024
+    # Seconds a worker reuses the cache generations it read from Redis, so the
+    # writes of other workers retire its cached responses at most that late.
+    response_cache_generation_ttl: float = 1.0
+    rate_limit_sync_interval_ms: int = 200
+    rate_limit_local_share: float = 0.1
+
     model_config = SettingsConfigDict(
         env_file=(".env.example", ".env"), case_sensitive=False, extra="ignore"
     )
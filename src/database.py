@@ -1,5 +1,10 @@
-from typing import AsyncGenerator
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict
 
+from sqlalchemy import DateTime, func
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -8,14 +13,133 @@ from sqlalchemy.orm import (
     mapped_column,
 )
 
-from src.config import settings
+from src.config import Settings, settings
+from src.metrics import instrument_engine
 
 
 class Base(DeclarativeBase):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
 
-engine = create_async_engine(str(settings.db_url), pool_pre_ping=True)
+class Timestamped:
+    """Adds an `updated_at` column, bumped by every UPDATE issued through SQLAlchemy.
+
+    Rows are stamped with the time they are written, not the start of their
+    transaction, so that a transaction committing late cannot move it backwards.
+    """
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.clock_timestamp(),
+        onupdate=func.clock_timestamp(),
+    )
+
+
+# The error log of the server, which the Uvicorn workers of Gunicorn forward.
+server_logger = logging.getLogger("uvicorn.error")
+
+# SQLAlchemy's defaults, used when neither sizes nor a budget are configured.
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+
+
+@dataclass
+class PoolBudget:
+    pool_size: int
+    max_overflow: int
+    workers: int
+
+    @property
+    def per_worker(self) -> int:
+        return self.pool_size + self.max_overflow
+
+    @property
+    def total(self) -> int:
+        return self.per_worker * self.workers
+
+
+def pool_budget(settings: Settings) -> PoolBudget:
+    """
+    Size the pool of a worker.
+
+    Without a connection budget the configured sizes, or SQLAlchemy's defaults,
+    are used as they are. With one, each worker gets an equal share of it: a
+    quarter of the share is kept for overflow unless set, and configured sizes
+    are reduced to fit, overflow first.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        PoolBudget: The pool size and overflow of each worker.
+
+    Raises:
+        ValueError: If the budget is smaller than the number of workers, which
+            each need at least one connection.
+    """
+    workers = max(1, settings.web_concurrency)
+    pool_size, max_overflow = settings.db_pool_size, settings.db_max_overflow
+    if settings.db_connection_budget is None:
+        return PoolBudget(
+            pool_size=DEFAULT_POOL_SIZE if pool_size is None else pool_size,
+            max_overflow=DEFAULT_MAX_OVERFLOW if max_overflow is None else max_overflow,
+            workers=workers,
+        )
+    if settings.db_connection_budget < workers:
+        raise ValueError(
+            f"DB_CONNECTION_BUDGET ({settings.db_connection_budget}) is smaller than "
+            f"WEB_CONCURRENCY ({workers}): each worker needs at least one connection"
+        )
+    share = settings.db_connection_budget // workers
+    if max_overflow is None:
+        max_overflow = share // 4 if pool_size is None else share - pool_size
+    max_overflow = max(0, min(max_overflow, share - 1))
+    if pool_size is None:
+        pool_size = share - max_overflow
+    pool_size = max(1, min(pool_size, share))
+    max_overflow = min(max_overflow, share - pool_size)
+    return PoolBudget(pool_size=pool_size, max_overflow=max_overflow, workers=workers)
+
+
+def engine_options(settings: Settings, budget: PoolBudget) -> Dict[str, Any]:
+    """The keyword arguments of `create_async_engine` for the configured pool."""
+    options: Dict[str, Any] = {
+        "pool_size": budget.pool_size,
+        "max_overflow": budget.max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if settings.db_pgbouncer:
+        # A statement prepared on one server connection is unknown to the others:
+        # cache nothing, and name each statement uniquely so two clients sharing a
+        # server connection never clash.
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+
+def log_pool_budget() -> None:
+    """Log the pool of this worker and the connections of all workers."""
+    server_logger.info(
+        "Database pool: %d connections + %d overflow per worker, %d workers, "
+        "%d connections in total%s",
+        POOL_BUDGET.pool_size,
+        POOL_BUDGET.max_overflow,
+        POOL_BUDGET.workers,
+        POOL_BUDGET.total,
+        " (PgBouncer mode)" if settings.db_pgbouncer else "",
+    )
+
+
+POOL_BUDGET = pool_budget(settings)
+engine = create_async_engine(
+    str(settings.db_url), **engine_options(settings, POOL_BUDGET)
+)
+instrument_engine(engine)
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from math import ceil
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from redis.asyncio import Redis
+
+from src.cache import CACHE_ERRORS
+from src.config import settings
+from src.metrics import RATE_LIMIT_REJECTIONS
+from src.redis import cache_redis
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit"
+
+# Add the requests a worker admitted since its last sync to the window counters
+# of their keys, and return the global totals, in one round trip for all keys.
+# ARGV holds a `(delta, ttl in ms)` pair per key.
+SYNC = """
+local totals = {}
+for i, key in ipairs(KEYS) do
+    local delta = ARGV[2 * i - 1]
+    local total = redis.call('incrby', key, delta)
+    if total == tonumber(delta) then
+        redis.call('pexpire', key, ARGV[2 * i])
+    end
+    totals[i] = total
+end
+return totals
+"""
+
+
+@dataclass
+class Bucket:
+    """
+    The local state of one key in its current window.
+
+    `total` is the global count last read from Redis, which includes the
+    requests this worker has synced; `pending` counts those admitted since.
+    """
+
+    window: int
+    times: int
+    window_ms: int
+    tokens: int
+    total: int = 0
+    pending: int = 0
+
+    @property
+    def expires_at(self) -> float:
+        return (self.window + 1) * self.window_ms
+
+    def admits(self) -> bool:
+        return self.total + self.pending < self.times
+
+
+class HybridLimiter:
+    """
+    Fixed-window rate limits enforced in memory and reconciled through Redis.
+
+    Each worker admits requests from a local token bucket per key and never
+    talks to Redis on the request path. A background task pushes the admitted
+    counts of every key to Redis every `sync_interval_ms` with a single script
+    call, reads back the global totals and refills each bucket with a share of
+    the budget that remains. A bucket that runs dry before the next sync
+    triggers an early one, so requests are only rejected once the global count
+    known to the worker has reached the limit.
+
+    Between two syncs a worker admits at most `local_share` of the remaining
+    budget of a key (and at least one request), so with `N` workers a window
+    can exceed `times` by at most `N * local_share * times`. A smaller share
+    tightens that bound at the cost of more early syncs under load. If Redis is
+    unreachable each worker keeps enforcing the limit on its own counts.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        sync_interval_ms: int = settings.rate_limit_sync_interval_ms,
+        local_share: float = settings.rate_limit_local_share,
+    ):
+        self.redis = redis
+        self.sync_interval = sync_interval_ms / 1000
+        self.local_share = local_share
+        self.rejections = 0
+        self._script = redis.register_script(SYNC)
+        self._buckets: Dict[str, Bucket] = {}
+        self._syncing: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def allowance(self, bucket: Bucket) -> int:
+        """The requests a bucket may admit until the next sync."""
+        remaining = bucket.times - bucket.total - bucket.pending
+        if remaining <= 0:
+            return 0
+        return max(1, ceil(remaining * self.local_share))
+
+    async def hit(self, key: str, times: int, window_ms: int) -> int:
+        """
+        Count a request against a key.
+
+        Args:
+            key (str): The client and endpoint the limit applies to.
+            times (int): The number of requests allowed per window.
+            window_ms (int): The length of the window in milliseconds.
+
+        Returns:
+            int: 0 if the request is admitted, else the milliseconds until the
+                window resets.
+        """
+        now_ms = time.time() * 1000
+        bucket = self._bucket(key, times, window_ms, now_ms)
+        if bucket.tokens <= 0 and bucket.admits():
+            try:
+                await self.sync()
+            except CACHE_ERRORS:
+                pass  # The bucket was refilled from the local counts.
+            bucket = self._bucket(key, times, window_ms, now_ms)
+        if bucket.tokens > 0 and bucket.admits():
+            bucket.tokens -= 1
+            bucket.pending += 1
+            return 0
+        self.rejections += 1
+        RATE_LIMIT_REJECTIONS.inc()
+        return max(1, ceil(bucket.expires_at - now_ms))
+
+    def _bucket(self, key: str, times: int, window_ms: int, now_ms: float) -> Bucket:
+        window = int(now_ms // window_ms)
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.window != window:
+            bucket = Bucket(window, times, window_ms, tokens=0)
+            bucket.tokens = self.allowance(bucket)
+            self._buckets[key] = bucket
+        return bucket
+
+    async def sync(self) -> None:
+        """Reconcile every bucket with Redis, joining a sync already running."""
+        if self._syncing is None:
+            self._syncing = asyncio.ensure_future(self._sync())
+            self._syncing.add_done_callback(self._sync_done)
+        await asyncio.shield(self._syncing)
+
+    def _sync_done(self, future: asyncio.Future) -> None:
+        self._syncing = None
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Rate limit sync failed: %s", future.exception())
+
+    async def _sync(self) -> None:
+        now_ms = time.time() * 1000
+        keys: List[str] = []
+        buckets: List[Bucket] = []
+        args: List[int] = []
+        for key, bucket in list(self._buckets.items()):
+            if bucket.expires_at <= now_ms:
+                del self._buckets[key]
+                continue
+            # Idle buckets with tokens left have nothing to push nor to learn.
+            if bucket.pending or bucket.tokens <= 0:
+                keys.append(f"{KEY_PREFIX}:{key}:{bucket.window}")
+                buckets.append(bucket)
+                args += [bucket.pending, bucket.window_ms]
+        if not keys:
+            return
+        sent = [bucket.pending for bucket in buckets]
+        try:
+            totals = await self._script(keys=keys, args=args)
+        except CACHE_ERRORS:
+            # Keep enforcing the limit on this worker's counts alone.
+            for bucket in buckets:
+                bucket.tokens = self.allowance(bucket)
+            raise
+        for bucket, delta, total in zip(buckets, sent, totals):
+            bucket.pending -= delta
+            bucket.total = int(total)
+            bucket.tokens = self.allowance(bucket)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except CACHE_ERRORS:
+                pass  # Logged by `_sync_done`, retried on the next tick.
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the sync task and push the requests admitted since the last sync."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.sync()
+        except CACHE_ERRORS:
+            pass
+
+
+def client_identifier(request: Request) -> str:
+    """The client address, from `X-Forwarded-For` behind a proxy, and the path."""
+    forwarded = request.headers.get("X-Forwarded-For")
+    ip = forwarded.split(",")[0] if forwarded else request.client.host
+    return f"{ip}:{request.method}:{request.scope['path']}"
+
+
+class RateLimiter:
+    """A dependency rejecting requests over `times` per `seconds` with a 429."""
+
+    def __init__(self, times: int, seconds: int):
+        self.times = times
+        self.window_ms = seconds * 1000
+
+    async def __call__(self, request: Request) -> None:
+        key = f"{client_identifier(request)}:{self.times}:{self.window_ms}"
+        retry_after_ms = await limiter.hit(key, self.times, self.window_ms)
+        if retry_after_ms:
+            raise HTTPException(
+                status_code=429,
+                detail="Too Many Requests",
+                headers={"Retry-After": str(ceil(retry_after_ms / 1000))},
+            )
+
+
+limiter = HybridLimiter(cache_redis)
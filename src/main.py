@@ -3,8 +3,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 
 from src.config import SWAGGER_PARAMETERS
+from src.metrics import MetricsMiddleware, metrics
+from src.pagination import NEXT_CURSOR_HEADER
+from src.replicas import ReadYourWritesMiddleware
+from src.response_cache import CACHED_PATHS, ResponseCacheMiddleware
 from src.utils import lifespan
-from src import api_routers
+from src import api_routers, ws_routers
 
 
 app = FastAPI(
@@ -15,12 +19,20 @@ app = FastAPI(
 )
 
 
+# Added first so it runs inside CORS, which then also covers cache hits.
+app.add_middleware(ResponseCacheMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
+# Added last so it times everything, including the middlewares above.
+app.add_middleware(MetricsMiddleware, static_paths=CACHED_PATHS)
+app.add_route("/metrics", metrics, include_in_schema=False)
 
 [app.include_router(router, prefix="/api/v1") for router in api_routers]
+[app.include_router(router) for router in ws_routers]
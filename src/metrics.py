@@ -0,0 +1,361 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from collections import Counter as Occurrences
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from redis.asyncio import Redis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import Pool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# Set by `gunicorn.conf.py`: each worker then writes its samples to memory-mapped
+# files in that directory, which `/metrics` merges whichever worker serves it.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+UNMATCHED_ROUTE = "unmatched"
+SAMPLE_INTERVAL = 1.0
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled.",
+    multiprocess_mode="livesum",
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per HTTP request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections of the pool in use.",
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened beyond the pool size.",
+    multiprocess_mode="livesum",
+)
+REDIS_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Time spent on Redis commands and pipelines, per client.",
+    ["client"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups",
+    "Entity cache lookups, by cache and result.",
+    ["cache", "result"],
+)
+CACHE_FAILURES = Counter(
+    "cache_errors",
+    "Failed entity cache operations, which fell back to the database.",
+    ["cache", "operation"],
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections",
+    "Requests rejected by the rate limiter.",
+)
+
+
+@dataclass
+class RequestStats:
+    """The SQL statements and Redis calls of a request and the time spent on them."""
+
+    queries: int = 0
+    query_time: float = 0.0
+    statements: Occurrences = field(default_factory=Occurrences)
+    redis_calls: int = 0
+    redis_time: float = 0.0
+
+    def server_timing(self, elapsed: float) -> str:
+        """The `Server-Timing` header of a response started after `elapsed` seconds."""
+        return (
+            f'db;dur={self.query_time * 1000:.2f};desc="{self.queries} queries", '
+            f'redis;dur={self.redis_time * 1000:.2f};desc="{self.redis_calls} calls", '
+            f"app;dur={elapsed * 1000:.2f}"
+        )
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+# Called with the scope and stats of every finished request, e.g. by the test
+# suite to enforce query budgets.
+request_listeners: List[Callable[[Scope, RequestStats], None]] = []
+
+
+def _before_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - conn.info["query_started"]
+        stats.statements[statement] += 1
+
+
+class BufferedHistogram:
+    """
+    The observations of one labelled histogram, buffered in process memory.
+
+    `Histogram.observe` writes two memory-mapped values under a lock in
+    multiprocess mode, which alone takes most of the budget of a request;
+    buffered observations are written by `flush`, one increment per bucket.
+    This writes the private buckets and sum of the child, as laid out by the
+    pinned version of prometheus_client; `test_buffered_histogram` fails if
+    an upgrade changes them.
+    """
+
+    def __init__(self, child: Histogram):
+        self.child = child
+        self.bounds = child._upper_bounds
+        self.counts = [0] * len(self.bounds)
+        self.sum = 0.0
+
+    def observe(self, amount: float) -> None:
+        self.counts[bisect_left(self.bounds, amount)] += 1
+        self.sum += amount
+
+    def flush(self) -> None:
+        for i, count in enumerate(self.counts):
+            if count:
+                self.child._buckets[i].inc(count)
+                self.counts[i] = 0
+        if self.sum:
+            self.child._sum.inc(self.sum)
+            self.sum = 0.0
+
+
+class BufferedCounter:
+    """The increments of one labelled counter, buffered like `BufferedHistogram`."""
+
+    def __init__(self, child: Counter):
+        self.child = child
+        self.count = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.count += amount
+
+    def flush(self) -> None:
+        if self.count:
+            self.child.inc(self.count)
+            self.count = 0
+
+
+class MetricsPublisher:
+    """
+    Write the metrics of a worker once per `SAMPLE_INTERVAL`, and on scrapes.
+
+    Requests only update plain attributes and buffers, which are published
+    here off the request path along with the state of the pools. Metrics of
+    other workers lag by one interval at most.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.in_progress = 0
+        self.pools: List[Pool] = []
+        self.histograms: List[BufferedHistogram] = []
+        self.counters: List[BufferedCounter] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self) -> None:
+        for histogram in self.histograms:
+            histogram.flush()
+        for counter in self.counters:
+            counter.flush()
+        REQUESTS_IN_PROGRESS.set(self.in_progress)
+        POOL_CHECKED_OUT.set(sum(pool.checkedout() for pool in self.pools))
+        POOL_OVERFLOW.set(sum(max(0, pool.overflow()) for pool in self.pools))
+
+    def histogram(self, metric: Histogram, *labels) -> BufferedHistogram:
+        histogram = BufferedHistogram(metric.labels(*labels))
+        self.histograms.append(histogram)
+        return histogram
+
+    def counter(self, metric: Counter, *labels) -> BufferedCounter:
+        counter = BufferedCounter(metric.labels(*labels))
+        self.counters.append(counter)
+        return counter
+
+    async def _run(self) -> None:
+        while True:
+            self.publish()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.publish()
+
+
+publisher = MetricsPublisher()
+
+
+def instrument_redis(client: Redis, name: str) -> None:
+    """Time the commands and pipelines of a Redis client, per client and per request.
+
+    Subscriptions wait for messages for as long as they last, so they are not timed.
+    """
+    durations = publisher.histogram(REDIS_DURATION, name)
+
+    def record(elapsed: float) -> None:
+        durations.observe(elapsed)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.redis_calls += 1
+            stats.redis_time += elapsed
+
+    def timed(call: Callable[..., Any]) -> Callable[..., Any]:
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                record(time.perf_counter() - started)
+
+        return wrapper
+
+    pipeline = client.pipeline
+
+    def timed_pipeline(*args, **kwargs):
+        # Commands are only buffered until the pipeline is executed.
+        pipe = pipeline(*args, **kwargs)
+        pipe.execute = timed(pipe.execute)
+        return pipe
+
+    client.execute_command = timed(client.execute_command)
+    client.pipeline = timed_pipeline
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Count and time the statements of each request and sample the pool of an engine."""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_query)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_query)
+    pool = engine.sync_engine.pool
+    # Pools without a size limit (e.g. `NullPool`) have nothing to report.
+    if hasattr(pool, "overflow"):
+        publisher.pools.append(pool)
+
+
+class MetricsMiddleware:
+    """
+    Time every HTTP request and count the SQL statements it executed.
+
+    Responses carry the statements and Redis calls run before they started,
+    and the time spent on them and on the whole request, in a `Server-Timing`
+    header.
+
+    Requests are labelled with the template of the route that served them, so
+    path parameters do not multiply the series. Paths answered before routing,
+    such as response cache hits, keep their own path if they are listed in
+    `static_paths`, and are otherwise labelled `unmatched`.
+    """
+
+    def __init__(self, app: ASGIApp, static_paths: Collection[str] = ()):
+        self.app = app
+        self.static_paths = frozenset(static_paths)
+        self._durations: Dict[Tuple[str, str, int], BufferedHistogram] = {}
+        self._queries: Dict[str, BufferedHistogram] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        stats = RequestStats()
+        token = request_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = stats.server_timing(time.perf_counter() - started)
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        publisher.in_progress += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            publisher.in_progress -= 1
+            request_stats.reset(token)
+            self.observe(scope, status, elapsed, stats)
+            for listener in request_listeners:
+                listener(scope, stats)
+
+    def observe(
+        self, scope: Scope, status: int, elapsed: float, stats: RequestStats
+    ) -> None:
+        route = self.route(scope)
+        key = (scope["method"], route, status)
+        duration = self._durations.get(key)
+        if duration is None:
+            duration = self._durations[key] = publisher.histogram(
+                REQUEST_DURATION, *key
+            )
+        queries = self._queries.get(route)
+        if queries is None:
+            queries = self._queries[route] = publisher.histogram(REQUEST_QUERIES, route)
+        duration.observe(elapsed)
+        queries.observe(stats.queries)
+
+    def route(self, scope: Scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        if scope["path"] in self.static_paths:
+            return scope["path"]
+        return UNMATCHED_ROUTE
+
+
+def metrics(request: Request) -> Response:
+    """Expose the metrics of all workers in the Prometheus text format."""
+    publisher.publish()
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,167 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Generic, List, Optional, Sequence, TypeVar
+
+import orjson
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+
+@dataclass
+class Pagination:
+    limit: int = DEFAULT_PAGE_SIZE
+    cursor: Optional[str] = None
+
+
+@dataclass
+class Page(Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+def pagination_params(
+    limit: int = Query(
+        DEFAULT_PAGE_SIZE,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description="The maximum number of items to return.",
+    ),
+    cursor: Optional[str] = Query(
+        None,
+        description=f"The opaque cursor returned in the `{NEXT_CURSOR_HEADER}` header.",
+    ),
+) -> Pagination:
+    """
+    Collect the keyset pagination query parameters of a list endpoint.
+
+    Args:
+        limit (int): The page size, capped at `MAX_PAGE_SIZE`.
+        cursor (str, optional): The cursor of the previous page.
+
+    Returns:
+        Pagination: The pagination parameters.
+    """
+    return Pagination(limit=limit, cursor=cursor)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the keyset values of the last row into an opaque cursor."""
+    payload = orjson.dumps(list(values))
+    return urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, keys: Sequence[ColumnElement]) -> List[Any]:
+    """
+    Decode a cursor produced by `encode_cursor` for the given keyset.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or was issued for another sort order.
+    """
+    try:
+        values = orjson.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        return [_coerce(key, value) for key, value in zip(keys, values)]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _coerce(key: ColumnElement, value: Any) -> Any:
+    """Restore the python type that orjson flattened into a JSON scalar."""
+    if value is None:
+        return None
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type in (int, float, str):
+        return python_type(value)
+    return value
+
+
+def apply_keyset(
+    query: Select,
+    pagination: Pagination,
+    keys: Sequence[ColumnElement],
+    descending: bool = False,
+) -> Select:
+    """
+    Restrict a query to the page following `pagination.cursor`.
+
+    The last key must be unique (usually the primary key) so the order is total.
+    The row comparison `(k1, ..., id) > (:k1, ..., :id)` lets Postgres resolve
+    the page with an index range scan on a matching composite index instead
+    of counting and discarding rows with OFFSET.
+
+    Args:
+        query (Select): The base query.
+        pagination (Pagination): The pagination parameters.
+        keys (Sequence[ColumnElement]): The sort keys, ending with a unique column.
+        descending (bool, optional): Whether to walk the keyset backwards.
+
+    Returns:
+        Select: The query with the keyset filter, order and limit applied.
+    """
+    if pagination.cursor is not None:
+        values = decode_cursor(pagination.cursor, keys)
+        row, bound = tuple_(*keys), tuple_(*values)
+        query = query.where(row < bound if descending else row > bound)
+    order = [key.desc() if descending else key.asc() for key in keys]
+    return query.order_by(*order).limit(pagination.limit + 1)
+
+
+async def paginate(
+    session: AsyncSession,
+    query: Select,
+    pagination: Pagination,
+    keys: Sequence[ColumnElement],
+    descending: bool = False,
+) -> Page:
+    """
+    Execute a keyset-paginated query.
+
+    One extra row is fetched to tell whether another page exists, so no
+    `count(*)` is ever needed.
+
+    Args:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        query (Select): The base query.
+        pagination (Pagination): The pagination parameters.
+        keys (Sequence[ColumnElement]): The sort keys, ending with a unique column.
+        descending (bool, optional): Whether to walk the keyset backwards.
+
+    Returns:
+        Page: The items of the page and the cursor of the next one, if any.
+    """
+    query = apply_keyset(query, pagination, keys, descending).add_columns(*keys)
+    rows = (await session.execute(query)).all()
+    next_cursor = None
+    if len(rows) > pagination.limit:
+        rows = rows[: pagination.limit]
+        next_cursor = encode_cursor(rows[-1][-len(keys) :])
+    width = len(rows[0]) - len(keys) if rows else 0
+    items = [row[0] if width == 1 else tuple(row[:width]) for row in rows]
+    return Page(items=items, next_cursor=next_cursor)
+
+
+def set_next_cursor(response: Response, page: Page) -> None:
+    """Expose the cursor of the next page, if any, in the response headers."""
+    if page.next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import logging
+from typing import Dict, List, Literal, Optional, Set
+
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect, status
+from sqlalchemy import Row
+
+from src.cache import CACHE_ERRORS
+from src.config import settings
+from src.redis import cache_redis, redis
+from .schemas import PostBase, PostEvent
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "posts:live"
+# Seconds before a lost Redis subscription is retried.
+RESUBSCRIBE_DELAY = 1.0
+# Seconds a dropped socket has to take its close frame.
+CLOSE_TIMEOUT = 1.0
+# Errors of sending to a socket whose client went away.
+SEND_ERRORS = (WebSocketDisconnect, RuntimeError, OSError)
+
+
+async def publish_post(
+    event: Literal["create", "update", "delete"],
+    post: Row,
+    previous_category_id: Optional[int] = None,
+    previous_tag_ids: Optional[List[int]] = None,
+) -> None:
+    """Publish a written post to the live feed of every worker.
+
+    An update passes the category and tags the post had before, so that their
+    subscribers see it leave them.
+
+    Writes await this before responding, so it goes through the client with
+    short timeouts: a slow Redis loses the message rather than the response.
+    """
+    message = PostEvent(
+        event=event,
+        post=PostBase.model_validate(post, from_attributes=True),
+        previous_category_id=previous_category_id,
+        previous_tag_ids=previous_tag_ids or [],
+    )
+    try:
+        await cache_redis.publish(CHANNEL, orjson.dumps(message.model_dump()))
+    except CACHE_ERRORS as exc:
+        logger.warning("Post %s not published to the live feed: %s", post.id, exc)
+
+
+async def publish_posts(
+    event: Literal["create", "update", "delete"], posts: List[PostBase]
+) -> None:
+    """Publish many written posts to the live feed of every worker, in one pipeline."""
+    if not posts:
+        return
+    try:
+        async with cache_redis.pipeline(transaction=False) as pipe:
+            for post in posts:
+                message = PostEvent(event=event, post=post)
+                pipe.publish(CHANNEL, orjson.dumps(message.model_dump()))
+            await pipe.execute()
+    except CACHE_ERRORS as exc:
+        logger.warning("%s posts not published to the live feed: %s", len(posts), exc)
+
+
+class Subscriber:
+    """A socket of the feed and the messages queued for it."""
+
+    def __init__(
+        self, websocket: WebSocket, categories: Set[int], tags: Set[int], size: int
+    ):
+        self.websocket = websocket
+        self.categories = categories
+        self.tags = tags
+        self.queue: asyncio.Queue[str] = asyncio.Queue(size)
+        self.dropped = asyncio.Event()
+        self.close_code = status.WS_1000_NORMAL_CLOSURE
+
+    def drop(self, code: int) -> None:
+        self.close_code = code
+        self.dropped.set()
+
+
+class PostFeed:
+    """
+    Fan the posts published by any worker out to the sockets of this one.
+
+    The worker holds a single Redis subscription, whatever its number of
+    sockets. Each message is decoded once and queued, as received, for the
+    sockets subscribed to all posts, to its category or to one of its tags,
+    or for an update to those it had before, found through in-memory indexes. Each socket has its own task sending its
+    queue, so a slow client never holds the others up. A socket more than
+    `queue_size` messages behind is dropped with a 1013 close code, and may
+    reconnect and reload what it missed from the API.
+    """
+
+    def __init__(self, queue_size: int = settings.live_feed_queue_size):
+        self.queue_size = queue_size
+        self.everything: Set[Subscriber] = set()
+        self.by_category: Dict[int, Set[Subscriber]] = {}
+        self.by_tag: Dict[int, Set[Subscriber]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _add(self, subscriber: Subscriber) -> None:
+        if not subscriber.categories and not subscriber.tags:
+            self.everything.add(subscriber)
+        for category_id in subscriber.categories:
+            self.by_category.setdefault(category_id, set()).add(subscriber)
+        for tag_id in subscriber.tags:
+            self.by_tag.setdefault(tag_id, set()).add(subscriber)
+
+    def _remove(self, subscriber: Subscriber) -> None:
+        self.everything.discard(subscriber)
+        for index, keys in (
+            (self.by_category, subscriber.categories),
+            (self.by_tag, subscriber.tags),
+        ):
+            for key in keys:
+                subscribers = index.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del index[key]
+
+    def dispatch(self, data: str) -> int:
+        """Queue a published message for its sockets, returning how many got it."""
+        try:
+            message = orjson.loads(data)
+            categories = [message["post"]["category_id"]]
+            categories.append(message.get("previous_category_id"))
+            tags = [tag["id"] for tag in message["post"]["tags"]]
+            tags += message.get("previous_tag_ids", [])
+        except (orjson.JSONDecodeError, KeyError, TypeError) as exc:
+            logger.warning("Invalid live feed message skipped: %s", exc)
+            return 0
+        subscribers = set(self.everything)
+        for category_id in categories:
+            subscribers |= self.by_category.get(category_id, set())
+        for tag_id in tags:
+            subscribers |= self.by_tag.get(tag_id, set())
+        queued = 0
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(data)
+                queued += 1
+            except asyncio.QueueFull:
+                self._remove(subscriber)
+                subscriber.drop(status.WS_1013_TRY_AGAIN_LATER)
+        return queued
+
+    async def _send(self, subscriber: Subscriber) -> None:
+        with contextlib.suppress(*SEND_ERRORS):
+            while True:
+                await subscriber.websocket.send_text(await subscriber.queue.get())
+
+    async def _receive(self, subscriber: Subscriber) -> None:
+        # Clients only listen, so anything but a disconnect is ignored.
+        while True:
+            message = await subscriber.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    async def serve(
+        self, websocket: WebSocket, categories: Set[int], tags: Set[int]
+    ) -> None:
+        """
+        Send the posts of the given categories and tags to an accepted socket.
+
+        Args:
+            websocket (WebSocket): The socket, already accepted.
+            categories (Set[int]): The categories to follow.
+            tags (Set[int]): The tags to follow. A post is sent once even if it
+                matches several categories and tags, and every post is sent
+                when neither are given.
+
+        Returns:
+            None: Once the client disconnects, or the socket is dropped.
+        """
+        subscriber = Subscriber(websocket, categories, tags, self.queue_size)
+        self._add(subscriber)
+        tasks = [
+            asyncio.create_task(self._send(subscriber)),
+            asyncio.create_task(self._receive(subscriber)),
+            asyncio.create_task(subscriber.dropped.wait()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._remove(subscriber)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if subscriber.dropped.is_set():
+            with contextlib.suppress(asyncio.TimeoutError, *SEND_ERRORS):
+                await asyncio.wait_for(
+                    websocket.close(subscriber.close_code), CLOSE_TIMEOUT
+                )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for message in pubsub.listen():
+                        self.dispatch(message["data"])
+            except CACHE_ERRORS as exc:
+                logger.warning("Live feed subscription lost: %s", exc)
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let the clients know to reconnect to another worker.
+        subscribers = set(self.everything)
+        for index in (self.by_category, self.by_tag):
+            for indexed in index.values():
+                subscribers |= indexed
+        for subscriber in subscribers:
+            subscriber.drop(status.WS_1001_GOING_AWAY)
+
+
+feed = PostFeed()
@@ -1,11 +1,142 @@
-from sqlalchemy import ForeignKey
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from datetime import datetime
 
-from src.database import Base
+from sqlalchemy import (
+    CTE,
+    DDL,
+    ColumnElement,
+    Computed,
+    DateTime,
+    ForeignKey,
+    Index,
+    event,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import column_property, relationship, Mapped, mapped_column
 
+from src.database import Base, Timestamped
 
-class Post(Base):
+
+EXCERPT_LENGTH = 200
+SEARCH_CONFIG = "english"
+# Title matches rank above content matches.
+SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', title), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', content), 'B')"
+)
+
+
+# Keeps `Tag.post_count` and `Category.post_count` exact. The triggers run once
+# per statement, COPY included, and shift the count of every tag or category
+# by the rows the statement linked to it, minus those it unlinked, with no
+# recount. Its arguments are the counted table and the column referencing it.
+#
+# A post write thus locks its posts, then the tags and category it counts, in
+# ID order. Writes of tags and categories that also write posts must lock them
+# first, see `after_posts`, or the two can deadlock. The lock does not block
+# the foreign key checks of other post writes, but all writes counted on the
+# same tag or category wait for each other until they commit.
+COUNT_POSTS_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_posts() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changes text := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT %1$I AS id, 1 AS delta FROM new_rows', TG_ARGV[1])
+        WHEN 'DELETE' THEN format('SELECT %1$I AS id, -1 AS delta FROM old_rows', TG_ARGV[1])
+        ELSE format(
+            'SELECT %1$I AS id, 1 AS delta FROM new_rows '
+            'UNION ALL SELECT %1$I, -1 FROM old_rows',
+            TG_ARGV[1]
+        )
+    END;
+    ids integer[];
+    deltas integer[];
+BEGIN
+    EXECUTE format(
+        'SELECT array_agg(id ORDER BY id), array_agg(delta ORDER BY id) FROM ('
+        '  SELECT id, CAST(sum(delta) AS integer) AS delta FROM (%s) AS changes'
+        '  WHERE id IS NOT NULL GROUP BY id'
+        ') AS deltas WHERE delta <> 0',
+        changes
+    ) INTO ids, deltas;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format(
+        'SELECT 1 FROM %I WHERE id = ANY($1) ORDER BY id FOR NO KEY UPDATE',
+        TG_ARGV[0]
+    ) USING ids;
+    EXECUTE format(
+        'UPDATE %1$I SET post_count = %1$I.post_count + deltas.delta '
+        'FROM unnest($1, $2) AS deltas (id, delta) WHERE %1$I.id = deltas.id',
+        TG_ARGV[0]
+    ) USING ids, deltas;
+    RETURN NULL;
+END
+$$
+"""
+# Name, table, event, counted table and referencing column of each trigger.
+# Transition tables allow a single event per trigger.
+POST_COUNT_TRIGGERS = [
+    ("post_tags_count_insert", "post_tags", "INSERT", "tags", "tag_id"),
+    ("post_tags_count_update", "post_tags", "UPDATE", "tags", "tag_id"),
+    ("post_tags_count_delete", "post_tags", "DELETE", "tags", "tag_id"),
+    ("posts_count_insert", "posts", "INSERT", "categories", "category_id"),
+    ("posts_count_update", "posts", "UPDATE", "categories", "category_id"),
+    ("posts_count_delete", "posts", "DELETE", "categories", "category_id"),
+]
+TRANSITION_TABLES = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+}
+# Set for the transactions that only add views to posts, whose updates the
+# count of categories skips. Triggers with transition tables cannot be limited
+# to `UPDATE OF category_id`, and statement triggers cannot test the rows.
+VIEWS_ONLY_SETTING = "blog.views_only"
+TRIGGER_CONDITIONS = {
+    "posts_count_update": (
+        f"current_setting('{VIEWS_ONLY_SETTING}', true) IS DISTINCT FROM 'on'"
+    ),
+}
+
+
+def after_posts(written: CTE) -> ColumnElement[bool]:
+    """
+    A condition, always true, for a write of a tag or category to run after
+    `written`, the CTE writing its posts, in the same statement.
+
+    The row it filters is then locked after the posts, like post writes lock
+    them before counting them on it.
+    """
+    return select(func.count()).select_from(written).scalar_subquery() >= 0
+
+
+def post_count_trigger(
+    name: str, table: str, operation: str, counted: str, column: str
+) -> str:
+    condition = TRIGGER_CONDITIONS.get(name)
+    return (
+        f"CREATE OR REPLACE TRIGGER {name} AFTER {operation} ON {table} "
+        f"REFERENCING {TRANSITION_TABLES[operation]} FOR EACH STATEMENT "
+        + (f"WHEN ({condition}) " if condition else "")
+        + f"EXECUTE FUNCTION count_posts('{counted}', '{column}')"
+    )
+
+
+class Post(Timestamped, Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+        # One index per supported filter and sort order of `get_posts`. The
+        # ones leading with a foreign key also serve its ON DELETE action.
+        Index("ix_posts_title_id", "title", "id"),
+        Index("ix_posts_author_id_id", "author_id", "id"),
+        Index("ix_posts_author_id_title_id", "author_id", "title", "id"),
+        Index("ix_posts_category_id_id", "category_id", "id"),
+        Index("ix_posts_category_id_title_id", "category_id", "title", "id"),
+    )
 
     title: Mapped[str]
     content: Mapped[str]
@@ -15,6 +146,17 @@ class Post(Base):
     category_id: Mapped[int | None] = mapped_column(
         ForeignKey("categories.id", ondelete="SET NULL")
     )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    # Bumped by every write that changes the representation of the post,
+    # including those of its tags, author and category. It is the ETag.
+    version: Mapped[int] = mapped_column(server_default=text("1"))
+    # Written in batches by `src.posts.view_counts`, behind the counts in Redis.
+    view_count: Mapped[int] = mapped_column(server_default=text("0"))
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR, Computed(SEARCH_VECTOR, persisted=True), deferred=True
+    )
     author: Mapped["Author"] = relationship(back_populates="posts")
     category: Mapped["Category"] = relationship(back_populates="posts")
     tags: Mapped[list["Tag"]] = relationship(
@@ -22,4 +164,20 @@ class Post(Base):
         back_populates="posts",
         lazy="selectin",
         cascade="all, delete",
+        order_by="Tag.id",
     )
+
+
+# Cut in SQL, so summaries never ship the full content from the database.
+Post.excerpt = column_property(
+    func.substr(Post.content, 1, EXCERPT_LENGTH), deferred=True
+)
+
+
+# Created with the tables, as `create_all` does not run the migrations. `DDL`
+# formats its statement with `%`, which the function uses itself.
+event.listen(
+    Base.metadata, "after_create", DDL(COUNT_POSTS_FUNCTION.replace("%", "%%"))
+)
+for trigger in POST_COUNT_TRIGGERS:
+    event.listen(Base.metadata, "after_create", DDL(post_count_trigger(*trigger)))
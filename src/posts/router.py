@@ -1,13 +1,57 @@
-from typing import List
+from typing import List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped
 
+from src.conditional import (
+    entity_validators,
+    if_match_header,
+    is_conditional,
+    is_not_modified,
+    not_modified,
+    set_validators,
+)
 from src.database import get_async_session
+from src.pagination import (
+    MAX_PAGE_SIZE,
+    Pagination,
+    pagination_params,
+    set_next_cursor,
+)
+from src.replicas import get_read_session, wrote_recently
 from src.utils import rate_limit
-from .service import get_posts, get_post, create_post, update_post, delete_post
-from .schemas import PostCreate, PostBase
+from .service import (
+    get_post_rows,
+    get_post_projection,
+    get_post_cached,
+    get_posts_validators,
+    create_post,
+    update_post,
+    delete_post,
+    encode_post,
+    encode_posts,
+    export_posts,
+    post_fields_params,
+    post_rows_validators,
+    create_posts,
+    search_posts,
+    get_most_viewed_posts,
+)
+from .schemas import (
+    FULL_FIELDS,
+    PostCreate,
+    PostBase,
+    PostBulkCreate,
+    PostBulkResult,
+    PostViewCount,
+    PostSearchResult,
+    PostSort,
+    PostSummary,
+    PostUpdate,
+)
+from .live import feed
+from .view_counts import record_view
 
 
 router = APIRouter(
@@ -15,35 +59,178 @@ router = APIRouter(
     tags=["Posts"],
     responses={404: {"description": "Not found"}},
 )
+# Mounted at the root rather than under the API prefix.
+live_router = APIRouter(prefix="/ws")
 
 
-@router.get("/", dependencies=[Depends(rate_limit())], response_model=List[PostBase])
-async def get_all_posts(session: AsyncSession = Depends(get_async_session)):
+@router.get(
+    "/",
+    dependencies=[Depends(rate_limit())],
+    response_model=Union[List[PostBase], List[PostSummary]],
+)
+async def get_all_posts(
+    request: Request,
+    author_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    sort: PostSort = PostSort.id,
+    fields: Tuple[str, ...] = Depends(post_fields_params),
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
-    Get all posts.
+    Get a page of posts, optionally filtered by author, category or tag.
 
     Parameters:
+        request (Request): The incoming request, checked for `If-None-Match`.
+        author_id (int, optional): Only return the posts of this author.
+        category_id (int, optional): Only return the posts of this category.
+        tag_id (int, optional): Only return the posts with this tag.
+        sort (PostSort, optional): The sort order, by ID or title, `-` for descending.
+        fields (Tuple[str, ...], optional): The fields to return, from `fields` or `view`.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        List[PostBase]: A list of `PostBase` objects representing all posts in the database.
+        List[PostBase]: A list of `PostBase` objects, or of the requested fields only. The cursor of the next page, if any,
+            is returned in the `X-Next-Cursor` header. 304 if the client's copy of the
+            page is current.
     """
-    return await get_posts(session)
+    filters = (author_id, category_id, tag_id, sort)
+    if is_conditional(request):
+        validators = await get_posts_validators(session, pagination, *filters)
+        if is_not_modified(request, validators):
+            return not_modified(validators)
+    # Plain rows encoded straight to JSON: `response_model` only documents them.
+    page = await get_post_rows(session, pagination, *filters, fields)
+    response = Response(encode_posts(page.items, fields), media_type="application/json")
+    set_next_cursor(response, page)
+    set_validators(response, post_rows_validators(page))
+    return response
+
 
+@router.get(
+    "/search",
+    dependencies=[Depends(rate_limit())],
+    response_model=List[PostSearchResult],
+)
+async def search_all_posts(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=256),
+    highlight: bool = False,
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Full-text search over the title and content of posts.
 
-@router.get("/{post_id}", dependencies=[Depends(rate_limit())], response_model=PostBase)
-async def get_post_by_id(post: Mapped = Depends(get_post)):
+    Parameters:
+        response (Response): The outgoing response, used to expose the next cursor.
+        q (str): The search query. Supports quoted phrases, `or` and `-` exclusions.
+        highlight (bool, optional): Whether to add a `snippet` of the content with
+            the matches wrapped in `<mark>` tags.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        List[PostSearchResult]: The matching posts, best match first. The cursor of the
+            next page, if any, is returned in the `X-Next-Cursor` header.
+    """
+    page = await search_posts(q, session, pagination, highlight)
+    set_next_cursor(response, page)
+    return page.items
+
+
+@router.get(
+    "/export.ndjson",
+    dependencies=[Depends(rate_limit())],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def export_all_posts(
+    request: Request,
+    author_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+):
+    """
+    Export posts as newline-delimited JSON.
+
+    Parameters:
+        request (Request): The incoming request, whose client may have to read its
+            own recent writes.
+        author_id (int, optional): Only export the posts of this author.
+        category_id (int, optional): Only export the posts of this category.
+
+    Returns:
+        StreamingResponse: One JSON object per post, with its tags given as a list of IDs.
+    """
+    return StreamingResponse(
+        export_posts(author_id, category_id, wrote_recently(request)),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get(
+    "/most-viewed",
+    dependencies=[Depends(rate_limit())],
+    response_model=List[PostViewCount],
+)
+async def get_most_viewed(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Get the most viewed posts.
+
+    Parameters:
+        limit (int, optional): The number of posts to return.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        List[PostViewCount]: The posts by descending view count, as of the last flush
+            of the counts, or a 503 error if they are unavailable.
+    """
+    return await get_most_viewed_posts(session, limit)
+
+
+@router.get(
+    "/{post_id}",
+    dependencies=[Depends(rate_limit())],
+    response_model=Union[PostBase, PostSummary],
+)
+async def get_post_by_id(
+    post_id: int,
+    request: Request,
+    fields: Tuple[str, ...] = Depends(post_fields_params),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
     Get an post by their ID.
 
     Parameters:
         post_id (int): The ID of the post to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
+        fields (Tuple[str, ...], optional): The fields to return, from `fields` or `view`.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        PostBase: The `PostBase` object with the given ID, or a 404 error if not found.
+        PostBase: The `PostBase` object with the given ID, or only the requested fields,
+            a 404 error if not found, or 304 if the client's copy is current.
     """
-    return post
+    if fields == FULL_FIELDS:
+        post = await get_post_cached(post_id, request, session)
+        record_view(post_id)
+        return post.to_response(request)
+    # Projections bypass the cache, which holds full posts only.
+    post = await get_post_projection(post_id, fields, session)
+    record_view(post_id)
+    validators = entity_validators(post)
+    if is_not_modified(request, validators):
+        return not_modified(validators)
+    response = Response(encode_post(post, fields), media_type="application/json")
+    set_validators(response, validators)
+    return response
 
 
 @router.post("/", dependencies=[Depends(rate_limit())], response_model=PostBase)
@@ -63,39 +250,124 @@ async def create_new_post(
     return await create_post(post, session)
 
 
+@router.post(
+    "/bulk", dependencies=[Depends(rate_limit())], response_model=PostBulkResult
+)
+async def create_new_posts(
+    posts: PostBulkCreate,
+    atomic: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Create many posts in one request and one transaction.
+
+    Parameters:
+        posts (List[PostCreate]): The posts to be created, at most `BULK_CREATE_LIMIT`.
+        atomic (bool, optional): Create nothing, and answer 404, if any post
+            references a missing author, category or tag.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        PostBulkResult: The IDs of the created posts, aligned with the input, and the
+            missing references of the posts that were skipped.
+    """
+    return await create_posts(posts, session, atomic)
+
+
 @router.put("/{post_id}", dependencies=[Depends(rate_limit())], response_model=PostBase)
 async def update_post_by_id(
+    post_id: int,
     post_data: PostCreate,
-    post: Mapped = Depends(get_post),
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Update an post.
+    Replace an post.
 
     Parameters:
+        post_id (int): The ID of the post to update.
         post_data (PostCreate): The updated post data.
-        post (Post, optional): The `Post` object to be updated.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        PostBase: The updated `PostBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
+    """
+    updated = await update_post(post_id, post_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
+
+
+@router.patch(
+    "/{post_id}", dependencies=[Depends(rate_limit())], response_model=PostBase
+)
+async def patch_post_by_id(
+    post_id: int,
+    post_data: PostUpdate,
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Update the given fields of an post.
+
+    Parameters:
+        post_id (int): The ID of the post to update.
+        post_data (PostUpdate): The fields to update. Fields left out are kept, and
+            `tags`, if given, replaces all the tags of the post.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        PostBase: The updated `PostBase` object.
+        PostBase: The updated `PostBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
     """
-    return await update_post(post, post_data, session)
+    updated = await update_post(post_id, post_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
 
 
 @router.delete("/{post_id}", dependencies=[Depends(rate_limit())])
 async def delete_post_by_id(
-    post: Mapped = Depends(get_post),
+    post_id: int,
     session: AsyncSession = Depends(get_async_session),
 ) -> str:
     """
     Delete an post.
 
     Parameters:
-        post (Post, optional): The `Post` object to be deleted.
+        post_id (int): The ID of the post to delete.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the post was deleted.
+        str: A message indicating that the post was deleted, or a 404 error if not found.
+    """
+    return await delete_post(post_id, session)
+
+
+@live_router.websocket("/posts")
+async def post_feed(
+    websocket: WebSocket,
+    category_id: List[int] = Query([]),
+    tag_id: List[int] = Query([]),
+):
+    """
+    Stream the posts created, updated and deleted from now on, as `PostEvent` messages.
+
+    Parameters:
+        websocket (WebSocket): The incoming socket.
+        category_id (List[int], optional): Only the posts of these categories.
+        tag_id (List[int], optional): Only the posts with these tags. Every post is
+            sent when neither `category_id` nor `tag_id` is given.
+
+    Returns:
+        None: Once the client disconnects. A client that falls too far behind is
+            disconnected with a 1013 close code, and one on a worker that shuts
+            down with 1001.
     """
-    return await delete_post(post, session)
+    await websocket.accept()
+    await feed.serve(websocket, set(category_id), set(tag_id))
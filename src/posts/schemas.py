@@ -1,5 +1,7 @@
+from enum import Enum
+
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, Dict, List, Literal, Optional
 
 from src.tags.schemas import TagBase
 
@@ -12,6 +14,80 @@ class PostCreate(BaseModel):
     tags: List[int] = []
 
 
+class PostUpdate(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    author_id: Optional[int] = None
+    category_id: Optional[int] = None
+    tags: Optional[List[int]] = None
+
+
+class PostSort(str, Enum):
+    id = "id"
+    id_desc = "-id"
+    title = "title"
+    title_desc = "-title"
+
+
 class PostBase(PostCreate):
     id: int
     tags: List[TagBase] = []
+
+
+class PostView(str, Enum):
+    full = "full"
+    summary = "summary"
+
+
+# The fields a post can be projected to, in output order: those of `PostBase`,
+# then the excerpt of the content.
+POST_FIELDS = ("title", "content", "author_id", "category_id", "tags", "id", "excerpt")
+FULL_FIELDS = POST_FIELDS[:-1]
+SUMMARY_FIELDS = ("title", "author_id", "category_id", "tags", "id", "excerpt")
+
+
+class PostSummary(BaseModel):
+    title: str
+    author_id: Optional[int] = None
+    category_id: Optional[int] = None
+    tags: List[TagBase] = []
+    id: int
+    excerpt: str
+
+
+class PostViewCount(BaseModel):
+    id: int
+    title: str
+    view_count: int
+
+
+class PostSearchResult(PostBase):
+    snippet: Optional[str] = None
+
+
+BULK_CREATE_LIMIT = 5000
+
+PostBulkCreate = Annotated[
+    List[PostCreate], Field(min_length=1, max_length=BULK_CREATE_LIMIT)
+]
+
+
+class PostBulkError(BaseModel):
+    index: int
+    missing: Dict[str, int | List[int]]
+
+
+class PostBulkResult(BaseModel):
+    ids: List[Optional[int]]
+    errors: List[PostBulkError] = []
+
+
+# A message of the live post feed.
+class PostEvent(BaseModel):
+    event: Literal["create", "update", "delete"]
+    # The post as written, or as it was before it was deleted.
+    post: PostBase
+    # For an update, the category and tags the post had before, whose
+    # subscribers are sent the update too, to see the post leave them.
+    previous_category_id: Optional[int] = None
+    previous_tag_ids: List[int] = []
@@ -1,34 +1,383 @@
-from typing import List
+from typing import (
+    AsyncIterator,
+    Container,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
-from fastapi import Depends, HTTPException
-from sqlalchemy import delete, select, update
+import orjson
+from fastapi import Depends, HTTPException, Query, Request
+from sqlalchemy import (
+    CTE,
+    ColumnElement,
+    Integer,
+    Row,
+    Select,
+    all_,
+    any_,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    literal_column,
+    null,
+    select,
+    true,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, REAL, aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import InstrumentedAttribute, load_only, noload
 
-from src.authors.service import get_author
-from src.categories.service import get_category
-from src.tags.models import Tag
-from src.tags.service import get_tag
+from src.authors.models import Author
+from src.categories.models import Category
+from src.tags.models import PostTag, Tag
+from src.tags.schemas import TagBase
 
-from .models import Post
-from .schemas import PostCreate
+from .models import SEARCH_CONFIG, Post
+from .schemas import (
+    FULL_FIELDS,
+    POST_FIELDS,
+    SUMMARY_FIELDS,
+    PostBase,
+    PostBulkError,
+    PostBulkResult,
+    PostCreate,
+    PostSearchResult,
+    PostSort,
+    PostUpdate,
+    PostView,
+    PostViewCount,
+)
+from src.cache import CACHE_ERRORS, CachedEntity, post_cache, serialize
+from src.changes.service import record_changes
+from src.conditional import (
+    Validators,
+    entity_validators,
+    fetch_page_validators,
+    is_conditional,
+    is_not_modified,
+    page_etag,
+    missing_or_modified,
+    parse_versions,
+    version_etag,
+)
 from src.database import get_async_session
+from src.pagination import Page, Pagination, paginate, pagination_params
+from src.replicas import get_read_session, replica_router, wrote_recently
+from src.response_cache import invalidate_responses
+from .live import publish_post, publish_posts
+from .view_counts import forget_views, most_viewed
+
+
+EXPORT_BATCH_SIZE = 1000
+# The columns writes return: those of `PostBase`, but the tags, and of its ETag.
+WRITE_RETURNING = (
+    Post.id,
+    Post.title,
+    Post.content,
+    Post.author_id,
+    Post.category_id,
+    Post.version,
+    Post.updated_at,
+)
+HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10"
+)
+
+
+def posts_query(
+    author_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    sort: PostSort = PostSort.id,
+) -> Tuple[Select, List[InstrumentedAttribute], bool]:
+    """Build the filtered query of `get_posts` with its keyset and direction.
+
+    Every combination is backed by an index: `(title, id)` or the primary key
+    without a filter, `(author_id, ...)` and `(category_id, ...)` composites for
+    those filters, and `post_tags (tag_id, post_id)` for the tag filter.
+    """
+    query = select(Post)
+    if author_id is not None:
+        query = query.where(Post.author_id == author_id)
+    if category_id is not None:
+        query = query.where(Post.category_id == category_id)
+    if tag_id is not None:
+        query = query.where(
+            Post.id.in_(select(PostTag.post_id).where(PostTag.tag_id == tag_id))
+        )
+    keys = [Post.id]
+    if sort in (PostSort.title, PostSort.title_desc):
+        keys = [Post.title, Post.id]
+    return query, keys, sort.value.startswith("-")
 
 
 async def get_posts(
-    session: AsyncSession = Depends(get_async_session),
-) -> List[Post]:
-    """Get all posts.
+    session: AsyncSession = Depends(get_read_session),
+    pagination: Pagination = Depends(pagination_params),
+    author_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    sort: PostSort = PostSort.id,
+) -> Page[Post]:
+    """Get a page of posts, optionally filtered and sorted.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+        author_id (int, optional): Only return the posts of this author.
+        category_id (int, optional): Only return the posts of this category.
+        tag_id (int, optional): Only return the posts with this tag.
+        sort (PostSort, optional): The sort order, by ID or title, `-` for descending.
+
+    Returns:
+        Page[Post]: The `Post` objects of the page and the cursor of the next one.
+    """
+    query, keys, descending = posts_query(author_id, category_id, tag_id, sort)
+    return await paginate(session, query, pagination, keys, descending)
+
+
+async def get_posts_validators(
+    session: AsyncSession,
+    pagination: Pagination,
+    author_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    sort: PostSort = PostSort.id,
+) -> Validators:
+    """Get the validators of a page of posts from their IDs and versions only.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+        author_id (int, optional): Only consider the posts of this author.
+        category_id (int, optional): Only consider the posts of this category.
+        tag_id (int, optional): Only consider the posts with this tag.
+        sort (PostSort, optional): The sort order, by ID or title, `-` for descending.
+
+    Returns:
+        Validators: The ETag of the page.
+    """
+    query, keys, descending = posts_query(author_id, category_id, tag_id, sort)
+    query = query.with_only_columns(Post.id, Post.version)
+    return await fetch_page_validators(session, query, pagination, keys, descending)
+
+
+def post_fields_params(
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated fields to return, e.g. `title,tags`. "
+        "`id` is always returned and `excerpt` is the start of the content.",
+    ),
+    view: PostView = Query(
+        PostView.full,
+        description="`summary` returns an `excerpt` instead of the content. "
+        "Ignored if `fields` is given.",
+    ),
+) -> Tuple[str, ...]:
+    """Resolve the fields of the post representation a read asks for.
+
+    Parameters:
+        fields (str, optional): The comma-separated fields to return.
+        view (PostView, optional): The preset of fields to return without `fields`.
+
+    Returns:
+        Tuple[str, ...]: The fields to return, in output order, or a 400 error
+            if any of them does not exist.
+    """
+    if fields is None:
+        return SUMMARY_FIELDS if view == PostView.summary else FULL_FIELDS
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    if unknown := requested - set(POST_FIELDS):
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return tuple(field for field in POST_FIELDS if field in requested | {"id"})
+
+
+def _tag_arrays():
+    """A lateral subquery aggregating the tag IDs and names of each post, by tag ID."""
+    return (
+        select(
+            func.array_agg(aggregate_order_by(Tag.id, Tag.id)).label("tag_ids"),
+            func.array_agg(aggregate_order_by(Tag.name, Tag.id)).label("tag_names"),
+        )
+        .join_from(PostTag, Tag, PostTag.tag_id == Tag.id)
+        .where(PostTag.post_id == Post.id)
+        .lateral("post_tag_arrays")
+    )
+
+
+async def get_post_rows(
+    session: AsyncSession,
+    pagination: Pagination,
+    author_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    sort: PostSort = PostSort.id,
+    fields: Sequence[str] = FULL_FIELDS,
+) -> Page[tuple]:
+    """Get a page of posts as plain column tuples, for `encode_posts`.
+
+    Only the columns of the requested fields are selected. The tags are
+    aggregated into arrays in the same query, so no ORM object is built and no
+    second query loads the tags.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+        author_id (int, optional): Only return the posts of this author.
+        category_id (int, optional): Only return the posts of this category.
+        tag_id (int, optional): Only return the posts with this tag.
+        sort (PostSort, optional): The sort order, by ID or title, `-` for descending.
+        fields (Sequence[str], optional): The fields to return, in output order.
+
+    Returns:
+        Page[tuple]: `(id, version, *values)` tuples, with the tags as two arrays of
+            IDs and names, and the cursor of the next page.
+    """
+    query, keys, descending = posts_query(author_id, category_id, tag_id, sort)
+    tags = _tag_arrays()
+    columns = [Post.id, Post.version]
+    for field in fields:
+        if field == "tags":
+            columns += [tags.c.tag_ids, tags.c.tag_names]
+        elif field != "id":
+            columns.append(getattr(Post, field))
+    query = query.with_only_columns(*columns)
+    if "tags" in fields:
+        query = query.join_from(Post, tags, true())
+    return await paginate(session, query, pagination, keys, descending)
+
+
+def encode_posts(rows: List[tuple], fields: Sequence[str] = FULL_FIELDS) -> bytes:
+    """Serialise the rows of `get_post_rows` as a JSON list of posts.
+
+    Keys are emitted in the field order of `PostBase` and `TagBase`, so with all
+    fields the bytes are those the `response_model` of the route would produce
+    from ORM objects, without validating anything.
+    """
+
+    def encode(row: tuple) -> dict:
+        post, values = {}, iter(row[2:])
+        for field in fields:
+            if field == "tags":
+                tag_ids, tag_names = next(values), next(values)
+                post["tags"] = [
+                    {"name": name, "id": tag_id}
+                    for tag_id, name in zip(tag_ids or (), tag_names or ())
+                ]
+            else:
+                post[field] = row[0] if field == "id" else next(values)
+        return post
+
+    return orjson.dumps([encode(row) for row in rows])
+
+
+def post_rows_validators(page: Page[tuple]) -> Validators:
+    """The validators of a page of `get_post_rows`, equal to those of `get_posts`."""
+    return Validators(etag=page_etag([row[:2] for row in page.items], page.next_cursor))
+
+
+async def search_posts(
+    q: str,
+    session: AsyncSession,
+    pagination: Pagination = Pagination(),
+    highlight: bool = False,
+) -> Page[PostSearchResult]:
+    """Search posts by title and content.
+
+    The query is matched against the GIN-indexed `search_vector` column and the
+    results are ordered by `ts_rank_cd`, title matches first, then by ID.
 
     Parameters:
+        q (str): The search query, in `websearch_to_tsquery` syntax.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+        highlight (bool, optional): Whether to add a snippet of the content with the
+            matches wrapped in `<mark>` tags.
 
     Returns:
-        List[Post]: A list of `Post` objects representing all posts in the database.
+        Page[PostSearchResult]: The matching posts of the page and the cursor of the next one.
     """
-    result = await session.execute(select(Post))
-    posts: List[Post] = result.scalars().all()
-    return posts
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(Post.search_vector, tsquery, type_=REAL)
+    query = select(Post).where(Post.search_vector.bool_op("@@")(tsquery))
+    if highlight:
+        query = query.add_columns(
+            func.ts_headline(SEARCH_CONFIG, Post.content, tsquery, HEADLINE_OPTIONS)
+        )
+    page = await paginate(session, query, pagination, [rank, Post.id], descending=True)
+    results = []
+    for item in page.items:
+        post, snippet = item if highlight else (item, None)
+        result = PostSearchResult.model_validate(post, from_attributes=True)
+        result.snippet = snippet
+        results.append(result)
+    return Page(items=results, next_cursor=page.next_cursor)
+
+
+def _export_query(author_id: Optional[int], category_id: Optional[int]) -> Select:
+    tag_ids = (
+        select(PostTag.tag_id)
+        .where(PostTag.post_id == Post.id)
+        .order_by(PostTag.tag_id)
+        .scalar_subquery()
+    )
+    query = select(
+        Post.id,
+        Post.title,
+        Post.content,
+        Post.author_id,
+        Post.category_id,
+        func.array(tag_ids).label("tags"),
+    ).order_by(Post.id)
+    if author_id is not None:
+        query = query.where(Post.author_id == author_id)
+    if category_id is not None:
+        query = query.where(Post.category_id == category_id)
+    return query
+
+
+async def export_posts(
+    author_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    primary: bool = False,
+) -> AsyncIterator[bytes]:
+    """Stream posts as NDJSON, one JSON object per line.
+
+    Rows are read through a server-side cursor `EXPORT_BATCH_SIZE` at a time and
+    the tag ids are aggregated in SQL, so no ORM objects are built and memory
+    use does not grow with the size of the table. The session is opened here
+    rather than injected, because it has to outlive the request handler while
+    the response is being streamed.
+
+    Parameters:
+        author_id (int, optional): Only export the posts of this author.
+        category_id (int, optional): Only export the posts of this category.
+        primary (bool, optional): Read from the primary rather than from a replica.
+
+    Yields:
+        bytes: A batch of serialised posts, each terminated by a newline.
+    """
+    query = _export_query(author_id, category_id).execution_options(
+        yield_per=EXPORT_BATCH_SIZE
+    )
+    async with replica_router.session(primary) as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield b"".join(
+                orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE)
+                for row in rows
+            )
 
 
 async def get_post(
@@ -52,71 +401,509 @@ async def get_post(
     return response
 
 
-async def create_post(post_data: PostCreate, session: AsyncSession) -> Post:
-    """Create a new Post.
+async def get_most_viewed_posts(
+    session: AsyncSession, limit: int
+) -> List[PostViewCount]:
+    """Get the most viewed posts, ranked in Redis.
+
+    Their counts are those flushed to the database, so they trail the views of
+    the last flush interval.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        limit (int): The number of posts to return.
+
+    Returns:
+        List[PostViewCount]: The posts by descending view count, or a 503 error if
+            Redis is unavailable.
+    """
+    try:
+        top = await most_viewed(limit)
+    except CACHE_ERRORS:
+        raise HTTPException(status_code=503, detail="View counts are unavailable")
+    if not top:
+        return []
+    query = select(Post.id, Post.title).where(Post.id.in_([id for id, _ in top]))
+    titles = dict((await session.execute(query)).tuples().all())
+    # Posts deleted since they were ranked are left out.
+    return [
+        PostViewCount(id=id, title=titles[id], view_count=views)
+        for id, views in top
+        if id in titles
+    ]
+
+
+async def get_post_projection(
+    post_id: int, fields: Sequence[str], session: AsyncSession
+) -> Post:
+    """Get an post by their ID, loading only the columns of some fields.
+
+    Parameters:
+        post_id (int): The ID of the post to retrieve.
+        fields (Sequence[str]): The fields to load. Other columns are deferred and
+            the tags are only loaded if asked for.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Post: The partially loaded `Post` object, or a 404 error if not found.
+    """
+    columns = [getattr(Post, field) for field in fields if field not in ("id", "tags")]
+    options = [load_only(Post.version, Post.updated_at, *columns)]
+    if "tags" not in fields:
+        options.append(noload(Post.tags))
+    query = select(Post).where(Post.id == post_id).options(*options)
+    response: Post = (await session.scalars(query)).first()
+    if not response:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return response
+
+
+def encode_post(post: Post, fields: Sequence[str]) -> bytes:
+    """Serialise the given fields of a post loaded by `get_post_projection`."""
+    return orjson.dumps(
+        {
+            field: (
+                [{"name": tag.name, "id": tag.id} for tag in post.tags]
+                if field == "tags"
+                else getattr(post, field)
+            )
+            for field in fields
+        }
+    )
+
+
+async def get_post_validators(post_id: int, session: AsyncSession) -> Validators:
+    """Get the validators of an post without loading it.
+
+    Parameters:
+        post_id (int): The ID of the post.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Validators: The ETag and Last-Modified of the post, or a 404 error if not found.
+    """
+    query = select(Post.version, Post.updated_at).where(Post.id == post_id)
+    row = (await session.execute(query)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return Validators(etag=version_etag(row.version), last_modified=row.updated_at)
+
+
+async def get_post_cached(
+    post_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+) -> CachedEntity:
+    """Get an post by their ID through the read-through cache.
+
+    Conditional requests that miss the cache are answered from the version of
+    the post alone when the client's copy is current, without loading its tags.
+
+    Parameters:
+        post_id (int): The ID of the post to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        CachedEntity: The post serialised as `PostBase`, or a 404 error if not found.
+    """
+
+    async def load() -> CachedEntity:
+        post = await get_post(post_id, session)
+        return CachedEntity(serialize(PostBase, post), entity_validators(post))
+
+    async def revalidate() -> Optional[Validators]:
+        validators = await get_post_validators(post_id, session)
+        return validators if is_not_modified(request, validators) else None
+
+    return await post_cache.get(
+        post_id,
+        load,
+        revalidate if is_conditional(request) else None,
+        bypass=wrote_recently(request),
+    )
+
+
+def _missing_references(
+    post_data: PostCreate | PostUpdate,
+    author_found: bool,
+    category_found: bool,
+    tags_found: Container[int],
+) -> Dict[str, int | List[int]]:
+    missing = {}
+    if not author_found:
+        missing["author_id"] = post_data.author_id
+    if not category_found:
+        missing["category_id"] = post_data.category_id
+    tags = [
+        tag_id
+        for tag_id in dict.fromkeys(post_data.tags or ())
+        if tag_id not in tags_found
+    ]
+    if tags:
+        missing["tags"] = tags
+    return missing
+
+
+async def check_references(
+    post_data: PostCreate | PostUpdate, session: AsyncSession
+) -> None:
+    """Check that the author, category and tags of a post exist, in one round trip.
+
+    A single query selects whether the author and the category exist next to
+    every requested tag, outer-joined to a one-row anchor so that a row comes
+    back even when no tag matches. A `None` author or category is not looked up.
+
+    Writes run it after a foreign key violation only, to explain it.
+
+    Parameters:
+        post_data (PostCreate | PostUpdate): The post data referencing the related objects.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Raises:
+        HTTPException: 404 listing every referenced ID that does not exist.
+    """
+    tag_ids = list(dict.fromkeys(post_data.tags or ()))
+    author_found = true()
+    if post_data.author_id is not None:
+        author_found = exists().where(Author.id == post_data.author_id)
+    category_found = true()
+    if post_data.category_id is not None:
+        category_found = exists().where(Category.id == post_data.category_id)
+    anchor = select(literal(1).label("anchor")).subquery()
+    query = (
+        select(author_found, category_found, Tag.id)
+        .select_from(anchor)
+        .outerjoin(Tag, Tag.id.in_(tag_ids))
+    )
+    rows = (await session.execute(query)).all()
+
+    found = {row.id for row in rows if row.id is not None}
+    if missing := _missing_references(post_data, rows[0][0], rows[0][1], found):
+        raise HTTPException(
+            status_code=404,
+            detail={"message": "Related objects not found", "missing": missing},
+        )
+
+
+def _int_array(values: List[int]):
+    return literal(values, ARRAY(Integer))
+
+
+def _tags_json(post_id, tag_ids: Optional[List[int]] = None):
+    """The tags of a post as a JSON list of `TagBase` objects, ordered like `Post.tags`.
+
+    A statement that writes the links of a post does not see them, so it passes
+    the IDs of the new tags instead.
+    """
+    tag = func.json_build_object("name", Tag.name, "id", Tag.id)
+    query = select(
+        func.coalesce(
+            func.json_agg(aggregate_order_by(tag, Tag.id)), literal_column("'[]'::json")
+        )
+    )
+    if tag_ids is None:
+        query = query.join_from(PostTag, Tag, PostTag.tag_id == Tag.id).where(
+            PostTag.post_id == post_id
+        )
+    else:
+        query = query.where(Tag.id == any_(_int_array(tag_ids)))
+    return query.scalar_subquery()
+
+
+def _returned_post(written: CTE, tag_ids: Optional[List[int]] = None) -> Select:
+    """Select the post a CTE wrote, returning `WRITE_RETURNING`, with its tags."""
+    return select(*written.c, _tags_json(written.c.id, tag_ids).label("tags"))
+
+
+def _link_tags(written: CTE, tag_ids: List[int]) -> CTE:
+    """Link the post written by a CTE to the given tags, skipping existing links."""
+    tags = func.unnest(_int_array(tag_ids)).table_valued("tag_id").render_derived()
+    linked = exists().where(
+        PostTag.post_id == written.c.id, PostTag.tag_id == tags.c.tag_id
+    )
+    links = (
+        select(written.c.id, tags.c.tag_id)
+        .join_from(written, tags, true())
+        .where(~linked)
+    )
+    return insert(PostTag).from_select(["post_id", "tag_id"], links).cte("linked")
+
+
+async def _write_post(
+    query: Select, post_data: PostCreate | PostUpdate, session: AsyncSession
+) -> Optional[Row]:
+    """Run the statement of a post write, turning a missing reference into a 404."""
+    try:
+        return (await session.execute(query)).first()
+    except IntegrityError as exc:
+        await session.rollback()
+        await check_references(post_data, session)
+        raise exc
+
+
+async def create_post(post_data: PostCreate, session: AsyncSession) -> Row:
+    """Create a new Post, link its tags and add its outbox row with a single statement.
 
     Parameters:
         post_data (PostCreate): The post data to be created.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        Post: The newly created `Post` object.
+        Row: The created post, with the fields of `PostBase`, its `version` and
+            `updated_at`, or a 404 error if a related object does not exist.
     """
+    tag_ids = list(dict.fromkeys(post_data.tags))
+    inserted = (
+        insert(Post)
+        .values(**post_data.model_dump(exclude={"tags"}))
+        .returning(*WRITE_RETURNING)
+        .cte("inserted")
+    )
+    query = _returned_post(inserted, tag_ids).add_cte(
+        record_changes(("post", "create", inserted.c.id)).cte("outbox")
+    )
+    if tag_ids:
+        query = query.add_cte(_link_tags(inserted, tag_ids))
     try:
-        await get_author(post_data.author_id, session)
-        await get_category(post_data.category_id, session)
-        tags = [await get_tag(tag_id, session) for tag_id in post_data.tags]
+        response = await _write_post(query, post_data, session)
+        await session.commit()
+        await invalidate_responses("posts")
+        await publish_post("create", response)
+        return response
+    except IntegrityError as exc:
+        raise HTTPException(status_code=400, detail=f"Post creation failed: {str(exc)}")
 
-        db_post = Post(**post_data.model_dump(exclude={"tags"}))
-        db_post.tags = tags
-        session.add(db_post)
+
+async def _existing_references(
+    posts_data: List[PostCreate], session: AsyncSession
+) -> Tuple[Set[int], Set[int], Dict[int, str]]:
+    """Find which of the authors, categories and tags of many posts exist, in one query.
+
+    Each ID set is sent as a single array parameter, so the statement stays the
+    same size however many posts are checked. The tags are returned with their
+    names, by ID.
+    """
+
+    def existing(
+        kind: str,
+        column: InstrumentedAttribute,
+        ids: Set[Optional[int]],
+        name: ColumnElement[Optional[str]] = null(),
+    ) -> Select:
+        return select(
+            literal(kind).label("kind"), column.label("id"), name.label("name")
+        ).where(column == any_(literal(sorted(ids - {None}), ARRAY(Integer))))
+
+    query = union_all(
+        existing("author", Author.id, {post.author_id for post in posts_data}),
+        existing("category", Category.id, {post.category_id for post in posts_data}),
+        existing(
+            "tag", Tag.id, {tag for post in posts_data for tag in post.tags}, Tag.name
+        ),
+    )
+    found: Dict[str, Dict[int, Optional[str]]] = {
+        "author": {},
+        "category": {},
+        "tag": {},
+    }
+    for kind, found_id, name in await session.execute(query):
+        found[kind][found_id] = name
+    return set(found["author"]), set(found["category"]), found["tag"]
+
+
+async def create_posts(
+    posts_data: List[PostCreate], session: AsyncSession, atomic: bool = False
+) -> PostBulkResult:
+    """Create many posts in a single transaction.
+
+    The references of all posts are checked with one set-based query, the posts
+    are written with multi-row `INSERT ... RETURNING id` statements, their
+    tags with a single executemany and their outbox rows with one statement,
+    followed by one commit. The created posts are then published to the live
+    feed with one pipeline.
+
+    Parameters:
+        posts_data (List[PostCreate]): The posts to be created.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        atomic (bool, optional): Create nothing if any post references a missing object.
+            Otherwise the valid posts are created and the others reported.
+
+    Returns:
+        PostBulkResult: The ID of every created post, at the index of its input, and
+            the missing references of every post that was skipped.
+    """
+    authors, categories, tags = await _existing_references(posts_data, session)
+    valid, errors = [], []
+    for index, post_data in enumerate(posts_data):
+        missing = _missing_references(
+            post_data,
+            post_data.author_id is None or post_data.author_id in authors,
+            post_data.category_id is None or post_data.category_id in categories,
+            tags,
+        )
+        if missing:
+            errors.append(PostBulkError(index=index, missing=missing))
+        else:
+            valid.append(index)
+    if errors and atomic:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "message": "Related objects not found",
+                "errors": [error.model_dump() for error in errors],
+            },
+        )
+
+    ids: List[Optional[int]] = [None] * len(posts_data)
+    if not valid:
+        return PostBulkResult(ids=ids, errors=errors)
+    try:
+        result = await session.execute(
+            insert(Post).returning(Post.id, sort_by_parameter_order=True),
+            [posts_data[index].model_dump(exclude={"tags"}) for index in valid],
+        )
+        for index, post_id in zip(valid, result.scalars()):
+            ids[index] = post_id
+        links = [
+            {"post_id": ids[index], "tag_id": tag_id}
+            for index in valid
+            for tag_id in dict.fromkeys(posts_data[index].tags)
+        ]
+        if links:
+            await session.execute(insert(PostTag), links)
+        created = func.unnest(_int_array([ids[index] for index in valid]))
+        await session.execute(record_changes(("post", "create", created)))
         await session.commit()
-        await session.refresh(db_post)
-        return db_post
     except IntegrityError as exc:
         raise HTTPException(status_code=400, detail=f"Post creation failed: {str(exc)}")
+    await invalidate_responses("posts")
+    published: List[PostBase] = []
+    for index in valid:
+        post_data = posts_data[index]
+        post_tags = [
+            TagBase(id=tag_id, name=tags[tag_id])
+            for tag_id in sorted(set(post_data.tags))
+        ]
+        published.append(
+            PostBase(
+                **post_data.model_dump(exclude={"tags"}), id=ids[index], tags=post_tags
+            )
+        )
+    await publish_posts("create", published)
+    return PostBulkResult(ids=ids, errors=errors)
 
 
-async def update_post(post: Post, post_data: PostCreate, session: AsyncSession) -> Post:
-    """Update an post.
+async def update_post(
+    post_id: int,
+    post_data: PostCreate | PostUpdate,
+    session: AsyncSession,
+    if_match: Optional[List[str]] = None,
+) -> Row:
+    """Update an post, replace its tags and add its outbox row with a single statement.
 
     Parameters:
-        post (Post): The `Post` object to be updated.
-        post_data (PostCreate): The updated post data.
+        post_id (int): The ID of the post to update.
+        post_data (PostCreate | PostUpdate): The new post data. Only the fields set
+            in a `PostUpdate` are changed, the tags included.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        if_match (List[str], optional): Only update the post if its ETag is one of
+            these. The version is compared and bumped by the same UPDATE, so no
+            concurrent write can slip in between.
 
     Returns:
-        Post: The updated `Post` object.
+        Row: The updated post, with the fields of `PostBase`, its `version` and
+            `updated_at`. A 404 error if it or a related object does not exist, or
+            a 412 error if its ETag did not match.
     """
+    values = post_data.model_dump(exclude_unset=isinstance(post_data, PostUpdate))
+    tag_ids = values.pop("tags", None)
+    if tag_ids is not None:
+        tag_ids = list(dict.fromkeys(tag_ids))
+    query = update(Post).where(Post.id == post_id)
+    if if_match is not None:
+        query = query.where(Post.version.in_(parse_versions(if_match)))
+    changed = bool(values) or tag_ids is not None
+    if changed:
+        query = query.values(**values, version=Post.version + 1)
+    else:
+        # An empty patch still checks the post and its ETag, but changes nothing.
+        query = query.values(version=Post.version, updated_at=Post.updated_at)
+    updated = query.returning(*WRITE_RETURNING).cte("updated")
+    query = _returned_post(updated, tag_ids)
+    if changed:
+        # Subqueries see the post as it was before the statement, for the
+        # subscribers of the live feed to the category and tags it leaves.
+        previous_category_id = select(Post.category_id).where(Post.id == post_id)
+        previous_tag_ids = select(func.array_agg(PostTag.tag_id)).where(
+            PostTag.post_id == post_id
+        )
+        query = query.add_columns(
+            previous_category_id.scalar_subquery().label("previous_category_id"),
+            previous_tag_ids.scalar_subquery().label("previous_tag_ids"),
+        ).add_cte(record_changes(("post", "update", updated.c.id)).cte("outbox"))
+    if tag_ids is not None:
+        unlinked = (
+            delete(PostTag)
+            .where(
+                PostTag.post_id.in_(select(updated.c.id)),
+                PostTag.tag_id != all_(_int_array(tag_ids)),
+            )
+            .cte("unlinked")
+        )
+        query = query.add_cte(unlinked, _link_tags(updated, tag_ids))
     try:
-        await get_author(post_data.author_id, session)
-        await get_category(post_data.category_id, session)
-        tags: List[Tag] = [await get_tag(tag_id, session) for tag_id in post_data.tags]
-        post.tags = tags
-        for key, value in post_data.model_dump(exclude={"tags"}).items():
-            setattr(post, key, value)
-        session.add(post)
+        response = await _write_post(query, post_data, session)
+        if response is None:
+            raise await missing_or_modified(
+                session, Post, post_id, if_match, "Post not found"
+            )
         await session.commit()
-        await session.refresh(post)
-        return post
+        await post_cache.invalidate(post_id)
+        await invalidate_responses("posts")
+        if changed:
+            await publish_post(
+                "update",
+                response,
+                response.previous_category_id,
+                response.previous_tag_ids,
+            )
+        return response
     except IntegrityError as exc:
         raise HTTPException(status_code=400, detail=f"Post update failed: {str(exc)}")
 
 
-async def delete_post(post: Post, session: AsyncSession) -> str:
-    """Delete an post.
+async def delete_post(post_id: int, session: AsyncSession) -> str:
+    """Delete an post and add its outbox row with a single statement. Its links cascade.
 
     Parameters:
-        post (Post): The `Post` object to be deleted.
+        post_id (int): The ID of the post to delete.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the post was deleted.
+        str: A message indicating that the post was deleted, or a 404 error if not found.
     """
+    deleted = (
+        delete(Post)
+        .where(Post.id == post_id)
+        .returning(*WRITE_RETURNING)
+        .cte("deleted")
+    )
+    # The statement still sees the links it cascades to, so the deleted post
+    # is returned with its tags.
+    query = _returned_post(deleted).add_cte(
+        record_changes(("post", "delete", deleted.c.id)).cte("outbox")
+    )
     try:
-        query = delete(Post).where(Post.id == post.id)
-        await session.execute(query)
+        response = (await session.execute(query)).first()
         await session.commit()
-        return f"Post with id {post.id} was deleted"
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Post deletion failed: {str(exc)}")
+    if response is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    await post_cache.invalidate(post_id)
+    await invalidate_responses("posts")
+    await forget_views(post_id)
+    await publish_post("delete", response)
+    return f"Post with id {post_id} was deleted"
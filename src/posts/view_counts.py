@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, column, select, text, update, values
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from src.cache import CACHE_ERRORS
+from src.config import settings
+from src.database import async_session_maker
+from src.redis import cache_redis, redis
+from .models import VIEWS_ONLY_SETTING, Post
+
+
+logger = logging.getLogger(__name__)
+
+# Views not yet written to the database, as a hash of post ID to count.
+PENDING_KEY = "views:pending"
+# The batch being flushed. It outlives a flush that fails, to be retried.
+FLUSHING_KEY = "views:flushing"
+# The flushed view count of the most viewed posts.
+TOP_KEY = "views:top"
+# Set once the most viewed posts were loaded from the database into Redis.
+SEEDED_KEY = "views:top:seeded"
+LOCK_KEY = "views:flush:lock"
+UNLOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+LOCK_TIMEOUT_MS = 60_000
+# Rows per UPDATE, within the 32767 parameters asyncpg can bind.
+UPDATE_BATCH = 10_000
+# Posts whose views a worker buffers at most between two sends to Redis.
+MAX_BUFFERED_POSTS = 10_000
+
+# Views counted in this worker and not yet sent to Redis, by post ID.
+_buffered: Dict[int, int] = {}
+
+
+def record_view(post_id: int) -> None:
+    """Count a view of a post in this worker, to be sent to Redis in the next batch.
+
+    If Redis falls so far behind that the views of `MAX_BUFFERED_POSTS` posts
+    are waiting, the views of other posts are not counted.
+    """
+    if post_id in _buffered:
+        _buffered[post_id] += 1
+    elif len(_buffered) < MAX_BUFFERED_POSTS:
+        _buffered[post_id] = 1
+
+
+async def send_views() -> int:
+    """Add the views buffered in this worker to Redis with one pipeline.
+
+    A batch Redis does not take in time is dropped rather than retried, since
+    part of it may have been counted, and so that it cannot pile up.
+
+    Returns:
+        int: The number of posts whose views were sent.
+    """
+    global _buffered
+    batch, _buffered = _buffered, {}
+    if not batch:
+        return 0
+    try:
+        async with cache_redis.pipeline(transaction=False) as pipe:
+            for post_id, views in batch.items():
+                pipe.hincrby(PENDING_KEY, str(post_id), views)
+            await pipe.execute()
+    except CACHE_ERRORS as exc:
+        logger.warning("Views of %s posts not counted: %s", len(batch), exc)
+        return 0
+    return len(batch)
+
+
+async def add_views(
+    session: AsyncSession, counts: Dict[int, int]
+) -> List[Tuple[int, int]]:
+    """
+    Add views to the posts with one `UPDATE ... FROM (VALUES ...)` per batch.
+
+    The posts of each batch are locked in ID order first, like other writes of
+    many posts, and the updates skip the post count triggers, as the category
+    of no post changes.
+
+    Args:
+        session (AsyncSession): The session to write with, committed at the end.
+        counts (Dict[int, int]): The views to add, by post ID.
+
+    Returns:
+        List[Tuple[int, int]]: The ID and new view count of the posts that still exist.
+    """
+    items = sorted(counts.items())
+    totals = []
+    await session.execute(text(f"SET LOCAL {VIEWS_ONLY_SETTING} = on"))
+    for start in range(0, len(items), UPDATE_BATCH):
+        batch = items[start : start + UPDATE_BATCH]
+        await session.execute(
+            select(Post.id)
+            .where(Post.id.in_([post_id for post_id, _ in batch]))
+            .order_by(Post.id)
+            .with_for_update(key_share=True)
+        )
+        deltas = values(
+            column("id", Integer), column("views", Integer), name="deltas"
+        ).data(batch)
+        query = (
+            update(Post)
+            .where(Post.id == deltas.c.id)
+            # Views are not edits: the timestamp, and the validators, stay.
+            .values(
+                view_count=Post.view_count + deltas.c.views, updated_at=Post.updated_at
+            )
+            .returning(Post.id, Post.view_count)
+        )
+        totals += (await session.execute(query)).tuples().all()
+    await session.commit()
+    return totals
+
+
+class ViewCounter:
+    """
+    Write the views counted in Redis to the database every `interval` seconds.
+
+    Each worker sends the views it buffered to Redis every `send_interval`
+    seconds. Views accumulate there in a hash, so that they survive restarts
+    of the workers. The worker holding a Redis lock renames the hash, adds its counts
+    to the posts, then records their totals in the sorted set of the most
+    viewed posts, keeping its `top_size` highest. If Redis lost that set, it
+    is first loaded again from the view counts of the database. A batch whose flush fails
+    stays in Redis and is retried first; if a worker dies between committing
+    a batch and deleting it, that batch is counted twice.
+    """
+
+    def __init__(
+        self,
+        session_maker: sessionmaker = async_session_maker,
+        interval: float = settings.view_flush_interval,
+        top_size: int = settings.most_viewed_size,
+        send_interval: float = settings.view_send_interval,
+    ):
+        self.session_maker = session_maker
+        self.interval = interval
+        self.top_size = top_size
+        self.send_interval = send_interval
+        self._task: Optional[asyncio.Task] = None
+        self._sending: Optional[asyncio.Task] = None
+
+    async def flush(self) -> int:
+        """Write the pending views if no other worker is, returning how many posts got some."""
+        token = uuid.uuid4().hex
+        if not await redis.set(LOCK_KEY, token, nx=True, px=LOCK_TIMEOUT_MS):
+            return 0
+        try:
+            if not await redis.exists(SEEDED_KEY):
+                await self.seed_top()
+            if not await redis.exists(FLUSHING_KEY):
+                if not await redis.exists(PENDING_KEY):
+                    return 0
+                await redis.rename(PENDING_KEY, FLUSHING_KEY)
+            counts = {
+                int(post_id): int(views)
+                for post_id, views in (await redis.hgetall(FLUSHING_KEY)).items()
+            }
+            async with self.session_maker() as session:
+                totals = await add_views(session, counts)
+            async with redis.pipeline(transaction=True) as pipe:
+                if totals:
+                    pipe.zadd(TOP_KEY, dict(totals))
+                    pipe.zremrangebyrank(TOP_KEY, 0, -self.top_size - 1)
+                pipe.delete(FLUSHING_KEY)
+                await pipe.execute()
+            return len(counts)
+        finally:
+            await redis.eval(UNLOCK, 1, LOCK_KEY, token)
+
+    async def seed_top(self) -> None:
+        """Load the most viewed posts into Redis from their flushed view counts."""
+        query = (
+            select(Post.id, Post.view_count)
+            .where(Post.view_count > 0)
+            .order_by(Post.view_count.desc(), Post.id)
+            .limit(self.top_size)
+        )
+        async with self.session_maker() as session:
+            top = (await session.execute(query)).tuples().all()
+        async with redis.pipeline(transaction=True) as pipe:
+            if top:
+                pipe.zadd(TOP_KEY, dict(top))
+            pipe.set(SEEDED_KEY, 1)
+            await pipe.execute()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except CACHE_ERRORS + (SQLAlchemyError,) as exc:
+                logger.warning("View counts not flushed: %s", exc)
+
+    async def _send(self) -> None:
+        while True:
+            await asyncio.sleep(self.send_interval)
+            await send_views()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._sending = asyncio.create_task(self._send())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._sending):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._sending = None
+        # Views still buffered would be lost with the worker.
+        await send_views()
+
+
+view_counter = ViewCounter()
+
+
+async def most_viewed(limit: int) -> List[Tuple[int, int]]:
+    """The ID and flushed view count of the `limit` most viewed posts."""
+    top = await redis.zrevrange(TOP_KEY, 0, limit - 1, withscores=True)
+    return [(int(post_id), int(views)) for post_id, views in top]
+
+
+async def forget_views(post_id: int) -> None:
+    """Drop a deleted post from the most viewed posts."""
+    try:
+        await redis.zrem(TOP_KEY, str(post_id))
+    except CACHE_ERRORS as exc:
+        logger.warning(
+            "Deleted post %s not dropped from the most viewed: %s", post_id, exc
+        )
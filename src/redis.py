@@ -1,13 +1,23 @@
-from fastapi_limiter import FastAPILimiter
 from redis import asyncio as aioredis
 
 from src.config import settings
+from src.metrics import instrument_redis
 
 
 redis = aioredis.from_url(
     str(settings.redis_url), encoding="utf8", decode_responses=True
 )
+# Raw bytes for pre-serialised payloads. Short timeouts let callers fall back
+# to the database instead of stalling when Redis is slow or unreachable.
+cache_redis = aioredis.from_url(
+    str(settings.redis_url),
+    socket_timeout=settings.cache_socket_timeout,
+    socket_connect_timeout=settings.cache_socket_timeout,
+)
+instrument_redis(redis, "default")
+instrument_redis(cache_redis, "cache")
 
 
-async def init_redis() -> None:
-    await FastAPILimiter.init(redis)
+async def close_redis() -> None:
+    await redis.aclose()
+    await cache_redis.aclose()
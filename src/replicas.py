@@ -0,0 +1,251 @@
+import asyncio
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterator, List, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+from src.database import POOL_BUDGET, async_session_maker, engine_options, server_logger
+from src.metrics import instrument_engine
+
+
+# Set on the responses of successful writes. Its value is the time, in seconds
+# since the epoch, until which the client reads from the primary.
+PRIMARY_COOKIE = "read_primary_until"
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+CONNECTION_ERRORS = (DBAPIError, OSError, asyncio.TimeoutError)
+
+# A replica that has replayed everything it received is current, however old its
+# last replayed transaction: an idle primary sends nothing. A server that is not
+# in recovery, such as a second database standing in for a replica, always is.
+LAG_QUERY = text(
+    """
+    SELECT CAST(
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END AS float8
+    )
+    """
+)
+
+
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    session_maker: sessionmaker
+    # Seconds behind the primary at the last check, or None if it failed.
+    lag: Optional[float] = None
+    outstanding: int = 0
+
+
+def connect_replica(url: str) -> Replica:
+    """A replica with a pool sized like the primary's, as it is another server."""
+    engine = create_async_engine(url, **engine_options(settings, POOL_BUDGET))
+    instrument_engine(engine)
+    return Replica(
+        engine, sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    )
+
+
+class ReplicaRouter:
+    """
+    Pick the database the reads of a request run on.
+
+    Replicas take reads while their lag, checked every `check_interval` in the
+    background, is at most `max_lag` seconds. A replica that fails a check, or
+    a connection, is left out until it passes a check again. Reads go to the
+    available replicas in turn, or to the one with the fewest sessions open,
+    and to the primary when none is available or configured.
+    """
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        primary: sessionmaker,
+        strategy: str = settings.db_replica_strategy,
+        max_lag: float = settings.db_replica_max_lag,
+        check_interval: float = settings.db_replica_check_interval,
+    ):
+        self.replicas = replicas
+        self.primary = primary
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._turn = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_available(self, replica: Replica) -> bool:
+        return replica.lag is not None and replica.lag <= self.max_lag
+
+    def choose(self) -> Optional[Replica]:
+        candidates = [
+            replica for replica in self.replicas if self.is_available(replica)
+        ]
+        if not candidates:
+            return None
+        # Rotating the candidates also spreads the ties of `least_outstanding`.
+        start = next(self._turn) % len(candidates)
+        candidates = candidates[start:] + candidates[:start]
+        if self.strategy == "least_outstanding":
+            return min(candidates, key=lambda replica: replica.outstanding)
+        return candidates[0]
+
+    def mark_failed(self, replica: Replica, exc: Exception) -> None:
+        if replica.lag is not None:
+            server_logger.warning(
+                "Replica %s failed, reading from the primary: %s",
+                replica.engine.url,
+                exc,
+            )
+        replica.lag = None
+
+    async def _lag(self, replica: Replica) -> Optional[float]:
+        async with replica.engine.connect() as conn:
+            return await conn.scalar(LAG_QUERY)
+
+    async def check(self, replica: Replica) -> None:
+        """Measure the lag of a replica, which takes reads again if it is small enough."""
+        try:
+            lag = await asyncio.wait_for(self._lag(replica), self.check_interval)
+        except CONNECTION_ERRORS as exc:
+            return self.mark_failed(replica, exc)
+        was_available = self.is_available(replica)
+        replica.lag = lag
+        if was_available and not self.is_available(replica):
+            server_logger.warning(
+                "Replica %s lags %s seconds, reading from the primary",
+                replica.engine.url,
+                lag,
+            )
+        elif not was_available and self.is_available(replica):
+            server_logger.info("Replica %s takes reads", replica.engine.url)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    @asynccontextmanager
+    async def session(self, primary: bool = False) -> AsyncIterator[AsyncSession]:
+        """
+        Open a session on a replica, or on the primary.
+
+        Args:
+            primary (bool, optional): Read from the primary whatever the replicas.
+
+        Yields:
+            AsyncSession: A session to read with. Writes through it may fail.
+        """
+        replica = None if primary else self.choose()
+        if replica is not None:
+            replica.outstanding += 1
+            try:
+                session = replica.session_maker()
+                try:
+                    # Connect before the request reads, so that a replica that
+                    # is down costs a fallback rather than a failed request.
+                    await session.connection()
+                except CONNECTION_ERRORS as exc:
+                    await session.close()
+                    self.mark_failed(replica, exc)
+                else:
+                    async with session:
+                        try:
+                            yield session
+                        except DBAPIError as exc:
+                            if exc.connection_invalidated:
+                                self.mark_failed(replica, exc)
+                            raise
+                    return
+            finally:
+                replica.outstanding -= 1
+        async with self.primary() as session:
+            yield session
+
+
+replica_router = ReplicaRouter(
+    [connect_replica(str(url)) for url in settings.db_replica_urls],
+    async_session_maker,
+)
+
+
+def wrote_recently(request: Request) -> bool:
+    """Whether the client wrote recently enough that replicas may not show it yet."""
+    if not replica_router.replicas:
+        return False
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    async with replica_router.session(primary=wrote_recently(request)) as session:
+        yield session
+
+
+class ReadYourWritesMiddleware:
+    """
+    Send the clients of successful writes to the primary for `window` seconds.
+
+    Their next reads could otherwise reach a replica that has not replayed the
+    write yet. The deadline travels in a cookie, so it holds whichever worker
+    serves the next request. Nothing is set without replicas.
+    """
+
+    def __init__(
+        self, app: ASGIApp, window: float = settings.db_read_your_writes_seconds
+    ):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in WRITE_METHODS
+            or not replica_router.replicas
+        ):
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = (
+                    f"{PRIMARY_COOKIE}={time.time() + self.window:.3f}; "
+                    f"Max-Age={math.ceil(self.window)}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"set-cookie", cookie.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,333 @@
+import gzip
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.cache import CACHE_ERRORS, repeat_after_replica_lag
+from src.conditional import Validators, is_not_modified
+from src.config import settings
+from src.redis import cache_redis
+from src.replicas import wrote_recently
+from src.utils import rate_limit
+
+
+logger = logging.getLogger(__name__)
+
+# The cached list endpoints and the namespace whose writes invalidate them.
+CACHED_PATHS: Dict[str, str] = {
+    "/api/v1/authors/": "authors",
+    "/api/v1/categories/": "categories",
+    "/api/v1/tags/": "tags",
+    "/api/v1/posts/": "posts",
+    "/api/v1/posts/search": "posts",
+}
+KEY_PREFIX = "cache:responses"
+GENERATIONS_KEY = f"{KEY_PREFIX}:generations"
+GZIP_LEVEL = 6
+MAX_BODY_SIZE = 1 << 20
+# Response headers that describe the stored body rather than the payload.
+TRANSFER_HEADERS = {b"content-length", b"vary", b"x-cache"}
+UNCACHEABLE_HEADERS = {b"set-cookie", b"content-encoding"}
+
+# Start namespaces at a random generation, so that entries kept in a worker's
+# memory never match again if Redis loses the generations.
+GENERATION = """
+local generation = redis.call('hget', KEYS[1], ARGV[1])
+if not generation then
+    generation = ARGV[2]
+    redis.call('hset', KEYS[1], ARGV[1], generation)
+end
+return generation
+"""
+generation_script = cache_redis.register_script(GENERATION)
+
+# The generations of namespaces read from Redis, with the time they expire.
+_generations: Dict[str, Tuple[int, float]] = {}
+
+
+async def current_generation(namespace: str) -> int:
+    """The generation of a namespace, read from Redis at most once per TTL."""
+    now = time.monotonic()
+    cached = _generations.get(namespace)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    generation = int(
+        await generation_script(
+            keys=[GENERATIONS_KEY], args=[namespace, uuid.uuid4().int >> 96]
+        )
+    )
+    _generations[namespace] = (
+        generation,
+        now + settings.response_cache_generation_ttl,
+    )
+    return generation
+
+
+@dataclass
+class CachedResponse:
+    headers: List[Tuple[bytes, bytes]]
+    identity: bytes
+    gzip: bytes
+    expires: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.identity) + len(self.gzip)
+
+    @property
+    def etag(self) -> Optional[str]:
+        for name, value in self.headers:
+            if name == b"etag":
+                return value.decode("latin-1")
+        return None
+
+    def pack_headers(self) -> bytes:
+        return orjson.dumps(
+            [[n.decode("latin-1"), v.decode("latin-1")] for n, v in self.headers]
+        )
+
+    @staticmethod
+    def unpack_headers(data: bytes) -> List[Tuple[bytes, bytes]]:
+        return [
+            (n.encode("latin-1"), v.encode("latin-1")) for n, v in orjson.loads(data)
+        ]
+
+
+class LocalCache:
+    """An LRU of cached responses bounded by the size of their bodies."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        if entry.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        self.size -= self._entries.pop(key).size
+
+
+def accepts_gzip(request: Request) -> bool:
+    """Whether `Accept-Encoding` lists gzip, or `*`, with a non-zero quality."""
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        try:
+            return not params.strip() or float(params.strip().removeprefix("q=")) > 0
+        except ValueError:
+            return False
+    return False
+
+
+class ResponseCacheMiddleware:
+    """
+    Serve hot list endpoints from stored, already encoded response bodies.
+
+    Each 200 response of a path in `CACHED_PATHS` is stored once as an identity
+    body and once gzip-compressed, in Redis and in an in-process LRU in front of
+    it, and replayed as raw bytes: a hit skips routing, the database, the ORM,
+    validation, serialisation and compression. The variant sent follows the
+    `Accept-Encoding` of the request.
+
+    Keys embed the generation of their namespace, which writes bump through
+    `invalidate_responses`. The generation is read before the request reaches
+    the database, so a response computed concurrently with a write is stored
+    under the generation that write has already retired. Each worker keeps the
+    generations it read for `response_cache_generation_ttl` seconds, and those
+    its own writes set, so a hit in its memory makes no Redis call at all; the
+    writes of other workers are seen at most that late. Rate limits still apply
+    to hits, and any Redis failure falls through to the application.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Dict[str, str] = CACHED_PATHS,
+        max_bytes: int = settings.response_cache_local_bytes,
+    ):
+        self.app = app
+        self.paths = paths
+        self.local = LocalCache(max_bytes)
+        self.limiter = rate_limit()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        namespace = self.paths.get(scope["path"])
+        if namespace is None or not settings.response_cache_enabled:
+            return await self.app(scope, receive, send)
+
+        request = Request(scope)
+        # Entries may have been filled from a replica that was behind its writes.
+        if wrote_recently(request):
+            return await self.app(scope, receive, send)
+        try:
+            key = await self.key(namespace, scope)
+            entry = self.local.get(key) or await self._fetch(key)
+        except CACHE_ERRORS as exc:
+            logger.warning("Response cache lookup failed for %r: %s", namespace, exc)
+            return await self.app(scope, receive, send)
+
+        if entry is None:
+            return await self._fill(key, scope, receive, send)
+        try:
+            await self.limiter(request)
+        except HTTPException as exc:
+            response = ORJSONResponse(
+                {"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers
+            )
+            return await response(scope, receive, send)
+        await self._replay(entry, request, send)
+
+    async def key(self, namespace: str, scope: Scope) -> str:
+        generation = await current_generation(namespace)
+        query = parse_qsl(
+            scope["query_string"].decode("latin-1"), keep_blank_values=True
+        )
+        # Parameter order does not change the response, so it does not split keys.
+        url = f"{scope['path']}?{urlencode(sorted(query))}"
+        return f"{KEY_PREFIX}:{namespace}:{generation}:{url}"
+
+    async def _fetch(self, key: str) -> Optional[CachedResponse]:
+        headers, identity, compressed = await cache_redis.hmget(
+            key, "headers", "identity", "gzip"
+        )
+        if headers is None or identity is None or compressed is None:
+            return None
+        entry = CachedResponse(
+            CachedResponse.unpack_headers(headers),
+            identity,
+            compressed,
+            expires=time.monotonic() + settings.cache_ttl,
+        )
+        self.local.set(key, entry)
+        return entry
+
+    async def _replay(
+        self, entry: CachedResponse, request: Request, send: Send
+    ) -> None:
+        headers = [*entry.headers, (b"vary", b"Accept-Encoding"), (b"x-cache", b"HIT")]
+        etag = entry.etag
+        if etag is not None and is_not_modified(request, Validators(etag)):
+            await send(
+                {"type": "http.response.start", "status": 304, "headers": headers}
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+        body = entry.identity
+        if accepts_gzip(request) and len(entry.gzip) < len(entry.identity):
+            body = entry.gzip
+            headers.append((b"content-encoding", b"gzip"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _fill(self, key: str, scope: Scope, receive: Receive, send: Send) -> None:
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture(message: Message) -> None:
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"vary", b"Accept-Encoding"),
+                        (b"x-cache", b"MISS"),
+                    ],
+                }
+            elif message["type"] == "http.response.body" and size <= MAX_BODY_SIZE:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+            await send(message)
+
+        await self.app(scope, receive, capture)
+        if start is None or start["status"] != 200 or size > MAX_BODY_SIZE:
+            return
+        headers = [(name.lower(), value) for name, value in start.get("headers", [])]
+        if any(name in UNCACHEABLE_HEADERS for name, _ in headers):
+            return
+        headers = [(n, v) for n, v in headers if n not in TRANSFER_HEADERS]
+        identity = b"".join(chunks)
+        entry = CachedResponse(
+            headers,
+            identity,
+            gzip.compress(identity, compresslevel=GZIP_LEVEL, mtime=0),
+            expires=time.monotonic() + settings.cache_ttl,
+        )
+        self.local.set(key, entry)
+        try:
+            async with cache_redis.pipeline(transaction=True) as pipe:
+                pipe.hset(
+                    key,
+                    mapping={
+                        "headers": entry.pack_headers(),
+                        "identity": entry.identity,
+                        "gzip": entry.gzip,
+                    },
+                )
+                pipe.expire(key, settings.cache_ttl)
+                await pipe.execute()
+        except CACHE_ERRORS as exc:
+            logger.warning("Response cache store failed for %r: %s", key, exc)
+
+
+async def invalidate_responses(*namespaces: str) -> None:
+    """
+    Retire the cached responses of the given namespaces after a write.
+
+    Call it after the transaction has committed. Entries of older generations
+    are never read again and expire on their own.
+    """
+    await _bump_generations(namespaces)
+    repeat_after_replica_lag(lambda: _bump_generations(namespaces))
+
+
+async def _bump_generations(namespaces: Tuple[str, ...]) -> None:
+    try:
+        async with cache_redis.pipeline(transaction=True) as pipe:
+            for namespace in namespaces:
+                pipe.hincrby(GENERATIONS_KEY, namespace, 1)
+            generations = await pipe.execute()
+    except CACHE_ERRORS as exc:
+        # Read the generations again rather than trust those kept.
+        for namespace in namespaces:
+            _generations.pop(namespace, None)
+        logger.warning("Response cache invalidation failed for %r: %s", namespaces, exc)
+        return
+    # This worker sees its own writes at once.
+    expires = time.monotonic() + settings.response_cache_generation_ttl
+    for namespace, generation in zip(namespaces, generations):
+        _generations[namespace] = (generation, expires)
@@ -0,0 +1,5 @@
+from .models import StatsRefresh
+
+__all__ = [
+    "StatsRefresh",
+]
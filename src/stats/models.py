@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import (
+    DDL,
+    Column,
+    Date,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    event,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+
+
+class StatsRefresh(Base):
+    """When each materialized view was last refreshed."""
+
+    __tablename__ = "stats_refreshes"
+
+    view: Mapped[str] = mapped_column(unique=True)
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+# The views are created by the migrations, or the DDL below, rather than by
+# `create_all`, so they are described apart from `Base.metadata`.
+views = MetaData()
+
+
+def daily_posts_view(name: str, key: str) -> Table:
+    return Table(
+        name,
+        views,
+        Column(key, Integer),
+        Column("name", String),
+        Column("day", Date),
+        Column("post_count", Integer),
+    )
+
+
+author_daily_posts = daily_posts_view("author_daily_posts", "author_id")
+category_daily_posts = daily_posts_view("category_daily_posts", "category_id")
+tag_daily_posts = daily_posts_view("tag_daily_posts", "tag_id")
+
+# The posts created each day, in UTC, by every author, in every category and
+# with every tag. Posts without an author or category are left out.
+VIEW_QUERIES: Dict[Table, str] = {
+    author_daily_posts: (
+        "SELECT authors.id AS author_id, authors.name, "
+        "CAST(posts.created_at AT TIME ZONE 'UTC' AS date) AS day, "
+        "CAST(count(*) AS integer) AS post_count "
+        "FROM posts JOIN authors ON authors.id = posts.author_id "
+        "GROUP BY authors.id, day"
+    ),
+    category_daily_posts: (
+        "SELECT categories.id AS category_id, categories.name, "
+        "CAST(posts.created_at AT TIME ZONE 'UTC' AS date) AS day, "
+        "CAST(count(*) AS integer) AS post_count "
+        "FROM posts JOIN categories ON categories.id = posts.category_id "
+        "GROUP BY categories.id, day"
+    ),
+    tag_daily_posts: (
+        "SELECT tags.id AS tag_id, tags.name, "
+        "CAST(posts.created_at AT TIME ZONE 'UTC' AS date) AS day, "
+        "CAST(count(*) AS integer) AS post_count "
+        "FROM post_tags JOIN posts ON posts.id = post_tags.post_id "
+        "JOIN tags ON tags.id = post_tags.tag_id "
+        "GROUP BY tags.id, day"
+    ),
+}
+
+
+def view_key(view: Table) -> Column:
+    """The ID column of the view, unique per day."""
+    return next(iter(view.c))
+
+
+# Created with the tables, as `create_all` does not run the migrations. The
+# unique index lets `REFRESH MATERIALIZED VIEW CONCURRENTLY` run without
+# blocking reads, and serves the pages of the stats endpoints.
+for view, query in VIEW_QUERIES.items():
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view.name} AS {query}"),
+    )
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{view.name}_{view_key(view).name}_day "
+            f"ON {view.name} ({view_key(view).name}, day)"
+        ),
+    )
+    # Tables cannot be dropped while views depend on them.
+    event.listen(
+        Base.metadata,
+        "before_drop",
+        DDL(f"DROP MATERIALIZED VIEW IF EXISTS {view.name}"),
+    )
@@ -0,0 +1,137 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import Table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.pagination import Pagination, pagination_params, set_next_cursor
+from src.replicas import get_read_session
+from src.utils import rate_limit
+from .models import author_daily_posts, category_daily_posts, tag_daily_posts
+from .schemas import AuthorDailyPosts, CategoryDailyPosts, Stats, TagDailyPosts
+from .service import get_daily_posts
+
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Stats"],
+)
+
+
+async def daily_posts(
+    view: Table,
+    response: Response,
+    session: AsyncSession,
+    pagination: Pagination,
+    entity_id: Optional[int],
+    since: Optional[date],
+    until: Optional[date],
+) -> dict:
+    page, refreshed_at = await get_daily_posts(
+        view, session, pagination, entity_id, since, until
+    )
+    set_next_cursor(response, page)
+    return {"refreshed_at": refreshed_at, "items": page.items}
+
+
+@router.get(
+    "/authors",
+    dependencies=[Depends(rate_limit())],
+    response_model=Stats[AuthorDailyPosts],
+)
+async def get_author_stats(
+    response: Response,
+    author_id: Optional[int] = None,
+    since: Optional[date] = Query(None, description="The first day, in UTC."),
+    until: Optional[date] = Query(None, description="The last day, in UTC."),
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Get the posts created per day by each author, as of the last refresh.
+
+    Parameters:
+        response (Response): The outgoing response, used to expose the next cursor.
+        author_id (int, optional): Only the days of this author.
+        since (date, optional): Only the days from this one on.
+        until (date, optional): Only the days up to this one, included.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Stats[AuthorDailyPosts]: The days by author and date, and when they were last
+            computed. The cursor of the next page, if any, is returned in the
+            `X-Next-Cursor` header.
+    """
+    return await daily_posts(
+        author_daily_posts, response, session, pagination, author_id, since, until
+    )
+
+
+@router.get(
+    "/categories",
+    dependencies=[Depends(rate_limit())],
+    response_model=Stats[CategoryDailyPosts],
+)
+async def get_category_stats(
+    response: Response,
+    category_id: Optional[int] = None,
+    since: Optional[date] = Query(None, description="The first day, in UTC."),
+    until: Optional[date] = Query(None, description="The last day, in UTC."),
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Get the posts created per day in each category, as of the last refresh.
+
+    Parameters:
+        response (Response): The outgoing response, used to expose the next cursor.
+        category_id (int, optional): Only the days of this category.
+        since (date, optional): Only the days from this one on.
+        until (date, optional): Only the days up to this one, included.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Stats[CategoryDailyPosts]: The days by category and date, and when they were
+            last computed. The cursor of the next page, if any, is returned in the
+            `X-Next-Cursor` header.
+    """
+    return await daily_posts(
+        category_daily_posts, response, session, pagination, category_id, since, until
+    )
+
+
+@router.get(
+    "/tags",
+    dependencies=[Depends(rate_limit())],
+    response_model=Stats[TagDailyPosts],
+)
+async def get_tag_stats(
+    response: Response,
+    tag_id: Optional[int] = None,
+    since: Optional[date] = Query(None, description="The first day, in UTC."),
+    until: Optional[date] = Query(None, description="The last day, in UTC."),
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Get the posts created per day with each tag, as of the last refresh.
+
+    Parameters:
+        response (Response): The outgoing response, used to expose the next cursor.
+        tag_id (int, optional): Only the days of this tag.
+        since (date, optional): Only the days from this one on.
+        until (date, optional): Only the days up to this one, included.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Stats[TagDailyPosts]: The days by tag and date, and when they were last
+            computed. The cursor of the next page, if any, is returned in the
+            `X-Next-Cursor` header.
+    """
+    return await daily_posts(
+        tag_daily_posts, response, session, pagination, tag_id, since, until
+    )
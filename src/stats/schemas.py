@@ -0,0 +1,31 @@
+from datetime import date, datetime
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic import BaseModel
+
+
+T = TypeVar("T")
+
+
+class DailyPosts(BaseModel):
+    name: str
+    day: date
+    post_count: int
+
+
+class AuthorDailyPosts(DailyPosts):
+    author_id: int
+
+
+class CategoryDailyPosts(DailyPosts):
+    category_id: int
+
+
+class TagDailyPosts(DailyPosts):
+    tag_id: int
+
+
+class Stats(BaseModel, Generic[T]):
+    # When the view was last refreshed, or None if it never was.
+    refreshed_at: Optional[datetime]
+    items: List[T]
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Table, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from src.cache import CACHE_ERRORS
+from src.config import settings
+from src.database import async_session_maker
+from src.pagination import Page, Pagination, paginate
+from src.redis import cache_redis
+from .models import VIEW_QUERIES, StatsRefresh, view_key
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "stats:refresh:lock"
+# Deletes the lock only if this worker still holds it.
+UNLOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+async def get_daily_posts(
+    view: Table,
+    session: AsyncSession,
+    pagination: Pagination,
+    entity_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> Tuple[Page[dict], Optional[datetime]]:
+    """Get a page of the posts per day of a view, ordered by ID and day.
+
+    Parameters:
+        view (Table): The materialized view to read.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+        entity_id (int, optional): Only the rows of this author, category or tag.
+        since (date, optional): Only the days from this one on.
+        until (date, optional): Only the days up to this one, included.
+
+    Returns:
+        Tuple[Page[dict], Optional[datetime]]: The rows of the page, the cursor of the
+            next one, and when the view was last refreshed.
+    """
+    key = view_key(view)
+    query = select(*view.c)
+    if entity_id is not None:
+        query = query.where(key == entity_id)
+    if since is not None:
+        query = query.where(view.c.day >= since)
+    if until is not None:
+        query = query.where(view.c.day <= until)
+    page = await paginate(session, query, pagination, [key, view.c.day])
+    page.items = [dict(zip(view.c.keys(), row)) for row in page.items]
+    refreshed_at = await session.scalar(
+        select(StatsRefresh.refreshed_at).where(StatsRefresh.view == view.name)
+    )
+    return page, refreshed_at
+
+
+async def refresh_views(session: AsyncSession, max_age: float) -> List[str]:
+    """Refresh the views last refreshed more than `max_age` seconds ago.
+
+    Each view is refreshed concurrently, so its readers are never blocked, and
+    committed along with its refresh time on its own.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        max_age (float): The age in seconds from which a view is refreshed.
+
+    Returns:
+        List[str]: The names of the refreshed views.
+    """
+    fresh = set(
+        await session.scalars(
+            select(StatsRefresh.view).where(
+                StatsRefresh.refreshed_at > func.now() - timedelta(seconds=max_age)
+            )
+        )
+    )
+    await session.commit()
+    refreshed = []
+    for view in VIEW_QUERIES:
+        if view.name in fresh:
+            continue
+        # `now()` is the start of the transaction, so the time recorded is never
+        # later than the snapshot the view was refreshed from.
+        await session.execute(
+            text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view.name}")
+        )
+        await session.execute(
+            insert(StatsRefresh)
+            .values(view=view.name, refreshed_at=func.now())
+            .on_conflict_do_update(
+                index_elements=[StatsRefresh.view],
+                set_={"refreshed_at": func.now()},
+            )
+        )
+        await session.commit()
+        refreshed.append(view.name)
+    return refreshed
+
+
+class StatsRefresher:
+    """
+    Refresh the stats views every `interval` seconds, from one worker at a time.
+
+    Every worker wakes up each interval and tries to take a Redis lock. The
+    one that gets it refreshes the views the others have not refreshed in the
+    last interval, so they are refreshed about once per interval in all. The
+    lock expires after `lock_timeout` seconds if its worker dies holding it.
+    Without Redis, no worker refreshes.
+    """
+
+    def __init__(
+        self,
+        session_maker: sessionmaker = async_session_maker,
+        interval: float = settings.stats_refresh_interval,
+        lock_timeout: float = settings.stats_refresh_lock_timeout,
+        lock_key: str = LOCK_KEY,
+    ):
+        self.session_maker = session_maker
+        self.interval = interval
+        self.lock_timeout = lock_timeout
+        self.lock_key = lock_key
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> List[str]:
+        """Refresh the stale views if no other worker is, returning their names."""
+        token = uuid.uuid4().hex
+        try:
+            locked = await cache_redis.set(
+                self.lock_key, token, nx=True, px=int(self.lock_timeout * 1000)
+            )
+        except CACHE_ERRORS as exc:
+            logger.warning("Stats not refreshed, Redis is unavailable: %s", exc)
+            return []
+        if not locked:
+            return []
+        try:
+            async with self.session_maker() as session:
+                return await refresh_views(session, self.interval)
+        finally:
+            try:
+                await cache_redis.eval(UNLOCK, 1, self.lock_key, token)
+            except CACHE_ERRORS as exc:
+                logger.warning("Stats refresh lock not released: %s", exc)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except (SQLAlchemyError, OSError) as exc:
+                logger.warning("Stats refresh failed: %s", exc)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+refresher = StatsRefresher()
@@ -1,12 +1,17 @@
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, PrimaryKeyConstraint, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
-from src.database import Base
+from src.database import Base, Timestamped
 
 
-class Tag(Base):
+class Tag(Timestamped, Base):
     __tablename__ = "tags"
+    # Serves `get_popular_tags`, scanned backwards.
+    __table_args__ = (Index("ix_tags_post_count_id", "post_count", "id"),)
+
     name: Mapped[str]
+    # The number of links to the tag, kept by the triggers of `src.posts.models`.
+    post_count: Mapped[int] = mapped_column(server_default=text("0"))
     posts: Mapped[list["Post"]] = relationship(
         secondary="post_tags", back_populates="tags", cascade="all, delete"
     )
@@ -14,6 +19,12 @@ class Tag(Base):
 
 class PostTag(Base):
     __tablename__ = "post_tags"
+    # The primary key leads with post_id, as in the migrations, rather than with
+    # the `id` inherited from `Base`; the index serves lookups by tag.
+    __table_args__ = (
+        PrimaryKeyConstraint("post_id", "tag_id", "id"),
+        Index("ix_post_tags_tag_id_post_id", "tag_id", "post_id"),
+    )
 
     post_id: Mapped[int] = mapped_column(
         ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True
@@ -1,13 +1,37 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped
 
+from src.cache import CachedEntity
+from src.conditional import (
+    entity_validators,
+    if_match_header,
+    is_conditional,
+    is_not_modified,
+    not_modified,
+    page_validators,
+    set_validators,
+)
 from src.database import get_async_session
+from src.pagination import (
+    MAX_PAGE_SIZE,
+    Pagination,
+    pagination_params,
+    set_next_cursor,
+)
+from src.replicas import get_read_session
 from src.utils import rate_limit
-from .schemas import TagBase, TagCreate
-from .service import get_tag, get_tags, create_tag, update_tag, delete_tag
+from .schemas import PopularTag, TagBase, TagCreate, TagUpdate
+from .service import (
+    get_popular_tags,
+    get_tag_cached,
+    get_tags_validators,
+    get_tags,
+    create_tag,
+    update_tag,
+    delete_tag,
+)
 
 
 router = APIRouter(
@@ -18,32 +42,72 @@ router = APIRouter(
 
 
 @router.get("/", dependencies=[Depends(rate_limit())], response_model=List[TagBase])
-async def get_all_tags(session: AsyncSession = Depends(get_async_session)):
+async def get_all_tags(
+    request: Request,
+    response: Response,
+    pagination: Pagination = Depends(pagination_params),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Get a page of tags, ordered by ID.
+
+    Parameters:
+        request (Request): The incoming request, checked for `If-None-Match`.
+        response (Response): The outgoing response, used to expose the next cursor and ETag.
+        pagination (Pagination, optional): The page size and the cursor of the previous page.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        List[TagBase]: A list of `TagBase` objects. The cursor of the next page, if any,
+            is returned in the `X-Next-Cursor` header. 304 if the client's copy of the
+            page is current.
+    """
+    if is_conditional(request):
+        validators = await get_tags_validators(session, pagination)
+        if is_not_modified(request, validators):
+            return not_modified(validators)
+    page = await get_tags(session, pagination)
+    set_next_cursor(response, page)
+    set_validators(response, page_validators(page, "updated_at"))
+    return page.items
+
+
+@router.get(
+    "/popular", dependencies=[Depends(rate_limit())], response_model=List[PopularTag]
+)
+async def get_popular(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
-    Get all tags.
+    Get the tags linked to the most posts.
 
     Parameters:
+        limit (int, optional): The number of tags to return.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        List[TagBase]: A list of `TagBase` objects representing all tags in the database.
+        List[PopularTag]: The `PopularTag` objects by descending post count.
     """
-    return await get_tags(session)
+    return await get_popular_tags(session, limit)
 
 
 @router.get("/{tag_id}", dependencies=[Depends(rate_limit())], response_model=TagBase)
-async def get_tag_by_id(tag: Mapped = Depends(get_tag)):
+async def get_tag_by_id(request: Request, tag: CachedEntity = Depends(get_tag_cached)):
     """
     Get an tag by their ID.
 
     Parameters:
         tag_id (int): The ID of the tag to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        TagBase: The `TagBase` object with the given ID, or a 404 error if not found.
+        TagBase: The `TagBase` object with the given ID, or a 404 error if not found,
+            or 304 if the client's copy is current.
     """
-    return tag
+    return tag.to_response(request)
 
 
 @router.post("/", dependencies=[Depends(rate_limit())], response_model=TagBase)
@@ -65,37 +129,71 @@ async def create_new_tag(
 
 @router.put("/{tag_id}", dependencies=[Depends(rate_limit())], response_model=TagBase)
 async def update_tag_by_id(
+    tag_id: int,
     tag_data: TagCreate,
-    tag: Mapped = Depends(get_tag),
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Update an tag.
+    Replace an tag.
 
     Parameters:
+        tag_id (int): The ID of the tag to update.
         tag_data (TagCreate): The updated tag data.
-        tag (Tag, optional): The `Tag` object to be updated.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
+        session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        TagBase: The updated `TagBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
+    """
+    updated = await update_tag(tag_id, tag_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
+
+
+@router.patch("/{tag_id}", dependencies=[Depends(rate_limit())], response_model=TagBase)
+async def patch_tag_by_id(
+    tag_id: int,
+    tag_data: TagUpdate,
+    response: Response,
+    if_match: Optional[List[str]] = Depends(if_match_header),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Update the given fields of an tag.
+
+    Parameters:
+        tag_id (int): The ID of the tag to update.
+        tag_data (TagUpdate): The fields to update. Fields left out are kept.
+        response (Response): The outgoing response, used to expose the new ETag.
+        if_match (List[str], optional): The ETags of the `If-Match` header, if any.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        TagBase: The updated `TagBase` object.
+        TagBase: The updated `TagBase` object, a 404 error if not found, or a 412 error
+            if `If-Match` did not match.
     """
-    return await update_tag(tag, tag_data, session)
+    updated = await update_tag(tag_id, tag_data, session, if_match)
+    set_validators(response, entity_validators(updated))
+    return updated
 
 
 @router.delete("/{tag_id}", dependencies=[Depends(rate_limit())])
 async def delete_tag_by_id(
-    tag: Mapped = Depends(get_tag),
+    tag_id: int,
     session: AsyncSession = Depends(get_async_session),
 ):
     """
     Delete an tag.
 
     Parameters:
-        tag (Tag, optional): The `Tag` object to be deleted.
+        tag_id (int): The ID of the tag to delete.
         session (AsyncSession, optional): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the tag was deleted.
+        str: A message indicating that the tag was deleted, or a 404 error if not found.
     """
-    return await delete_tag(tag, session)
+    return await delete_tag(tag_id, session)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -7,3 +9,11 @@ class TagCreate(BaseModel):
 
 class TagBase(TagCreate):
     id: int
+
+
+class PopularTag(TagBase):
+    post_count: int
+
+
+class TagUpdate(BaseModel):
+    name: Optional[str] = None
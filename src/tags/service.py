@@ -1,27 +1,86 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import Depends, HTTPException
-from sqlalchemy import delete, select, update
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import (
+    CTE,
+    ColumnElement,
+    delete,
+    exists,
+    func,
+    insert,
+    null,
+    select,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 
+from src.cache import CachedEntity, post_cache, serialize, tag_cache
+from src.changes.service import record_changes
+from src.conditional import (
+    Validators,
+    entity_validators,
+    fetch_page_validators,
+    is_conditional,
+    is_not_modified,
+    missing_or_modified,
+    parse_timestamps,
+    timestamp_etag,
+)
 from src.database import get_async_session
-from .models import Tag
-from .schemas import TagCreate
+from src.pagination import Page, Pagination, paginate, pagination_params
+from src.posts.models import Post, after_posts
+from src.replicas import get_read_session, wrote_recently
+from src.response_cache import invalidate_responses
+from .models import PostTag, Tag
+from .schemas import TagBase, TagCreate, TagUpdate
 
 
-async def get_tags(session: AsyncSession = Depends(get_async_session)) -> List[Tag]:
-    """Get all tags.
+async def get_tags(
+    session: AsyncSession = Depends(get_read_session),
+    pagination: Pagination = Depends(pagination_params),
+) -> Page[Tag]:
+    """Get a page of tags, ordered by ID.
 
     Parameters:
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
 
     Returns:
-        List[Tag]: A list of `Tag` objects representing all tags in the database.
+        Page[Tag]: The `Tag` objects of the page and the cursor of the next one.
     """
-    result = await session.execute(select(Tag))
-    tags: List[Tag] = result.scalars().all()
-    return tags
+    return await paginate(session, select(Tag), pagination, [Tag.id])
+
+
+async def get_tags_validators(
+    session: AsyncSession, pagination: Pagination
+) -> Validators:
+    """Get the validators of a page of tags from their IDs and timestamps only.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        pagination (Pagination): The page size and the cursor of the previous page.
+
+    Returns:
+        Validators: The ETag of the page.
+    """
+    query = select(Tag.id, Tag.updated_at)
+    return await fetch_page_validators(session, query, pagination, [Tag.id])
+
+
+async def get_popular_tags(session: AsyncSession, limit: int) -> List[Tag]:
+    """Get the tags linked to the most posts, from the index on their counts.
+
+    Parameters:
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        limit (int): The number of tags to return.
+
+    Returns:
+        List[Tag]: The `Tag` objects by descending post count, the newest first on ties.
+    """
+    query = select(Tag).order_by(Tag.post_count.desc(), Tag.id.desc()).limit(limit)
+    return list(await session.scalars(query))
 
 
 async def get_tag(
@@ -45,8 +104,61 @@ async def get_tag(
     return response
 
 
+async def get_tag_validators(tag_id: int, session: AsyncSession) -> Validators:
+    """Get the validators of a tag without loading it.
+
+    Parameters:
+        tag_id (int): The ID of the tag.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        Validators: The ETag and Last-Modified of the tag, or a 404 error if not found.
+    """
+    query = select(Tag.updated_at).where(Tag.id == tag_id)
+    updated_at = await session.scalar(query)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    return Validators(etag=timestamp_etag(updated_at), last_modified=updated_at)
+
+
+async def get_tag_cached(
+    tag_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+) -> CachedEntity:
+    """Get an tag by their ID through the read-through cache.
+
+    Conditional requests that miss the cache are answered from the timestamp of
+    the tag alone when the client's copy is current.
+
+    Parameters:
+        tag_id (int): The ID of the tag to retrieve.
+        request (Request): The incoming request, checked for `If-None-Match` and
+            `If-Modified-Since`.
+        session (AsyncSession): The `AsyncSession` object used to interact with the database.
+
+    Returns:
+        CachedEntity: The tag serialised as `TagBase`, or a 404 error if not found.
+    """
+
+    async def load() -> CachedEntity:
+        tag = await get_tag(tag_id, session)
+        return CachedEntity(serialize(TagBase, tag), entity_validators(tag))
+
+    async def revalidate() -> Optional[Validators]:
+        validators = await get_tag_validators(tag_id, session)
+        return validators if is_not_modified(request, validators) else None
+
+    return await tag_cache.get(
+        tag_id,
+        load,
+        revalidate if is_conditional(request) else None,
+        bypass=wrote_recently(request),
+    )
+
+
 async def create_tag(tag_data: TagCreate, session: AsyncSession) -> Tag:
-    """Create a new tag.
+    """Create a new tag and its outbox row with a single statement.
 
     Parameters:
         tag_data (TagCreate): The tag data to be created.
@@ -56,55 +168,132 @@ async def create_tag(tag_data: TagCreate, session: AsyncSession) -> Tag:
         Tag: The newly created `Tag` object.
     """
     try:
-        db_tag = Tag(**tag_data.model_dump())
-        session.add(db_tag)
+        inserted = (
+            insert(Tag).values(**tag_data.model_dump()).returning(Tag).cte("inserted")
+        )
+        query = select(aliased(Tag, inserted)).add_cte(
+            record_changes(("tag", "create", inserted.c.id)).cte("outbox")
+        )
+        response: Tag = await session.scalar(query)
         await session.commit()
-        await session.refresh(db_tag)
-        return db_tag
+        await invalidate_responses("tags")
+        return response
     except IntegrityError as exc:
         raise HTTPException(status_code=400, detail=f"Tag creation failed: {str(exc)}")
 
 
-async def update_tag(tag: Tag, tag_data: TagCreate, session: AsyncSession) -> Tag:
-    """Update an tag.
+def _bumped_posts(tag_id: int, *conditions: ColumnElement[bool]) -> CTE:
+    """Bump the versions of the posts with a tag if `conditions` hold, returning them."""
+    return (
+        update(Post)
+        .where(
+            Post.id.in_(select(PostTag.post_id).where(PostTag.tag_id == tag_id)),
+            *conditions,
+        )
+        .values(version=Post.version + 1)
+        .returning(Post.id)
+        .cte("bumped")
+    )
+
+
+async def update_tag(
+    tag_id: int,
+    tag_data: TagCreate | TagUpdate,
+    session: AsyncSession,
+    if_match: Optional[List[str]] = None,
+) -> Tag:
+    """Update a tag and add its outbox rows with a single statement.
+
+    The posts with the tag embed it, so their versions are bumped by the same
+    statement and recorded as updated, only if the tag matches `if_match`. A
+    failed update rolls both back with it.
 
     Parameters:
-        tag (Tag): The `Tag` object to be updated.
-        tag_data (TagCreate): The updated tag data.
+        tag_id (int): The ID of the tag to update.
+        tag_data (TagCreate | TagUpdate): The new tag data. Only the fields set in
+            a `TagUpdate` are changed.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
+        if_match (List[str], optional): Only update the tag if its ETag is one of
+            these. The check is part of the UPDATE, so no concurrent write can slip
+            in between.
 
     Returns:
-        Tag: The updated `Tag` object.
+        Tag: The updated `Tag` object, a 404 error if not found, or a 412 error if
+            its ETag did not match.
     """
+    values = tag_data.model_dump(exclude_unset=isinstance(tag_data, TagUpdate))
+    # An empty patch still checks the tag and its ETag, but changes nothing.
+    conditions = [Tag.id == tag_id]
+    if if_match is not None:
+        conditions.append(Tag.updated_at.in_(parse_timestamps(if_match)))
+    query = (
+        update(Tag)
+        .where(*conditions)
+        .values(**values or {"updated_at": Tag.updated_at})
+    )
+    if values:
+        # The posts are written before the tag is locked, so a tag that is
+        # missing or modified must stop them from being written at all.
+        bumped = _bumped_posts(tag_id, exists().where(*conditions))
+        updated = query.where(after_posts(bumped)).returning(Tag).cte("updated")
+        post_ids = select(func.array_agg(bumped.c.id)).scalar_subquery()
+        outbox = record_changes(
+            ("tag", "update", updated.c.id), ("post", "update", bumped.c.id)
+        ).cte("outbox")
+        query = select(aliased(Tag, updated), post_ids).add_cte(bumped, outbox)
+    else:
+        updated = query.returning(Tag).cte("updated")
+        query = select(aliased(Tag, updated), null())
     try:
-        query = (
-            update(Tag)
-            .where(Tag.id == tag.id)
-            .values(**tag_data.model_dump())
-            .returning(Tag)
-        )
-        result = await session.execute(query)
+        row = (await session.execute(query)).first()
+        if row is None:
+            raise await missing_or_modified(
+                session, Tag, tag_id, if_match, "Tag not found"
+            )
         await session.commit()
-        response: Tag = result.scalars().first()
-        return response
+        await tag_cache.invalidate(tag_id)
+        await post_cache.invalidate(*row[1] or ())
+        await invalidate_responses("tags", "posts")
+        return row[0]
     except IntegrityError as exc:
         raise HTTPException(status_code=400, detail=f"Tag update failed: {str(exc)}")
 
 
-async def delete_tag(tag: Tag, session: AsyncSession) -> str:
-    """Delete an tag.
+async def delete_tag(tag_id: int, session: AsyncSession) -> str:
+    """Delete a tag and add its outbox rows with a single statement.
 
     Parameters:
-        tag (Tag): The `Tag` object to be deleted.
+        tag_id (int): The ID of the tag to delete.
         session (AsyncSession): The `AsyncSession` object used to interact with the database.
 
     Returns:
-        str: A message indicating that the tag was deleted.
+        str: A message indicating that the tag was deleted, or a 404 error if not found.
     """
+    # The links go with ON DELETE CASCADE; the posts that embedded the tag
+    # change, so bump them in the same statement.
+    bumped = _bumped_posts(tag_id)
+    deleted = (
+        delete(Tag)
+        .where(Tag.id == tag_id, after_posts(bumped))
+        .returning(Tag.id)
+        .cte("deleted")
+    )
+    outbox = record_changes(
+        ("tag", "delete", deleted.c.id), ("post", "update", bumped.c.id)
+    ).cte("outbox")
+    query = (
+        select(select(func.array_agg(bumped.c.id)).scalar_subquery())
+        .select_from(deleted)
+        .add_cte(bumped, outbox)
+    )
     try:
-        query = delete(Tag).where(Tag.id == tag.id)
-        await session.execute(query)
+        row = (await session.execute(query)).first()
         await session.commit()
-        return f"Tag with id {tag.id} was deleted"
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Tag deletion failed: {str(exc)}")
+    if row is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    await tag_cache.invalidate(tag_id)
+    await post_cache.invalidate(*row[0] or ())
+    await invalidate_responses("tags", "posts")
+    return f"Tag with id {tag_id} was deleted"
@@ -1,8 +1,14 @@
 from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
 
-from src.redis import init_redis
+from src.database import log_pool_budget
+from src.limiter import RateLimiter, limiter
+from src.metrics import publisher
+from src.redis import close_redis
+from src.replicas import replica_router
+from src.changes.service import relay
+from src.posts.live import feed
+from src.posts.view_counts import view_counter
+from src.stats.service import refresher
 
 
 def rate_limit(times: int = 100, seconds: int = 60) -> RateLimiter:
@@ -17,12 +23,27 @@ def rate_limit(times: int = 100, seconds: int = 60) -> RateLimiter:
             Defaults to 60.
 
     Returns:
-        RateLimiter: The rate limit function.
+        RateLimiter: The rate limit function, enforced per worker and
+            reconciled across workers through Redis.
     """
     return RateLimiter(times=times, seconds=seconds)
 
 
 async def lifespan(app: FastAPI):
-    await init_redis()
+    log_pool_budget()
+    limiter.start()
+    publisher.start()
+    replica_router.start()
+    refresher.start()
+    view_counter.start()
+    relay.start()
+    feed.start()
     yield
-    await FastAPILimiter.close()
+    await feed.stop()
+    await relay.stop()
+    await view_counter.stop()
+    await refresher.stop()
+    await replica_router.stop()
+    await publisher.stop()
+    await limiter.stop()
+    await close_redis()
@@ -1,6 +1,9 @@
+import asyncio
+
 import pytest
 from httpx import AsyncClient
 from fastapi import status
+from sqlalchemy import func, select, update
 
 from src.authors.models import Author
 from .conftest import async_session_maker
@@ -61,3 +64,99 @@ async def test_delete_author(ac: AsyncClient):
 
     response = await ac.get("api/v1/authors/1")
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_authors_pagination(ac: AsyncClient):
+    async with async_session_maker() as session:
+        session.add_all(Author(**FAKE_AUTHOR) for _ in range(5))
+        await session.commit()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        response = await ac.get("api/v1/authors/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) <= 2
+        seen += [author["id"] for author in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen)) >= 5
+
+
+@pytest.mark.asyncio
+async def test_get_authors_pagination_validation(ac: AsyncClient):
+    response = await ac.get("api/v1/authors/", params={"limit": 10_000})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await ac.get("api/v1/authors/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_update_author_if_match(ac: AsyncClient):
+    author = await ac.post("api/v1/authors/", json=FAKE_AUTHOR)
+    url = f"api/v1/authors/{author.json()['id']}"
+    etag = (await ac.get(url)).headers["ETag"]
+
+    response = await ac.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    data = {"name": "Jane Doe", "email": "Jane@example.com"}
+    response = await ac.put(url, json=data, headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    response = await ac.put(url, json=data, headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    response = await ac.put(url, json=data, headers={"If-Match": "*"})
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_patch_author(ac: AsyncClient):
+    author = await ac.post("api/v1/authors/", json=FAKE_AUTHOR)
+    url = f"api/v1/authors/{author.json()['id']}"
+
+    response = await ac.patch(url, json={"name": "Patched"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {**author.json(), "name": "Patched"}
+    etag = response.headers["ETag"]
+
+    # An empty patch changes nothing, the ETag included.
+    response = await ac.patch(url, json={}, headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == etag
+    response = await ac.patch(url, json={"name": "Stale"}, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    for method in ("put", "patch"):
+        response = await ac.request(method, "api/v1/authors/0", json=FAKE_AUTHOR)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = await ac.request(
+        "patch", "api/v1/authors/0", json={}, headers={"If-Match": etag}
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = await ac.delete("api/v1/authors/0")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_updated_at_is_write_time(ac: AsyncClient):
+    author = await ac.post(
+        "api/v1/authors/", json={"name": "Slow", "email": "slow@example.com"}
+    )
+    async with async_session_maker() as session:
+        started = await session.scalar(select(func.now()))
+        await asyncio.sleep(0.05)
+        query = (
+            update(Author)
+            .where(Author.id == author.json()["id"])
+            .values(name="Slower")
+            .returning(Author.updated_at)
+        )
+        # Not the start of the transaction, which may commit after later writes.
+        assert (await session.scalar(query)) > started
+        await session.rollback()
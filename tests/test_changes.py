@@ -0,0 +1,135 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+from sqlalchemy import func, literal, select
+
+from src.changes.models import OutboxEntry
+from src.changes.service import STREAM_KEY, OutboxRelay, record_changes
+from src.redis import redis
+from .conftest import async_session_maker
+
+
+async def last_offset() -> Optional[str]:
+    """The offset of the last change, once the writes of earlier tests are published."""
+    for _ in range(50):
+        async with async_session_maker() as session:
+            if not await session.scalar(select(func.count()).select_from(OutboxEntry)):
+                break
+        await asyncio.sleep(0.1)
+    last = await redis.xrevrange(STREAM_KEY, count=1)
+    return last[0][0] if last else None
+
+
+async def read_changes(
+    ac: AsyncClient, since: Optional[str], expected: int
+) -> List[Tuple[str, int, str]]:
+    """Wait for the relay running with the app to publish `expected` changes."""
+    changes = []
+    for _ in range(50):
+        params = {} if since is None else {"since": since}
+        response = await ac.get("api/v1/changes/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        changes += page["changes"]
+        since = page["next"]
+        if len(changes) >= expected:
+            break
+        await asyncio.sleep(0.1)
+    return [
+        (change["entity"], change["entity_id"], change["operation"])
+        for change in changes
+    ]
+
+
+@pytest.mark.asyncio
+async def test_changes(ac: AsyncClient):
+    since = await last_offset()
+    author = await ac.post(
+        "api/v1/authors/", json={"name": "Changes", "email": "changes@example.com"}
+    )
+    author_id = author.json()["id"]
+    url = f"api/v1/authors/{author_id}"
+    # A rejected write and an empty patch record nothing.
+    response = await ac.patch(url, json={"name": "Stale"}, headers={"If-Match": '"0"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    await ac.patch(url, json={})
+    await ac.patch(url, json={"name": "Changed"})
+    tag = await ac.post("api/v1/tags/", json={"name": "changes"})
+    tag_id = tag.json()["id"]
+    post = await ac.post(
+        "api/v1/posts/",
+        json={
+            "title": "Changes",
+            "content": "Text",
+            "author_id": author_id,
+            "tags": [tag_id],
+        },
+    )
+    post_id = post.json()["id"]
+    # The posts that embed a tag or an author change with them.
+    await ac.delete(f"api/v1/tags/{tag_id}")
+    await ac.delete(url)
+    await ac.delete(f"api/v1/posts/{post_id}")
+
+    assert await read_changes(ac, since, 9) == [
+        ("author", author_id, "create"),
+        ("author", author_id, "update"),
+        ("tag", tag_id, "create"),
+        ("post", post_id, "create"),
+        ("tag", tag_id, "delete"),
+        ("post", post_id, "update"),
+        ("author", author_id, "delete"),
+        ("post", post_id, "update"),
+        ("post", post_id, "delete"),
+    ]
+
+    params = {"limit": 2} if since is None else {"since": since, "limit": 2}
+    response = await ac.get("api/v1/changes/", params=params)
+    page = response.json()
+    assert len(page["changes"]) == 2
+    assert page["next"] == page["changes"][1]["offset"]
+    response = await ac.get("api/v1/changes/", params={"since": page["next"]})
+    assert response.json()["changes"][0]["operation"] == "create"
+    assert response.json()["changes"][0]["entity"] == "tag"
+
+    response = await ac.get("api/v1/changes/", params={"since": "latest"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    # Older than every change kept: those after it may have been trimmed.
+    response = await ac.get("api/v1/changes/", params={"since": "0-1"})
+    assert response.status_code == status.HTTP_410_GONE
+
+
+@pytest.mark.asyncio
+async def test_changes_in_commit_order(ac: AsyncClient):
+    since = await last_offset()
+    async with async_session_maker() as session:
+        # An older transaction holds a lower outbox ID until it commits.
+        await session.execute(record_changes(("tag", "update", literal(-1))))
+        author = await ac.post(
+            "api/v1/authors/", json={"name": "Later", "email": "later@example.com"}
+        )
+        author_id = author.json()["id"]
+        await asyncio.sleep(1)
+        assert await read_changes(ac, since, 0) == []
+        await session.commit()
+
+    assert await read_changes(ac, since, 2) == [
+        ("tag", -1, "update"),
+        ("author", author_id, "create"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_change_consumer_groups():
+    relay = OutboxRelay(groups=["test-indexer"])
+    try:
+        await relay.create_groups()
+        # Existing groups are kept as they are.
+        await relay.create_groups()
+        groups = await redis.xinfo_groups(STREAM_KEY)
+        assert "test-indexer" in [group["name"] for group in groups]
+    finally:
+        await redis.xgroup_destroy(STREAM_KEY, "test-indexer")
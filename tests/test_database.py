@@ -0,0 +1,55 @@
+import pytest
+
+from src.config import settings
+from src.database import engine_options, pool_budget
+
+
+@pytest.mark.parametrize(
+    "overrides, expected",
+    [
+        ({}, (5, 10)),
+        ({"db_pool_size": 20, "db_max_overflow": 0}, (20, 0)),
+        ({"db_connection_budget": 100, "web_concurrency": 9}, (9, 2)),
+        (
+            {"db_connection_budget": 100, "web_concurrency": 9, "db_pool_size": 20},
+            (11, 0),
+        ),
+        (
+            {
+                "db_connection_budget": 100,
+                "web_concurrency": 9,
+                "db_pool_size": 5,
+                "db_max_overflow": 10,
+            },
+            (5, 6),
+        ),
+        ({"db_connection_budget": 9, "web_concurrency": 9}, (1, 0)),
+    ],
+)
+def test_pool_budget(overrides: dict, expected: tuple):
+    budget = pool_budget(settings.model_copy(update=overrides))
+    assert (budget.pool_size, budget.max_overflow) == expected
+    if "db_connection_budget" in overrides:
+        share = overrides["db_connection_budget"] // overrides["web_concurrency"]
+        assert budget.per_worker <= share
+        assert budget.total <= overrides["db_connection_budget"]
+
+
+def test_pool_budget_below_workers():
+    # One connection each would open more than the budget allows.
+    too_small = settings.model_copy(
+        update={"db_connection_budget": 4, "web_concurrency": 9}
+    )
+    with pytest.raises(ValueError, match="WEB_CONCURRENCY"):
+        pool_budget(too_small)
+
+
+def test_engine_options_pgbouncer():
+    pgbouncer = settings.model_copy(update={"db_pgbouncer": True})
+    options = engine_options(pgbouncer, pool_budget(pgbouncer))
+    connect_args = options["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    name = connect_args["prepared_statement_name_func"]
+    assert name() != name()
+    assert "connect_args" not in engine_options(settings, pool_budget(settings))
@@ -0,0 +1,204 @@
+import asyncio
+from typing import List, Optional
+
+import orjson
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+from src.posts.live import PostFeed, feed
+
+
+class FakeSocket:
+    """An accepted socket, whose client never takes a message if `stalled`."""
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.received: List[dict] = []
+        self.close_code: Optional[int] = None
+        self.disconnected = asyncio.Event()
+
+    async def send_text(self, data: str) -> None:
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.received.append(orjson.loads(data))
+
+    async def receive(self) -> dict:
+        await self.disconnected.wait()
+        return {"type": "websocket.disconnect"}
+
+    async def close(self, code: int) -> None:
+        self.close_code = code
+
+
+def message(post_id: int, category_id: Optional[int] = None, tags=()) -> str:
+    post = {
+        "id": post_id,
+        "title": "Live",
+        "content": "Text",
+        "author_id": None,
+        "category_id": category_id,
+        "tags": [{"id": tag_id, "name": f"tag-{tag_id}"} for tag_id in tags],
+    }
+    return orjson.dumps({"event": "create", "post": post}).decode()
+
+
+async def wait_for(condition) -> None:
+    for _ in range(50):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_live_feed(ac: AsyncClient):
+    category = await ac.post("api/v1/categories/", json={"name": "Live"})
+    category_id = category.json()["id"]
+    tag = await ac.post("api/v1/tags/", json={"name": "live"})
+    tag_id = tag.json()["id"]
+    everything, in_category, with_tag = FakeSocket(), FakeSocket(), FakeSocket()
+    serving = [
+        asyncio.create_task(feed.serve(everything, set(), set())),
+        asyncio.create_task(feed.serve(in_category, {category_id}, set())),
+        # Subscribed to both, but sent each post once.
+        asyncio.create_task(feed.serve(with_tag, {category_id}, {tag_id})),
+    ]
+    await asyncio.sleep(0)
+
+    first = await ac.post(
+        "api/v1/posts/",
+        json={"title": "Live", "content": "Text", "category_id": category_id},
+    )
+    second = await ac.post(
+        "api/v1/posts/", json={"title": "Live", "content": "Text", "tags": [tag_id]}
+    )
+    url = f"api/v1/posts/{second.json()['id']}"
+    await ac.patch(url, json={"title": "Updated"})
+    # An empty patch changes nothing, so nothing is published.
+    await ac.patch(url, json={})
+    await ac.delete(url)
+    await wait_for(lambda: len(everything.received) >= 4)
+
+    assert [(m["event"], m["post"]["title"]) for m in everything.received] == [
+        ("create", "Live"),
+        ("create", "Live"),
+        ("update", "Updated"),
+        ("delete", "Updated"),
+    ]
+    assert everything.received[0]["post"] == first.json()
+    assert [m["post"]["id"] for m in in_category.received] == [first.json()["id"]]
+    assert with_tag.received == everything.received
+    # The deleted post keeps the tags it had.
+    assert with_tag.received[-1]["post"]["tags"] == [{"id": tag_id, "name": "live"}]
+
+    for socket in (everything, in_category, with_tag):
+        socket.disconnected.set()
+    await asyncio.gather(*serving)
+    assert not (feed.everything or feed.by_category or feed.by_tag)
+    assert everything.close_code is None
+
+
+@pytest.mark.asyncio
+async def test_live_feed_of_posts_leaving(ac: AsyncClient):
+    category = await ac.post("api/v1/categories/", json={"name": "Left"})
+    category_id = category.json()["id"]
+    tag = await ac.post("api/v1/tags/", json={"name": "left"})
+    tag_id = tag.json()["id"]
+    in_category, with_tag = FakeSocket(), FakeSocket()
+    serving = [
+        asyncio.create_task(feed.serve(in_category, {category_id}, set())),
+        asyncio.create_task(feed.serve(with_tag, set(), {tag_id})),
+    ]
+    await asyncio.sleep(0)
+
+    post = await ac.post(
+        "api/v1/posts/",
+        json={
+            "title": "Leaving",
+            "content": "Text",
+            "category_id": category_id,
+            "tags": [tag_id],
+        },
+    )
+    url = f"api/v1/posts/{post.json()['id']}"
+    # The subscribers of what the post leaves see it go, then no longer follow it.
+    await ac.patch(url, json={"category_id": None, "tags": []})
+    await ac.patch(url, json={"title": "Gone"})
+    await ac.post("api/v1/posts/", json={"title": "Last", "content": "Text"})
+    await ac.post(
+        "api/v1/posts/",
+        json={"title": "Last", "content": "Text", "category_id": category_id},
+    )
+    await ac.post(
+        "api/v1/posts/", json={"title": "Last", "content": "Text", "tags": [tag_id]}
+    )
+    await wait_for(lambda: len(in_category.received) >= 3)
+    await wait_for(lambda: len(with_tag.received) >= 3)
+
+    for socket in (in_category, with_tag):
+        assert [(m["event"], m["post"]["title"]) for m in socket.received] == [
+            ("create", "Leaving"),
+            ("update", "Leaving"),
+            ("create", "Last"),
+        ]
+        left = socket.received[1]
+        assert (left["post"]["category_id"], left["post"]["tags"]) == (None, [])
+        assert left["previous_category_id"] == category_id
+        assert left["previous_tag_ids"] == [tag_id]
+
+    for socket in (in_category, with_tag):
+        socket.disconnected.set()
+    await asyncio.gather(*serving)
+
+
+@pytest.mark.asyncio
+async def test_live_feed_of_bulk_posts(ac: AsyncClient):
+    tag = await ac.post("api/v1/tags/", json={"name": "live-bulk"})
+    tag_id = tag.json()["id"]
+    with_tag = FakeSocket()
+    serving = asyncio.create_task(feed.serve(with_tag, set(), {tag_id}))
+    await asyncio.sleep(0)
+
+    posts = [
+        {"title": "Bulk", "content": "Text", "tags": [tag_id, tag_id]},
+        {"title": "Bulk", "content": "Text", "category_id": -1, "tags": [tag_id]},
+        {"title": "Other", "content": "Text"},
+        {"title": "Bulk", "content": "Text", "tags": [tag_id]},
+    ]
+    response = await ac.post("api/v1/posts/bulk", json=posts)
+    ids = response.json()["ids"]
+    await wait_for(lambda: len(with_tag.received) >= 2)
+
+    # The skipped post is not published, the others are as `GET` returns them.
+    assert [m["post"]["id"] for m in with_tag.received] == [ids[0], ids[3]]
+    assert all(m["event"] == "create" for m in with_tag.received)
+    post = await ac.get(f"api/v1/posts/{ids[0]}")
+    assert with_tag.received[0]["post"] == post.json()
+
+    with_tag.disconnected.set()
+    await serving
+
+
+@pytest.mark.asyncio
+async def test_live_feed_drops_slow_consumers():
+    live = PostFeed(queue_size=2)
+    slow, fast = FakeSocket(stalled=True), FakeSocket()
+    serving = asyncio.gather(
+        live.serve(slow, set(), set()), live.serve(fast, set(), {1})
+    )
+    await asyncio.sleep(0.01)
+    # The slow socket is stuck sending the first message, with two more queued.
+    for post_id in range(3):
+        assert live.dispatch(message(post_id, tags=[1])) == 2
+        await asyncio.sleep(0.01)
+    assert live.dispatch(message(3, tags=[1])) == 1
+    await wait_for(lambda: slow.close_code is not None)
+    assert slow.close_code == status.WS_1013_TRY_AGAIN_LATER
+    assert live.dispatch(message(4, tags=[1])) == 1
+    await wait_for(lambda: len(fast.received) == 5)
+    assert [m["post"]["id"] for m in fast.received] == [0, 1, 2, 3, 4]
+    assert live.dispatch("not json") == 0
+
+    await live.stop()
+    await serving
+    assert fast.close_code == status.WS_1001_GOING_AWAY
@@ -0,0 +1,166 @@
+import os
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+from prometheus_client import CollectorRegistry, Histogram, generate_latest
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.metrics import BufferedHistogram, RequestStats
+from .conftest import QueryBudget
+from .test_post import create_references
+
+
+def samples(text: str) -> dict:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+@pytest.mark.asyncio
+async def test_metrics(ac: AsyncClient):
+    refs = await create_references(ac, tags=0)
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Measured", "content": "Text", **refs}
+    )
+    before = samples((await ac.get("/metrics")).text)
+    await ac.get(f"api/v1/posts/{post.json()['id']}")
+    await ac.get("api/v1/posts/0")
+    response = await ac.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    after = samples(response.text)
+
+    def delta(name: str, **labels) -> float:
+        key = (name, tuple(sorted(labels.items())))
+        return after.get(key, 0) - before.get(key, 0)
+
+    route = "/api/v1/posts/{post_id}"
+    labels = {"method": "GET", "route": route}
+    assert delta("http_request_duration_seconds_count", **labels, status="200") == 1
+    assert delta("http_request_duration_seconds_count", **labels, status="404") == 1
+    assert delta("http_request_db_queries_count", route=route) == 2
+    assert delta("http_request_db_queries_sum", route=route) >= 2
+    assert ("rate_limit_rejections_total", ()) in after
+    assert delta("redis_command_duration_seconds_count", client="cache") >= 2
+
+
+@pytest.mark.asyncio
+async def test_cache_metrics(ac: AsyncClient):
+    refs = await create_references(ac, tags=0)
+    url = f"api/v1/authors/{refs['author_id']}"
+    before = samples((await ac.get("/metrics")).text)
+    for _ in range(3):
+        await ac.get(url)
+    after = samples((await ac.get("/metrics")).text)
+
+    def delta(result: str) -> float:
+        key = ("cache_lookups_total", (("cache", "authors"), ("result", result)))
+        return after.get(key, 0) - before.get(key, 0)
+
+    assert (delta("miss"), delta("hit")) == (1, 2)
+
+
+@pytest.mark.asyncio
+@pytest.mark.query_budget(2)
+async def test_server_timing(ac: AsyncClient):
+    refs = await create_references(ac, tags=0)
+    response = await ac.get(f"api/v1/authors/{refs['author_id']}")
+    assert response.status_code == status.HTTP_200_OK
+    db, redis, app = response.headers["Server-Timing"].split(", ")
+    assert db.startswith("db;dur=") and db.endswith(';desc="1 queries"')
+    # The author was looked up in the cache, and stored there on the miss.
+    assert redis.startswith("redis;dur=") and not redis.endswith(';desc="0 calls"')
+    assert app.startswith("app;dur=")
+
+
+def test_buffered_histogram():
+    # Fails if an upgrade of prometheus_client moves the private buckets and
+    # sum that `BufferedHistogram` writes.
+    metric = Histogram(
+        "buffered", "Buffered.", ["route"], buckets=(1, 2), registry=CollectorRegistry()
+    )
+    histogram = BufferedHistogram(metric.labels("/"))
+    for amount in (0.5, 1.5, 1.5, 3):
+        histogram.observe(amount)
+    route = (("route", "/"),)
+    assert samples(generate_latest(metric).decode())[("buffered_count", route)] == 0
+    histogram.flush()
+    histogram.flush()
+    written = samples(generate_latest(metric).decode())
+    written.pop(("buffered_created", route))
+    assert written == {
+        **{
+            ("buffered_bucket", (("le", le), *route)): count
+            for le, count in (("1.0", 1), ("2.0", 3), ("+Inf", 4))
+        },
+        ("buffered_count", route): 4,
+        ("buffered_sum", route): 6.5,
+    }
+
+
+def test_query_budget():
+    scope = {"method": "GET", "path": "/api/v1/posts/"}
+    budget = QueryBudget(3, repeats=2)
+    budget(scope, RequestStats(queries=3, statements=Counter({"SELECT 1": 1})))
+    assert budget.violations == []
+
+    statements = Counter(
+        {
+            "SELECT tags.id FROM tags WHERE tags.id IN ($1)": 1,
+            "SELECT tags.id FROM tags WHERE tags.id IN ($1, $2)": 1,
+        }
+    )
+    budget(scope, RequestStats(queries=4, statements=statements))
+    assert len(budget.violations) == 2
+    assert "ran 4 queries, over a budget of 3" in budget.violations[0]
+    assert "same statement 2 times" in budget.violations[1]
+
+
+# Loads the Gunicorn config like the master does, then forks a worker that
+# imports the metrics and records a request, as workers do after the fork.
+FORKED_WORKER = """
+import os, runpy, types
+
+config = runpy.run_path("gunicorn.conf.py")
+config["on_starting"](None)
+pid = os.fork()
+if pid == 0:
+    from src.metrics import REQUEST_DURATION
+
+    REQUEST_DURATION.labels("GET", "/forked", "200").observe(0.1)
+    os._exit(0)
+os.waitpid(pid, 0)
+config["child_exit"](None, types.SimpleNamespace(pid=pid))
+
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+
+registry = CollectorRegistry()
+multiprocess.MultiProcessCollector(registry)
+print(generate_latest(registry).decode())
+"""
+
+
+def test_metrics_of_forked_workers():
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if name != "PROMETHEUS_MULTIPROC_DIR"
+    }
+    root = Path(__file__).parent.parent
+    output = subprocess.run(
+        [sys.executable, "-c", FORKED_WORKER],
+        cwd=root,
+        env={**env, "PYTHONPATH": str(root)},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    labels = (("method", "GET"), ("route", "/forked"), ("status", "200"))
+    assert samples(output)[("http_request_duration_seconds_count", labels)] == 1
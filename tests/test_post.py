@@ -0,0 +1,747 @@
+import asyncio
+from typing import List
+
+import orjson
+import pytest
+from unittest.mock import AsyncMock
+from httpx import AsyncClient
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+
+from src.config import settings
+from src.pagination import Pagination, apply_keyset, encode_cursor
+from src.posts.models import EXCERPT_LENGTH, VIEWS_ONLY_SETTING, Post
+from src.posts.schemas import PostBase, PostSort
+from src import response_cache
+from src.posts import view_counts
+from src.posts.service import encode_posts, get_post_rows, get_posts, posts_query
+from src.posts.view_counts import (
+    FLUSHING_KEY,
+    PENDING_KEY,
+    SEEDED_KEY,
+    TOP_KEY,
+    view_counter,
+)
+from src.redis import cache_redis, redis
+from src.tags.schemas import TagUpdate
+from src.tags.service import update_tag
+from scripts.bulk_import import chunked, read_records
+from scripts.repair_post_counts import repair_post_counts
+from .conftest import DATABASE_URL, async_session_maker, engine
+
+
+async def create_references(ac: AsyncClient, tags: int = 2) -> dict:
+    author = await ac.post(
+        "api/v1/authors/", json={"name": "Post Author", "email": "post@example.com"}
+    )
+    category = await ac.post("api/v1/categories/", json={"name": "News"})
+    tag_ids = [
+        (await ac.post("api/v1/tags/", json={"name": f"tag-{i}"})).json()["id"]
+        for i in range(tags)
+    ]
+    return {
+        "author_id": author.json()["id"],
+        "category_id": category.json()["id"],
+        "tags": tag_ids,
+    }
+
+
+@pytest.mark.asyncio
+async def test_export_posts(ac: AsyncClient):
+    refs = await create_references(ac)
+    for i in range(3):
+        response = await ac.post(
+            "api/v1/posts/", json={"title": f"Post {i}", "content": "Text", **refs}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    response = await ac.get(
+        "api/v1/posts/export.ndjson", params={"author_id": refs["author_id"]}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [row["title"] for row in rows] == ["Post 0", "Post 1", "Post 2"]
+    assert all(row["tags"] == sorted(refs["tags"]) for row in rows)
+    assert all(row["category_id"] == refs["category_id"] for row in rows)
+
+    response = await ac.get("api/v1/posts/export.ndjson", params={"author_id": -1})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b""
+
+
+@pytest.mark.asyncio
+async def test_get_post_cache(ac: AsyncClient):
+    refs = await create_references(ac, tags=1)
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Cached", "content": "Text", **refs}
+    )
+    url = f"api/v1/posts/{post.json()['id']}"
+
+    response = await ac.get(url)
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json() == post.json()
+    response = await ac.get(url)
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.json() == post.json()
+
+    await ac.put(url, json={"title": "Updated", "content": "Text", **refs})
+    response = await ac.get(url)
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()["title"] == "Updated"
+
+    await ac.put(f"api/v1/tags/{refs['tags'][0]}", json={"name": "renamed"})
+    response = await ac.get(url)
+    assert response.json()["tags"][0]["name"] == "renamed"
+
+    await ac.delete(f"api/v1/authors/{refs['author_id']}")
+    response = await ac.get(url)
+    assert response.json()["author_id"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_post_cache_unavailable(ac: AsyncClient, monkeypatch):
+    refs = await create_references(ac, tags=0)
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Uncached", "content": "Text", **refs}
+    )
+
+    async def unavailable(*args, **kwargs):
+        raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(cache_redis, "get", unavailable)
+    response = await ac.get(f"api/v1/posts/{post.json()['id']}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json() == post.json()
+    response = await ac.get("api/v1/posts/0")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_post_conditional(ac: AsyncClient):
+    refs = await create_references(ac, tags=1)
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Versioned", "content": "Text", **refs}
+    )
+    url = f"api/v1/posts/{post.json()['id']}"
+
+    response = await ac.get(url)
+    assert response.headers["ETag"] == '"1"'
+    last_modified = response.headers["Last-Modified"]
+    response = await ac.get(url, headers={"If-None-Match": '"1"'})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.content == b""
+    response = await ac.get(url, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Answered from the version alone on a miss.
+    await cache_redis.delete(f"cache:posts:{post.json()['id']}")
+    response = await ac.get(url, headers={"If-None-Match": 'W/"1"'})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.headers["ETag"] == '"1"'
+
+    data = {"title": "Updated", "content": "Text", **refs}
+    response = await ac.put(url, json=data, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"2"'
+    response = await ac.put(url, json=data, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    response = await ac.get(url, headers={"If-None-Match": '"1"'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Updated"
+
+    # Writes to the embedded tag and the author change the post too.
+    await ac.put(f"api/v1/tags/{refs['tags'][0]}", json={"name": "renamed"})
+    response = await ac.get(url, headers={"If-None-Match": '"2"'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"3"'
+    await ac.delete(f"api/v1/authors/{refs['author_id']}")
+    response = await ac.get(url, headers={"If-None-Match": '"3"'})
+    assert response.headers["ETag"] == '"4"'
+    assert response.json()["author_id"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_posts_conditional(ac: AsyncClient):
+    refs = await create_references(ac, tags=1)
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Listed", "content": "Text", **refs}
+    )
+    params = {"category_id": refs["category_id"], "sort": "-title"}
+
+    response = await ac.get("api/v1/posts/", params=params)
+    etag = response.headers["ETag"]
+    response = await ac.get(
+        "api/v1/posts/", params=params, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["ETag"] == etag
+
+    await ac.put(
+        f"api/v1/posts/{post.json()['id']}",
+        json={"title": "Relisted", "content": "Text", **refs},
+    )
+    response = await ac.get(
+        "api/v1/posts/", params=params, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["title"] == "Relisted"
+
+
+@pytest.mark.asyncio
+async def test_get_posts_response_cache(ac: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "response_cache_enabled", True)
+    refs = await create_references(ac, tags=1)
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Hot", "content": "Text " * 50, **refs}
+    )
+    params = {"tag_id": refs["tags"][0], "limit": 5}
+
+    response = await ac.get("api/v1/posts/", params=params)
+    assert response.headers["X-Cache"] == "MISS"
+    body, etag = response.content, response.headers["ETag"]
+
+    # Parameter order does not matter.
+    url = f"api/v1/posts/?limit=5&tag_id={refs['tags'][0]}"
+    response = await ac.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == etag
+    assert response.content == body
+    response = await ac.get(url, headers={"Accept-Encoding": "identity"})
+    assert response.headers["X-Cache"] == "HIT"
+    assert "Content-Encoding" not in response.headers
+    assert response.content == body
+    response = await ac.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    # A hit in the memory of the worker does not go to Redis.
+    with monkeypatch.context() as patch:
+        patch.setattr(response_cache, "cache_redis", None)
+        patch.setattr(response_cache, "generation_script", None)
+        response = await ac.get(url)
+    assert response.headers["X-Cache"] == "HIT"
+
+    await ac.put(f"api/v1/tags/{refs['tags'][0]}", json={"name": "hot"})
+    response = await ac.get(url)
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()[0]["tags"][0]["name"] == "hot"
+    await ac.delete(f"api/v1/posts/{post.json()['id']}")
+    response = await ac.get(url)
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort", [PostSort.id_desc, PostSort.title_desc])
+async def test_get_posts_fast_path_matches_orm(ac: AsyncClient, sort: PostSort):
+    refs = await create_references(ac, tags=3)
+    data = [
+        {"title": "Plain", "content": "Text", **refs, "tags": refs["tags"][::-1]},
+        {"title": "Ünïcode ✓", "content": 'Quotes " and \\ \n', **refs, "tags": []},
+        {
+            "title": "Orphan",
+            "content": "Text",
+            "author_id": None,
+            "category_id": None,
+            "tags": refs["tags"][:1],
+        },
+    ]
+    response = await ac.post("api/v1/posts/bulk", json=data)
+    assert response.status_code == status.HTTP_200_OK
+    # Sorted by `-id`, the page holds exactly the posts above.
+    pagination = Pagination(limit=3)
+
+    async with async_session_maker() as session:
+        page = await get_posts(session, pagination, tag_id=None, sort=sort)
+        validated = TypeAdapter(List[PostBase]).validate_python(
+            page.items, from_attributes=True
+        )
+        expected = ORJSONResponse(jsonable_encoder(validated)).body
+        rows = await get_post_rows(session, pagination, sort=sort)
+    assert encode_posts(rows.items) == expected
+    assert rows.next_cursor == page.next_cursor
+
+    response = await ac.get("api/v1/posts/", params={"limit": 3, "sort": sort.value})
+    assert response.content == expected
+    assert response.headers.get("X-Next-Cursor") == page.next_cursor
+
+
+@pytest.mark.asyncio
+async def test_get_posts_fields(ac: AsyncClient):
+    refs = await create_references(ac, tags=1)
+    content = "Long " * 100
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Sparse", "content": content, **refs}
+    )
+    post_id = post.json()["id"]
+    params = {"author_id": refs["author_id"]}
+    tags = [{"name": "tag-0", "id": refs["tags"][0]}]
+
+    response = await ac.get("api/v1/posts/", params={**params, "fields": "tags,title"})
+    assert response.json() == [{"title": "Sparse", "tags": tags, "id": post_id}]
+    response = await ac.get(f"api/v1/posts/{post_id}", params={"fields": "author_id"})
+    assert response.json() == {"author_id": refs["author_id"], "id": post_id}
+    assert response.headers["ETag"] == '"1"'
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await ac.get("api/v1/posts/", params={**params, "view": "summary"})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    summary = {
+        "title": "Sparse",
+        "author_id": refs["author_id"],
+        "category_id": refs["category_id"],
+        "tags": tags,
+        "id": post_id,
+        "excerpt": content[:EXCERPT_LENGTH],
+    }
+    assert response.json() == [summary]
+    # The content is only ever read through the excerpt.
+    sql = " ".join(statements)
+    assert "substr(posts.content" in sql
+    assert "posts.content" not in sql.replace("substr(posts.content", "")
+    response = await ac.get(f"api/v1/posts/{post_id}", params={"view": "summary"})
+    assert response.json() == summary
+
+    response = await ac.get("api/v1/posts/", params={"fields": "title,secret"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Unknown fields: secret"
+
+
+@pytest.mark.asyncio
+async def test_create_post_missing_references(ac: AsyncClient):
+    refs = await create_references(ac, tags=2)
+    response = await ac.post(
+        "api/v1/posts/",
+        json={
+            "title": "Broken",
+            "content": "Text",
+            "author_id": refs["author_id"],
+            "category_id": -1,
+            "tags": [refs["tags"][0], -2, -3],
+        },
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"]["missing"] == {"category_id": -1, "tags": [-2, -3]}
+
+    response = await ac.post(
+        "api/v1/posts/",
+        json={"title": "Orphan", "content": "Text", "tags": refs["tags"][::-1]},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["author_id"] is None
+    assert {tag["id"] for tag in response.json()["tags"]} == set(refs["tags"])
+
+
+@pytest.mark.asyncio
+async def test_create_posts_bulk(ac: AsyncClient):
+    refs = await create_references(ac, tags=3)
+    posts = [
+        {"title": f"Bulk {i}", "content": "Text", **refs, "tags": refs["tags"][:i]}
+        for i in range(4)
+    ]
+    posts.insert(2, {"title": "Bad", "content": "Text", "author_id": -1, "tags": [-5]})
+
+    response = await ac.post("api/v1/posts/bulk", json=posts, params={"atomic": True})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"]["errors"] == [
+        {"index": 2, "missing": {"author_id": -1, "tags": [-5]}}
+    ]
+
+    response = await ac.post("api/v1/posts/bulk", json=posts)
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["ids"][2] is None
+    assert [error["index"] for error in result["errors"]] == [2]
+
+    for i, post_id in enumerate(result["ids"][:2] + result["ids"][3:]):
+        post = (await ac.get(f"api/v1/posts/{post_id}")).json()
+        assert post["title"] == f"Bulk {i}"
+        assert sorted(tag["id"] for tag in post["tags"]) == refs["tags"][:i]
+
+
+@pytest.mark.asyncio
+async def test_search_posts(ac: AsyncClient):
+    refs = await create_references(ac, tags=0)
+    posts = [
+        {"title": "Gardening notes", "content": "All about zucchini harvests."},
+        {"title": "Zucchini recipes", "content": "Grilled zucchini with garlic."},
+        {"title": "Cooking", "content": "Nothing about squash here."},
+    ]
+    for post in posts:
+        await ac.post("api/v1/posts/", json={**post, **refs})
+
+    response = await ac.get("api/v1/posts/search", params={"q": "zucchini"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [post["title"] for post in response.json()] == [
+        "Zucchini recipes",
+        "Gardening notes",
+    ]
+    assert response.json()[0]["snippet"] is None
+
+    response = await ac.get(
+        "api/v1/posts/search", params={"q": "zucchini", "limit": 1, "highlight": True}
+    )
+    assert response.json()[0]["title"] == "Zucchini recipes"
+    assert "<mark>zucchini</mark>" in response.json()[0]["snippet"]
+    response = await ac.get(
+        "api/v1/posts/search",
+        params={"q": "zucchini", "cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert [post["title"] for post in response.json()] == ["Gardening notes"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_get_posts_filters(ac: AsyncClient):
+    refs = await create_references(ac, tags=2)
+    other = await create_references(ac, tags=0)
+    for title, tags in [("b", refs["tags"]), ("a", refs["tags"][:1]), ("c", [])]:
+        await ac.post(
+            "api/v1/posts/",
+            json={"title": title, "content": "Text", **refs, "tags": tags},
+        )
+    await ac.post("api/v1/posts/", json={"title": "d", "content": "Text", **other})
+
+    response = await ac.get(
+        "api/v1/posts/", params={"author_id": refs["author_id"], "sort": "-title"}
+    )
+    assert [post["title"] for post in response.json()] == ["c", "b", "a"]
+
+    params = {"category_id": refs["category_id"], "sort": "title", "limit": 1}
+    response = await ac.get("api/v1/posts/", params=params)
+    assert [post["title"] for post in response.json()] == ["a"]
+    params["cursor"] = response.headers["X-Next-Cursor"]
+    response = await ac.get("api/v1/posts/", params=params)
+    assert [post["title"] for post in response.json()] == ["b"]
+
+    response = await ac.get("api/v1/posts/", params={"tag_id": refs["tags"][1]})
+    assert [post["title"] for post in response.json()] == ["b"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort", list(PostSort))
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"author_id": 1},
+        {"category_id": 1},
+        {"tag_id": 1},
+        {"author_id": 1, "category_id": 1, "tag_id": 1},
+    ],
+)
+@pytest.mark.parametrize("first_page", [True, False])
+async def test_get_posts_uses_indexes(filters: dict, sort: PostSort, first_page: bool):
+    query, keys, descending = posts_query(**filters, sort=sort)
+    cursor = None if first_page else encode_cursor(["m", 10][-len(keys) :])
+    query = apply_keyset(query, Pagination(limit=20, cursor=cursor), keys, descending)
+    sql = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+
+    async with async_session_maker() as session:
+        # The test tables are tiny, so rule out the plans that would only be
+        # chosen for them: the page must come from an index in sort order.
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        await session.execute(text("SET LOCAL enable_sort = off"))
+        plan = "\n".join((await session.execute(text(f"EXPLAIN {sql}"))).scalars())
+
+    assert "Seq Scan" not in plan, plan
+    assert "Sort" not in plan, plan
+
+
+@pytest.mark.asyncio
+@pytest.mark.query_budget(1)
+async def test_writes_single_statement(ac: AsyncClient):
+    refs = await create_references(ac, tags=3)
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Single", "content": "Text", **refs}
+    )
+    assert post.status_code == status.HTTP_200_OK
+    assert [tag["id"] for tag in post.json()["tags"]] == refs["tags"]
+    url = f"api/v1/posts/{post.json()['id']}"
+
+    data = {"title": "Replaced", "content": "Text", "tags": refs["tags"][1:]}
+    response = await ac.put(url, json=data)
+    assert response.headers["ETag"] == '"2"'
+    assert response.json() == {
+        **data,
+        "id": post.json()["id"],
+        "author_id": None,
+        "category_id": None,
+        "tags": post.json()["tags"][1:],
+    }
+    response = await ac.patch(
+        url, json={"title": "Patched"}, headers={"If-Match": '"2"'}
+    )
+    assert response.headers["ETag"] == '"3"'
+    assert response.json()["title"] == "Patched"
+    assert response.json()["tags"] == post.json()["tags"][1:]
+    response = await ac.patch(url, json={"tags": refs["tags"][:2]})
+    assert response.json()["tags"] == post.json()["tags"][:2]
+    assert response.json()["content"] == "Text"
+
+    response = await ac.patch(
+        f"api/v1/tags/{refs['tags'][0]}", json={"name": "renamed"}
+    )
+    assert response.json()["name"] == "renamed"
+    # An empty patch returns the post as it is.
+    response = await ac.patch(url, json={})
+    assert response.headers["ETag"] == '"5"'
+    assert response.json()["tags"][0]["name"] == "renamed"
+
+    response = await ac.delete(url)
+    assert response.status_code == status.HTTP_200_OK
+    response = await ac.delete(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_update_post_errors(ac: AsyncClient):
+    refs = await create_references(ac, tags=1)
+    data = {"title": "Post", "content": "Text", "tags": refs["tags"]}
+    post = await ac.post("api/v1/posts/", json=data)
+    url = f"api/v1/posts/{post.json()['id']}"
+
+    response = await ac.patch(
+        url, json={"category_id": -1, "tags": [-2, *refs["tags"]]}
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"]["missing"] == {"category_id": -1, "tags": [-2]}
+    response = await ac.patch(url, json={"title": "Stale"}, headers={"If-Match": '"0"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    response = await ac.put("api/v1/posts/0", json={"title": "Post", "content": "Text"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    # Nor does a rejected patch of its tag write the post, even before rolling back.
+    async with async_session_maker() as session:
+        with pytest.raises(HTTPException) as exc_info:
+            await update_tag(
+                refs["tags"][0], TagUpdate(name="stale"), session, if_match=['"0"']
+            )
+        assert exc_info.value.status_code == status.HTTP_412_PRECONDITION_FAILED
+        query = text("SELECT version FROM posts WHERE id = :id")
+        assert await session.scalar(query, {"id": post.json()["id"]}) == 1
+
+    response = await ac.get(url)
+    assert response.headers["ETag"] == '"1"'
+    assert response.json() == post.json()
+
+
+async def wrong_post_counts() -> list:
+    """The tags and categories whose stored post count is not their actual one."""
+    async with async_session_maker() as session:
+        result = await session.execute(
+            text(
+                "SELECT 'tags', id FROM tags WHERE post_count <> "
+                "(SELECT count(*) FROM post_tags WHERE tag_id = tags.id) "
+                "UNION ALL SELECT 'categories', id FROM categories WHERE post_count <> "
+                "(SELECT count(*) FROM posts WHERE category_id = categories.id)"
+            )
+        )
+        return result.all()
+
+
+@pytest.mark.asyncio
+async def test_post_counts(ac: AsyncClient):
+    refs = await create_references(ac, tags=3)
+    first, second, third = refs["tags"]
+    data = {"title": "Counted", "content": "Text", "category_id": refs["category_id"]}
+    post = await ac.post("api/v1/posts/", json={**data, "tags": [first, second]})
+    await ac.post("api/v1/posts/", json={**data, "tags": [first]})
+
+    async def counts() -> dict:
+        response = await ac.get("api/v1/tags/popular", params={"limit": 200})
+        assert response.status_code == status.HTTP_200_OK
+        popular = [(tag["post_count"], tag["id"]) for tag in response.json()]
+        assert popular == sorted(popular, reverse=True)
+        async with async_session_maker() as session:
+            category = await session.scalar(
+                text(
+                    f"SELECT post_count FROM categories WHERE id = {data['category_id']}"
+                )
+            )
+        mine = {id: count for count, id in popular if id in refs["tags"]}
+        return {"category": category, **mine}
+
+    assert await counts() == {"category": 2, first: 2, second: 1, third: 0}
+    url = f"api/v1/posts/{post.json()['id']}"
+    await ac.patch(url, json={"category_id": None, "tags": [second, third]})
+    assert await counts() == {"category": 1, first: 1, second: 1, third: 1}
+    await ac.delete(f"api/v1/tags/{second}")
+    await ac.delete(url)
+    assert await counts() == {"category": 1, first: 1, third: 0}
+    assert await wrong_post_counts() == []
+
+    response = await ac.get("api/v1/tags/popular", params={"limit": 1})
+    assert len(response.json()) == 1
+
+
+@pytest.mark.asyncio
+async def test_post_count_lock_order(ac: AsyncClient):
+    refs = await create_references(ac, tags=1)
+    tag_id, category_id = refs["tags"][0], refs["category_id"]
+    post = await ac.post(
+        "api/v1/posts/", json={"title": "Locked", "content": "Text", **refs}
+    )
+    post_id = post.json()["id"]
+
+    # A post write locks the post, then the tag and category it counts; tag and
+    # category writes must lock in the same order, or the two deadlock.
+    for write in (
+        lambda: ac.patch(f"api/v1/tags/{tag_id}", json={"name": "locked"}),
+        lambda: ac.delete(f"api/v1/tags/{tag_id}"),
+        lambda: ac.delete(f"api/v1/categories/{category_id}"),
+    ):
+        async with async_session_maker() as session:
+            await session.execute(
+                text(f"UPDATE posts SET title = 'Relocked' WHERE id = {post_id}")
+            )
+            waiting = asyncio.create_task(write())
+            await asyncio.sleep(0.2)
+            await session.execute(
+                text(
+                    f"WITH unlinked AS (DELETE FROM post_tags WHERE post_id = {post_id}) "
+                    f"UPDATE posts SET category_id = NULL WHERE id = {post_id}"
+                )
+            )
+            await session.rollback()
+        response = await waiting
+        assert response.status_code == status.HTTP_200_OK
+    assert await wrong_post_counts() == []
+
+
+@pytest.mark.asyncio
+async def test_repair_post_counts(ac: AsyncClient):
+    refs = await create_references(ac, tags=2)
+    await ac.post("api/v1/posts/", json={"title": "T", "content": "C", **refs})
+    async with async_session_maker() as session:
+        await session.execute(text("UPDATE tags SET post_count = post_count + 5"))
+        await session.execute(
+            text(
+                f"UPDATE categories SET post_count = 0 WHERE id = {refs['category_id']}"
+            )
+        )
+        await session.commit()
+    assert await wrong_post_counts() != []
+
+    dsn = DATABASE_URL.replace("+asyncpg", "")
+    repaired = await repair_post_counts(dsn, batch_size=2)
+    assert repaired["categories"] == 1 and repaired["tags"] >= 2
+    assert await wrong_post_counts() == []
+    assert await repair_post_counts(dsn) == {"tags": 0, "categories": 0}
+
+
+def test_bulk_import_csv(tmp_path):
+    path = tmp_path / "posts.csv"
+    path.write_bytes(
+        b"id,title,content,tags\r\n"
+        b'1,First,"Two\r\nlines","1,2"\r\n'
+        b"2,Second,Text,\r\n"
+    )
+    [(columns, rows, links)] = chunked(read_records(path), Post.__table__, 10)
+    assert columns == ["id", "title", "content"]
+    # Line endings in quoted values are kept as they are.
+    assert rows == [(1, "First", "Two\r\nlines"), (2, "Second", "Text")]
+    assert links == [(1, 1), (1, 2)]
+
+    path.write_text("id,title,content,tags\n1,First,Text,first\n")
+    with pytest.raises(SystemExit, match="posts: invalid record 1"):
+        list(chunked(read_records(path), Post.__table__, 10))
+
+
+async def flush_views() -> None:
+    """Write every view counted so far, whichever worker flushes them."""
+    await view_counts.send_views()
+    while await redis.exists(PENDING_KEY, FLUSHING_KEY):
+        await view_counter.flush()
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_view_counts(ac: AsyncClient, monkeypatch):
+    data = {"title": "Viewed", "content": "Text"}
+    first = (await ac.post("api/v1/posts/", json=data)).json()["id"]
+    second = (await ac.post("api/v1/posts/", json=data)).json()["id"]
+    etag = (await ac.get(f"api/v1/posts/{first}")).headers["ETag"]
+    await ac.get(f"api/v1/posts/{first}", params={"fields": "title"})
+    await ac.get(f"api/v1/posts/{second}")
+    await ac.get("api/v1/posts/0")
+    await flush_views()
+
+    # A flush that fails leaves its batch to the next one.
+    await ac.get(f"api/v1/posts/{first}", headers={"If-None-Match": etag})
+    await view_counts.send_views()
+    failing = AsyncMock(side_effect=OperationalError("UPDATE", {}, Exception()))
+    with monkeypatch.context() as patch:
+        patch.setattr(view_counts, "add_views", failing)
+        with pytest.raises(OperationalError):
+            await view_counter.flush()
+    assert await redis.hgetall(FLUSHING_KEY) == {str(first): "1"}
+    await ac.get(f"api/v1/posts/{second}")
+    await flush_views()
+
+    response = await ac.get("api/v1/posts/most-viewed", params={"limit": 200})
+    assert response.status_code == status.HTTP_200_OK
+    counts = {post["id"]: post["view_count"] for post in response.json()}
+    assert (counts[first], counts[second]) == (3, 2)
+    ranked = [post["id"] for post in response.json()]
+    assert ranked.index(first) < ranked.index(second)
+    # Views are not edits.
+    assert (await ac.get(f"api/v1/posts/{first}")).headers["ETag"] == etag
+
+    await ac.delete(f"api/v1/posts/{first}")
+    response = await ac.get("api/v1/posts/most-viewed", params={"limit": 200})
+    assert first not in [post["id"] for post in response.json()]
+
+    # The ranking is loaded again from the database if Redis loses it.
+    await redis.delete(TOP_KEY, SEEDED_KEY)
+    await view_counter.flush()
+    response = await ac.get("api/v1/posts/most-viewed", params={"limit": 200})
+    assert {post["id"]: post["view_count"] for post in response.json()}[second] == 2
+
+
+@pytest.mark.asyncio
+async def test_views_skip_post_counts(ac: AsyncClient):
+    category = await ac.post("api/v1/categories/", json={"name": "Viewed"})
+    category_id = category.json()["id"]
+    post = await ac.post("api/v1/posts/", json={"title": "Viewed", "content": "Text"})
+    async with async_session_maker() as session:
+        await session.execute(text(f"SET LOCAL {VIEWS_ONLY_SETTING} = on"))
+        await session.execute(
+            text("UPDATE posts SET category_id = :category_id WHERE id = :id"),
+            {"category_id": category_id, "id": post.json()["id"]},
+        )
+        query = text("SELECT post_count FROM categories WHERE id = :id")
+        # Not counted: the updates of view counts move no post.
+        assert await session.scalar(query, {"id": category_id}) == 0
+        await session.rollback()
+
+
+@pytest.mark.asyncio
+async def test_view_buffer(monkeypatch):
+    monkeypatch.setattr(view_counts, "MAX_BUFFERED_POSTS", 2)
+    await view_counts.send_views()
+    for post_id in (-1, -2, -1, -3):
+        view_counts.record_view(post_id)
+    # The views of a third post are dropped while two are waiting.
+    assert view_counts._buffered == {-1: 2, -2: 1}
+    assert await view_counts.send_views() == 2
+    assert await redis.hmget(PENDING_KEY, ["-1", "-2", "-3"]) == ["2", "1", None]
+    await redis.hdel(PENDING_KEY, "-1", "-2")
+    assert await view_counts.send_views() == 0
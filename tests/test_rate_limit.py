@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException, status
+from starlette.requests import Request
+
+from src.limiter import HybridLimiter, RateLimiter, limiter
+from src.redis import cache_redis
+
+
+def make_request(path: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "headers": [],
+            "client": ("10.0.0.1", 1234),
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_rejects_over_limit():
+    dependency = RateLimiter(times=3, seconds=60)
+    request = make_request(f"/limited/{uuid.uuid4().hex}")
+    for _ in range(3):
+        await dependency(request)
+    with pytest.raises(HTTPException) as exc:
+        await dependency(request)
+    assert exc.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert 0 < int(exc.value.headers["Retry-After"]) <= 60
+
+    # Another client has a budget of its own.
+    other = make_request(request.scope["path"])
+    other.scope["headers"] = [(b"x-forwarded-for", b"10.0.0.2")]
+    await dependency(other)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_global_accuracy():
+    times, share = 20, 0.25
+    workers = [HybridLimiter(cache_redis, local_share=share) for _ in range(3)]
+    key = uuid.uuid4().hex
+    admitted = 0
+    for _ in range(10):
+        for worker in workers:
+            for _ in range(times):
+                admitted += await worker.hit(key, times, 60_000) == 0
+        for worker in workers:
+            await worker.sync()
+    # Each worker can overshoot by its local allowance at most.
+    assert times <= admitted <= times + len(workers) * share * times
+    for worker in workers:
+        assert await worker.hit(key, times, 60_000) > 0
+    assert (
+        int(await cache_redis.get(f"ratelimit:{key}:{workers[0]._buckets[key].window}"))
+        == admitted
+    )
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_without_redis(monkeypatch):
+    worker = HybridLimiter(cache_redis)
+
+    async def unavailable(*args, **kwargs):
+        raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(worker, "_script", unavailable)
+    key = uuid.uuid4().hex
+    results = [await worker.hit(key, 5, 60_000) for _ in range(6)]
+    assert results[:5] == [0] * 5
+    assert results[5] > 0
+    assert worker.rejections == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_lifespan_sync(ac):
+    dependency = RateLimiter(times=10, seconds=60)
+    request = make_request(f"/limited/{uuid.uuid4().hex}")
+    await dependency(request)
+    await limiter.sync()
+    keys = [
+        key
+        async for key in cache_redis.scan_iter(f"ratelimit:*{request.scope['path']}*")
+    ]
+    assert len(keys) == 1
+    assert await cache_redis.get(keys[0]) == b"1"
@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+from src.redis import cache_redis
+from src.stats.service import StatsRefresher
+from .conftest import async_session_maker
+
+
+LOCK_KEY = "stats:refresh:test-lock"
+
+
+@pytest.mark.asyncio
+async def test_stats(ac: AsyncClient):
+    author = await ac.post(
+        "api/v1/authors/", json={"name": "Stats", "email": "stats@example.com"}
+    )
+    category = await ac.post("api/v1/categories/", json={"name": "Stats"})
+    tags = [
+        (await ac.post("api/v1/tags/", json={"name": f"stats-{i}"})).json()["id"]
+        for i in range(2)
+    ]
+    refs = {"author_id": author.json()["id"], "category_id": category.json()["id"]}
+    for i in range(3):
+        await ac.post(
+            "api/v1/posts/",
+            json={
+                "title": "Stats",
+                "content": "Text",
+                "tags": tags[: i % 2 + 1],
+                **refs,
+            },
+        )
+
+    refresher = StatsRefresher(async_session_maker, interval=0, lock_key=LOCK_KEY)
+    assert await refresher.refresh() == [
+        "author_daily_posts",
+        "category_daily_posts",
+        "tag_daily_posts",
+    ]
+    today = datetime.now(timezone.utc).date().isoformat()
+
+    response = await ac.get(
+        "api/v1/stats/authors", params={"author_id": refs["author_id"]}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    refreshed_at = datetime.fromisoformat(response.json()["refreshed_at"])
+    assert (datetime.now(timezone.utc) - refreshed_at).total_seconds() < 60
+    assert response.json()["items"] == [
+        {"author_id": refs["author_id"], "name": "Stats", "day": today, "post_count": 3}
+    ]
+    response = await ac.get(
+        "api/v1/stats/categories", params={"category_id": refs["category_id"]}
+    )
+    assert [item["post_count"] for item in response.json()["items"]] == [3]
+
+    # Pages walk the tags, then the days.
+    response = await ac.get(
+        "api/v1/stats/tags", params={"since": today, "until": today, "limit": 200}
+    )
+    counts = {item["tag_id"]: item["post_count"] for item in response.json()["items"]}
+    assert [counts[tag] for tag in tags] == [3, 1]
+    response = await ac.get("api/v1/stats/tags", params={"limit": 1})
+    first = response.json()["items"]
+    response = await ac.get(
+        "api/v1/stats/tags",
+        params={"limit": 1, "cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert response.json()["items"] != first
+
+    response = await ac.get("api/v1/stats/tags", params={"until": "2000-01-01"})
+    assert response.json()["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_stats_refresh_lock():
+    refresher = StatsRefresher(async_session_maker, interval=0, lock_key=LOCK_KEY)
+    await cache_redis.set(LOCK_KEY, "another worker", px=10_000)
+    try:
+        assert await refresher.refresh() == []
+    finally:
+        await cache_redis.delete(LOCK_KEY)
+    assert len(await refresher.refresh()) == 3
+    assert await cache_redis.get(LOCK_KEY) is None
+
+    # Refreshed less than an interval ago by another worker.
+    refresher.interval = 3600
+    assert await refresher.refresh() == []